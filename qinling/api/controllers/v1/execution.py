@@ -12,6 +12,7 @@
 #    See the License for the specific language governing permissions and
 #    limitations under the License.
 
+from oslo_config import cfg
 from oslo_log import log as logging
 import pecan
 from pecan import rest
@@ -23,22 +24,91 @@ from qinling.api.controllers.v1 import resources
 from qinling.api.controllers.v1 import types
 from qinling import context
 from qinling.db import api as db_api
+from qinling.db.sqlalchemy import models
 from qinling import exceptions as exc
 from qinling import rpc
 from qinling.utils import executions
 from qinling.utils import rest_utils
 
 LOG = logging.getLogger(__name__)
+CONF = cfg.CONF
+
+
+def _get_log_param(name, value):
+    try:
+        value = int(value)
+    except ValueError:
+        value = -1
+
+    if value < 0:
+        raise exc.InputException(
+            '%s must be a non-negative integer.' % name
+        )
+
+    return value
+
+
+def _iter_logs(execution_id, chunk, offset, length):
+    """Generate the execution logs, they are read from the database in chunks.
+
+    :param chunk: The first chunk of the logs which is already read.
+    """
+    chunk_size = CONF.api.execution_log_chunk_size
+
+    while chunk:
+        yield chunk.encode('utf-8')
+
+        offset += len(chunk)
+        if length is not None:
+            length -= len(chunk)
+        size = chunk_size if length is None else min(chunk_size, length)
+        if len(chunk) < chunk_size or size <= 0:
+            return
+
+        try:
+            chunk = db_api.get_execution_log(execution_id, offset=offset,
+                                             length=size)
+        except exc.DBEntityNotFoundError:
+            # The execution was deleted.
+            return
 
 
 class ExecutionLogController(rest.RestController):
     @rest_utils.wrap_pecan_controller_exception
     @pecan.expose(content_type='text/plain')
-    def get_all(self, execution_id):
+    def get_all(self, execution_id, **kwargs):
+        """Get the logs of the execution.
+
+        The logs are read from the database in chunks, the larger logs are
+        streamed to the client. The query parameters:
+
+        - offset: Optional. The number of characters of the logs to skip.
+        - length: Optional. The maximum number of characters to return.
+        """
         LOG.info("Get logs for execution %s.", execution_id)
-        execution_db = db_api.get_execution(execution_id)
 
-        return execution_db.logs
+        offset = _get_log_param('offset', kwargs.get('offset', 0))
+        length = kwargs.get('length')
+        if length is not None:
+            length = _get_log_param('length', length)
+
+        # Check if the execution can be accessed.
+        db_api.get_execution(execution_id)
+
+        chunk_size = CONF.api.execution_log_chunk_size
+        size = chunk_size if length is None else min(chunk_size, length)
+        try:
+            chunk = db_api.get_execution_log(execution_id, offset=offset,
+                                             length=size)
+        except exc.DBEntityNotFoundError:
+            # The execution is not finished or has no logs.
+            return ''
+
+        if len(chunk) < size or size == length:
+            return chunk
+
+        pecan.response.app_iter = _iter_logs(execution_id, chunk, offset,
+                                             length)
 
 
 class ExecutionsController(rest.RestController):
@@ -74,9 +144,11 @@ class ExecutionsController(rest.RestController):
 
     @rest_utils.wrap_wsme_controller_exception
     @wsme_pecan.wsexpose(resources.Executions, wtypes.text, bool, wtypes.text,
-                         wtypes.text, wtypes.text)
+                         wtypes.text, wtypes.text, int, types.uuid,
+                         wtypes.text, wtypes.text, wtypes.text)
     def get_all(self, function_id=None, all_projects=False, project_id=None,
-                status=None, description=None):
+                status=None, description=None, limit=None, marker=None,
+                sort_keys=None, sort_dirs=None, fields=None):
         """Return a list of executions.
 
         :param function_id: Optional. Filtering executions by function_id.
@@ -85,6 +157,11 @@ class ExecutionsController(rest.RestController):
         :param all_projects: Optional. Get resources of all projects.
         :param status: Optional. Filter by execution status.
         :param description: Optional. Filter by description.
+        :param limit: Optional. Maximum number of items to return.
+        :param marker: Optional. ID of the last item of the previous page.
+        :param sort_keys: Optional. Comma-separated fields to sort by.
+        :param sort_dirs: Optional. Comma-separated sort directions.
+        :param fields: Optional. Comma-separated fields to return.
         """
         project_id, all_projects = rest_utils.get_project_params(
             project_id, all_projects
@@ -100,11 +177,16 @@ class ExecutionsController(rest.RestController):
         )
         LOG.info("Get all %ss. filters=%s", self.type, filters)
 
-        db_execs = db_api.get_executions(insecure=all_projects, **filters)
-        executions = [resources.Execution.from_db_obj(db_model)
-                      for db_model in db_execs]
+        # Only the returned columns are loaded.
+        fields = fields or ','.join(resources.Execution.get_fields())
 
-        return resources.Executions(executions=executions)
+        return rest_utils.get_all(
+            resources.Executions, resources.Execution, models.Execution,
+            db_api.get_executions,
+            limit=limit, marker=marker, sort_keys=sort_keys,
+            sort_dirs=sort_dirs, fields=fields, insecure=all_projects,
+            **filters
+        )
 
     @rest_utils.wrap_wsme_controller_exception
     @wsme_pecan.wsexpose(resources.Execution, types.uuid)
@@ -12,7 +12,6 @@
 #    See the License for the specific language governing permissions and
 #    limitations under the License.
 
-import collections
 import json
 
 from oslo_config import cfg
@@ -20,7 +19,6 @@ from oslo_log import log as logging
 from oslo_utils import strutils
 import pecan
 from pecan import rest
-from webob.static import FileIter
 from wsme import types as wtypes
 import wsmeext.pecan as wsme_pecan
 
@@ -30,12 +28,14 @@ from qinling.api.controllers.v1 import resources
 from qinling.api.controllers.v1 import types
 from qinling import context
 from qinling.db import api as db_api
+from qinling.db.sqlalchemy import models
 from qinling import exceptions as exc
 from qinling import rpc
 from qinling.storage import base as storage_base
 from qinling.utils import common
 from qinling.utils import constants
 from qinling.utils import etcd_util
+from qinling.utils import executions
 from qinling.utils.openstack import keystone as keystone_util
 from qinling.utils.openstack import swift as swift_util
 from qinling.utils import rest_utils
@@ -49,6 +49,12 @@ UPDATE_ALLOWED = set(['name', 'description', 'code', 'package', 'entry',
                       'cpu', 'memory_size', 'timeout'])
 
 
+def _function_resource(func_db):
+    resource = resources.Function.from_db_obj(func_db)
+    resource.count = executions.get_count(func_db)
+    return resource
+
+
 class FunctionWorkerController(rest.RestController):
     @rest_utils.wrap_wsme_controller_exception
     @wsme_pecan.wsexpose(resources.FunctionWorkers, types.uuid, int)
@@ -117,14 +123,16 @@ class FunctionsController(rest.RestController):
         if not download:
             LOG.info("Getting function %s.", id)
             pecan.override_template('json')
-            return resources.Function.from_db_obj(func_db).to_dict()
+            return _function_resource(func_db).to_dict()
 
         LOG.info("Downloading function %s", id)
         source = func_db.code['source']
 
+        etag = None
         if source == constants.PACKAGE_FUNCTION:
             f = self.storage_provider.retrieve(func_db.project_id, id,
                                                func_db.code['md5sum'])
+            etag = func_db.code['md5sum']
         elif source == constants.SWIFT_FUNCTION:
             container = func_db.code['swift']['container']
             obj = func_db.code['swift']['object']
@@ -137,11 +145,7 @@ class FunctionsController(rest.RestController):
                 headers={'Server-Error-Message': msg}
             )
 
-        pecan.response.app_iter = (f if isinstance(f, collections.Iterable)
-                                   else FileIter(f))
-        pecan.response.headers['Content-Disposition'] = (
-            'attachment; filename="%s"' % id
-        )
+        return rest_utils.get_package_response(f, id, etag=etag)
 
     @rest_utils.wrap_pecan_controller_exception
     @pecan.expose('json')
@@ -204,7 +208,7 @@ class FunctionsController(rest.RestController):
         if source == constants.PACKAGE_FUNCTION:
             store = True
             md5sum = values['code'].get('md5sum')
-            data = kwargs['package'].file.read()
+            data = kwargs['package'].file
         elif source == constants.SWIFT_FUNCTION:
             swift_info = values['code'].get('swift', {})
 
@@ -251,13 +255,20 @@ class FunctionsController(rest.RestController):
         return resources.Function.from_db_obj(func_db).to_dict()
 
     @rest_utils.wrap_wsme_controller_exception
-    @wsme_pecan.wsexpose(resources.Functions, bool, wtypes.text)
-    def get_all(self, all_projects=False, project_id=None):
+    @wsme_pecan.wsexpose(resources.Functions, bool, wtypes.text, int,
+                         types.uuid, wtypes.text, wtypes.text, wtypes.text)
+    def get_all(self, all_projects=False, project_id=None, limit=None,
+                marker=None, sort_keys=None, sort_dirs=None, fields=None):
         """Return a list of functions.
 
         :param project_id: Optional. Admin user can query other projects
             resources, the param is ignored for normal user.
         :param all_projects: Optional. Get resources of all projects.
+        :param limit: Optional. Maximum number of items to return.
+        :param marker: Optional. ID of the last item of the previous page.
+        :param sort_keys: Optional. Comma-separated fields to sort by.
+        :param sort_dirs: Optional. Comma-separated sort directions.
+        :param fields: Optional. Comma-separated fields to return.
         """
         project_id, all_projects = rest_utils.get_project_params(
             project_id, all_projects
@@ -269,11 +280,15 @@ class FunctionsController(rest.RestController):
             project_id=project_id,
         )
         LOG.info("Get all functions. filters=%s", filters)
-        db_functions = db_api.get_functions(insecure=all_projects, **filters)
-        functions = [resources.Function.from_db_obj(db_model)
-                     for db_model in db_functions]
 
-        return resources.Functions(functions=functions)
+        return rest_utils.get_all(
+            resources.Functions, resources.Function, models.Function,
+            db_api.get_functions,
+            limit=limit, marker=marker, sort_keys=sort_keys,
+            sort_dirs=sort_dirs, fields=fields,
+            resource_function=_function_resource, insecure=all_projects,
+            **filters
+        )
 
     @rest_utils.wrap_wsme_controller_exception
     @wsme_pecan.wsexpose(None, types.uuid, status_code=204)
@@ -327,7 +342,8 @@ class FunctionsController(rest.RestController):
                     func_db.project_id,
                     id,
                     None,
-                    version=version_db.version_number
+                    version=version_db.version_number,
+                    version_md5sum=version_db.md5sum
                 )
 
             # Delete resources for function version 0(func_db.versions==[])
@@ -427,7 +443,7 @@ class FunctionsController(rest.RestController):
                         )
 
                     # Update the package data.
-                    data = values['package'].file.read()
+                    data = values['package'].file
                     package_updated, md5sum = self.storage_provider.store(
                         ctx.projectid,
                         id,
@@ -23,6 +23,7 @@ from qinling.api import access_control as acl
 from qinling.api.controllers.v1 import resources
 from qinling import context
 from qinling.db import api as db_api
+from qinling.db.sqlalchemy import models
 from qinling import exceptions as exc
 from qinling.utils import rest_utils
 
@@ -87,13 +88,20 @@ class FunctionAliasesController(rest.RestController):
         return resources.FunctionAlias.from_db_obj(alias)
 
     @rest_utils.wrap_wsme_controller_exception
-    @wsme_pecan.wsexpose(resources.FunctionAliases, bool, wtypes.text)
-    def get_all(self, all_projects=False, project_id=None):
+    @wsme_pecan.wsexpose(resources.FunctionAliases, bool, wtypes.text, int,
+                         wtypes.text, wtypes.text, wtypes.text, wtypes.text)
+    def get_all(self, all_projects=False, project_id=None, limit=None,
+                marker=None, sort_keys=None, sort_dirs=None, fields=None):
         """Get all the function aliases.
 
         :param project_id: Optional. Admin user can query other projects
             resources, the param is ignored for normal user.
         :param all_projects: Optional. Get resources of all projects.
+        :param limit: Optional. Maximum number of items to return.
+        :param marker: Optional. ID of the last item of the previous page.
+        :param sort_keys: Optional. Comma-separated fields to sort by.
+        :param sort_dirs: Optional. Comma-separated sort directions.
+        :param fields: Optional. Comma-separated fields to return.
         """
         ctx = context.get_ctx()
         project_id, all_projects = rest_utils.get_project_params(
@@ -106,12 +114,13 @@ class FunctionAliasesController(rest.RestController):
 
         LOG.info("Get all function aliases. filters=%s", filters)
 
-        db_aliases = db_api.get_function_aliases(
-            insecure=all_projects, **filters)
-        aliases = [resources.FunctionAlias.from_db_obj(db_model)
-                   for db_model in db_aliases]
-
-        return resources.FunctionAliases(function_aliases=aliases)
+        return rest_utils.get_all(
+            resources.FunctionAliases, resources.FunctionAlias,
+            models.FunctionAlias, db_api.get_function_aliases,
+            limit=limit, marker=marker, sort_keys=sort_keys,
+            sort_dirs=sort_dirs, fields=fields, insecure=all_projects,
+            **filters
+        )
 
     @wsme_pecan.wsexpose(None, wtypes.text, status_code=204)
     def delete(self, alias_name):
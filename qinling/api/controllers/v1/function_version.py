@@ -12,15 +12,13 @@
 #    See the License for the specific language governing permissions and
 #    limitations under the License.
 
-import collections
-
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_utils import strutils
 import pecan
 from pecan import rest
 import tenacity
-from webob.static import FileIter
+from wsme import types as wtypes
 import wsmeext.pecan as wsme_pecan
 
 from qinling.api import access_control as acl
@@ -28,17 +26,25 @@ from qinling.api.controllers.v1 import resources
 from qinling.api.controllers.v1 import types
 from qinling import context
 from qinling.db import api as db_api
+from qinling.db.sqlalchemy import models
 from qinling import exceptions as exc
 from qinling import rpc
 from qinling.storage import base as storage_base
 from qinling.utils import constants
 from qinling.utils import etcd_util
+from qinling.utils import executions
 from qinling.utils import rest_utils
 
 LOG = logging.getLogger(__name__)
 CONF = cfg.CONF
 
 
+def _version_resource(version_db):
+    resource = resources.FunctionVersion.from_db_obj(version_db)
+    resource.count = executions.get_count(version_db)
+    return resource
+
+
 class FunctionVersionsController(rest.RestController):
     _custom_actions = {
         'scale_up': ['POST'],
@@ -105,6 +111,7 @@ class FunctionVersionsController(rest.RestController):
                                            l_version)
                 version = db_api.increase_function_version(function_id,
                                                            l_version,
+                                                           md5sum=l_md5,
                                                            **kwargs)
                 func_db.latest_version = l_version + 1
 
@@ -149,24 +156,35 @@ class FunctionVersionsController(rest.RestController):
         return resources.FunctionVersion.from_db_obj(version)
 
     @rest_utils.wrap_wsme_controller_exception
-    @wsme_pecan.wsexpose(resources.FunctionVersions, types.uuid)
-    def get_all(self, function_id):
+    @wsme_pecan.wsexpose(resources.FunctionVersions, types.uuid, int,
+                         types.uuid, wtypes.text, wtypes.text, wtypes.text)
+    def get_all(self, function_id, limit=None, marker=None, sort_keys=None,
+                sort_dirs=None, fields=None):
         """Get all the versions of the given function.
 
         Admin user can get all versions for the normal user's function.
+
+        :param limit: Optional. Maximum number of items to return.
+        :param marker: Optional. ID of the last item of the previous page.
+        :param sort_keys: Optional. Comma-separated fields to sort by,
+            defaults to version_number.
+        :param sort_dirs: Optional. Comma-separated sort directions.
+        :param fields: Optional. Comma-separated fields to return.
         """
         acl.enforce('function_version:get_all', context.get_ctx())
         LOG.info("Getting versions for function %s.", function_id)
 
-        # Getting function and versions needs to happen in a db transaction
-        with db_api.transaction():
-            func_db = db_api.get_function(function_id)
-            db_versions = func_db.versions
-
-        versions = [resources.FunctionVersion.from_db_obj(v)
-                    for v in db_versions]
+        # Make sure the function exists and is accessible.
+        func_db = db_api.get_function(function_id)
 
-        return resources.FunctionVersions(function_versions=versions)
+        return rest_utils.get_all(
+            resources.FunctionVersions, resources.FunctionVersion,
+            models.FunctionVersion, db_api.get_function_versions,
+            limit=limit, marker=marker,
+            sort_keys=sort_keys or 'version_number', sort_dirs=sort_dirs,
+            fields=fields, resource_function=_version_resource,
+            insecure=True, function_id=func_db.id
+        )
 
     @rest_utils.wrap_pecan_controller_exception
     @pecan.expose()
@@ -191,21 +209,18 @@ class FunctionVersionsController(rest.RestController):
             LOG.info("Getting version %s for function %s.", version,
                      function_id)
             pecan.override_template('json')
-            return resources.FunctionVersion.from_db_obj(version_db).to_dict()
+            return _version_resource(version_db).to_dict()
 
         LOG.info("Downloading version %s for function %s.", version,
                  function_id)
 
-        f = self.storage_provider.retrieve(version_db.project_id, function_id,
-                                           None, version=version)
+        f = self.storage_provider.retrieve(
+            version_db.project_id, function_id, None, version=version,
+            version_md5sum=version_db.md5sum
+        )
 
-        if isinstance(f, collections.Iterable):
-            pecan.response.app_iter = f
-        else:
-            pecan.response.app_iter = FileIter(f)
-        pecan.response.headers['Content-Type'] = 'application/zip'
-        pecan.response.headers['Content-Disposition'] = (
-            'attachment; filename="%s_%s"' % (function_id, version)
+        return rest_utils.get_package_response(
+            f, '%s_%s' % (function_id, version), etag=version_db.md5sum
         )
 
     @rest_utils.wrap_wsme_controller_exception
@@ -261,7 +276,8 @@ class FunctionVersionsController(rest.RestController):
             etcd_util.delete_function(function_id, version=version)
 
             self.storage_provider.delete(ctx.projectid, function_id, None,
-                                         version=version)
+                                         version=version,
+                                         version_md5sum=version_db.md5sum)
 
             db_api.delete_function_version(function_id, version)
 
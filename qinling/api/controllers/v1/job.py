@@ -27,6 +27,7 @@ from qinling.api.controllers.v1 import resources
 from qinling.api.controllers.v1 import types
 from qinling import context
 from qinling.db import api as db_api
+from qinling.db.sqlalchemy import models
 from qinling import exceptions as exc
 from qinling import status
 from qinling.utils import jobs
@@ -105,8 +106,10 @@ class JobsController(rest.RestController):
         return resources.Job.from_db_obj(job_db)
 
     @rest_utils.wrap_wsme_controller_exception
-    @wsme_pecan.wsexpose(resources.Jobs, bool, wtypes.text)
-    def get_all(self, all_projects=False, project_id=None):
+    @wsme_pecan.wsexpose(resources.Jobs, bool, wtypes.text, int,
+                         types.uuid, wtypes.text, wtypes.text, wtypes.text)
+    def get_all(self, all_projects=False, project_id=None, limit=None,
+                marker=None, sort_keys=None, sort_dirs=None, fields=None):
         project_id, all_projects = rest_utils.get_project_params(
             project_id, all_projects
         )
@@ -117,11 +120,13 @@ class JobsController(rest.RestController):
             project_id=project_id,
         )
         LOG.info("Get all %ss. filters=%s", self.type, filters)
-        db_jobs = db_api.get_jobs(insecure=all_projects, **filters)
-        jobs = [resources.Job.from_db_obj(db_model)
-                for db_model in db_jobs]
 
-        return resources.Jobs(jobs=jobs)
+        return rest_utils.get_all(
+            resources.Jobs, resources.Job, models.Job, db_api.get_jobs,
+            limit=limit, marker=marker, sort_keys=sort_keys,
+            sort_dirs=sort_dirs, fields=fields, insecure=all_projects,
+            **filters
+        )
 
     @rest_utils.wrap_wsme_controller_exception
     @wsme_pecan.wsexpose(
@@ -13,6 +13,7 @@
 #    limitations under the License.
 
 import json
+from urllib import parse
 
 import wsme
 from wsme import types as wtypes
@@ -86,8 +87,7 @@ class ResourceList(Resource):
         return getattr(self, self._type)
 
     @classmethod
-    def convert_with_links(cls, resources, limit, url=None, fields=None,
-                           **kwargs):
+    def convert_with_links(cls, resources, limit, url=None, **kwargs):
         resource_collection = cls()
 
         setattr(resource_collection, resource_collection._type, resources)
@@ -95,7 +95,6 @@ class ResourceList(Resource):
         resource_collection.next = resource_collection.get_next(
             limit,
             url=url,
-            fields=fields,
             **kwargs
         )
 
@@ -105,36 +104,19 @@ class ResourceList(Resource):
         """Return whether resources has more items."""
         return len(self.collection) and len(self.collection) == limit
 
-    def get_next(self, limit, url=None, fields=None, **kwargs):
-        """Return a link to the next subset of the resources."""
+    def get_next(self, limit, url=None, **kwargs):
+        """Return a link to the next subset of the resources.
+
+        :param limit: The page size.
+        :param url: The URL of the resource list.
+        :param kwargs: The other query parameters of the list request.
+        """
         if not self.has_next(limit):
             return wtypes.Unset
 
-        q_args = ''.join(
-            ['%s=%s&' % (key, value) for key, value in kwargs.items()]
-        )
-
-        resource_args = (
-            '?%(args)slimit=%(limit)d&marker=%(marker)s' %
-            {
-                'args': q_args,
-                'limit': limit,
-                'marker': self.collection[-1].id
-            }
-        )
-
-        # Fields is handled specially here, we can move it above when it's
-        # supported by all resources query.
-        if fields:
-            resource_args += '&fields=%s' % fields
-
-        next_link = "%(host_url)s/v2/%(resource)s%(args)s" % {
-            'host_url': url,
-            'resource': self._type,
-            'args': resource_args
-        }
+        q_args = dict(kwargs, limit=limit, marker=self.collection[-1].id)
 
-        return next_link
+        return '%s?%s' % (url, parse.urlencode(sorted(q_args.items())))
 
     def to_dict(self):
         d = {}
@@ -143,7 +125,7 @@ class ResourceList(Resource):
             attr_val = getattr(self, attr.name)
 
             if isinstance(attr_val, list):
-                if isinstance(attr_val[0], Resource):
+                if attr_val and isinstance(attr_val[0], Resource):
                     d[attr.name] = [v.to_dict() for v in attr_val]
             elif not isinstance(attr_val, wtypes.UnsetType):
                 d[attr.name] = attr_val
@@ -216,7 +198,7 @@ class Runtimes(ResourceList):
     runtimes = [Runtime]
 
     def __init__(self, **kwargs):
-        self._type = 'environments'
+        self._type = 'runtimes'
 
         super(Runtimes, self).__init__(**kwargs)
 
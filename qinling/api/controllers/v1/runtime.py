@@ -14,6 +14,7 @@
 
 from oslo_log import log as logging
 from pecan import rest
+from wsme import types as wtypes
 import wsmeext.pecan as wsme_pecan
 
 from qinling.api import access_control as acl
@@ -21,6 +22,7 @@ from qinling.api.controllers.v1 import resources
 from qinling.api.controllers.v1 import types
 from qinling import context
 from qinling.db import api as db_api
+from qinling.db.sqlalchemy import models
 from qinling import exceptions as exc
 from qinling import rpc
 from qinling import status
@@ -52,14 +54,18 @@ class RuntimesController(rest.RestController):
         return resources.Runtime.from_db_obj(runtime_db)
 
     @rest_utils.wrap_wsme_controller_exception
-    @wsme_pecan.wsexpose(resources.Runtimes)
-    def get_all(self):
+    @wsme_pecan.wsexpose(resources.Runtimes, int, types.uuid, wtypes.text,
+                         wtypes.text, wtypes.text)
+    def get_all(self, limit=None, marker=None, sort_keys=None, sort_dirs=None,
+                fields=None):
         LOG.info("Get all %ss.", self.type)
 
-        runtimes = [resources.Runtime.from_db_obj(db_model)
-                    for db_model in db_api.get_runtimes()]
-
-        return resources.Runtimes(runtimes=runtimes)
+        return rest_utils.get_all(
+            resources.Runtimes, resources.Runtime, models.Runtime,
+            db_api.get_runtimes,
+            limit=limit, marker=marker, sort_keys=sort_keys,
+            sort_dirs=sort_dirs, fields=fields
+        )
 
     @rest_utils.wrap_wsme_controller_exception
     @wsme_pecan.wsexpose(
@@ -25,6 +25,7 @@ from qinling.api.controllers.v1 import resources
 from qinling.api.controllers.v1 import types
 from qinling import context
 from qinling.db import api as db_api
+from qinling.db.sqlalchemy import models
 from qinling import exceptions as exc
 from qinling import rpc
 from qinling.utils import constants
@@ -71,8 +72,10 @@ class WebhooksController(rest.RestController):
         return resources.Webhook.from_dict(self._add_webhook_url(id, webhook))
 
     @rest_utils.wrap_wsme_controller_exception
-    @wsme_pecan.wsexpose(resources.Webhooks, bool, wtypes.text)
-    def get_all(self, all_projects=False, project_id=None):
+    @wsme_pecan.wsexpose(resources.Webhooks, bool, wtypes.text, int,
+                         types.uuid, wtypes.text, wtypes.text, wtypes.text)
+    def get_all(self, all_projects=False, project_id=None, limit=None,
+                marker=None, sort_keys=None, sort_dirs=None, fields=None):
         project_id, all_projects = rest_utils.get_project_params(
             project_id, all_projects
         )
@@ -84,15 +87,17 @@ class WebhooksController(rest.RestController):
         )
 
         LOG.info("Get all %ss. filters=%s", self.type, filters)
-        webhooks = []
-        for i in db_api.get_webhooks(insecure=all_projects, **filters):
-            webhooks.append(
-                resources.Webhook.from_dict(
-                    self._add_webhook_url(i.id, i.to_dict())
-                )
-            )
 
-        return resources.Webhooks(webhooks=webhooks)
+        return rest_utils.get_all(
+            resources.Webhooks, resources.Webhook, models.Webhook,
+            db_api.get_webhooks,
+            limit=limit, marker=marker, sort_keys=sort_keys,
+            sort_dirs=sort_dirs, fields=fields,
+            resource_function=lambda i: resources.Webhook.from_dict(
+                self._add_webhook_url(i.id, i.to_dict())
+            ),
+            insecure=all_projects, **filters
+        )
 
     @rest_utils.wrap_wsme_controller_exception
     @wsme_pecan.wsexpose(
@@ -196,20 +201,21 @@ class WebhooksController(rest.RestController):
         with db_api.transaction():
             # The webhook url can be accessed without authentication, so
             # insecure is used here
-            webhook_db = db_api.get_webhook(id, insecure=True)
+            webhook_db = db_api.get_cached_webhook(id, insecure=True)
             function_alias = webhook_db.function_alias
 
             if function_alias:
-                alias = db_api.get_function_alias(function_alias,
-                                                  insecure=True)
+                alias = db_api.get_cached_function_alias(function_alias,
+                                                         insecure=True)
                 function_id = alias.function_id
                 function_version = alias.function_version
-                function_db = db_api.get_function(function_id, insecure=True)
             else:
-                function_db = webhook_db.function
                 function_id = webhook_db.function_id
                 function_version = webhook_db.function_version
 
+            function_db = db_api.get_cached_function(function_id,
+                                                     insecure=True)
+
             trust_id = function_db.trust_id
             project_id = function_db.project_id
 
@@ -19,6 +19,7 @@ from oslo_service import service
 from oslo_service import wsgi
 
 from qinling.api import app
+from qinling.utils import executions
 
 CONF = cfg.CONF
 LOG = logging.getLogger(__name__)
@@ -53,6 +54,8 @@ class WSGIService(service.ServiceBase):
 
     def stop(self):
         self.server.stop()
+        # Write the execution counts not written yet.
+        executions.INVOCATION_COUNTER.flush()
 
     def wait(self):
         self.server.wait()
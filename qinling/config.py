@@ -33,6 +33,16 @@ default_opts = [
         'qinling_endpoint',
         help='Qinling service endpoint.'
     ),
+    cfg.IntOpt(
+        'metadata_cache_ttl',
+        default=5,
+        min=0,
+        help='Time in seconds during which the function, function version, '
+             'function alias, runtime and webhook read to create executions '
+             'are cached in the service process. The changes made by other '
+             'processes are seen after the cache expires. Set to 0 to '
+             'disable the cache.'
+    ),
 ]
 
 API_GROUP = 'api'
@@ -57,6 +67,30 @@ api_opts = [
         default=True,
         help='Enable job handler.'
     ),
+    cfg.IntOpt(
+        'max_limit',
+        default=1000,
+        min=1,
+        help='The maximum number of items returned in a single response '
+             'from a collection resource when the limit is specified in the '
+             'request. All the items are returned if no limit is specified.'
+    ),
+    cfg.IntOpt(
+        'execution_count_flush_interval',
+        default=1,
+        min=0,
+        help='Interval in seconds to write the execution counts of the '
+             'functions and function versions to the database. The counts '
+             'are accumulated in the API service in between and written in '
+             'a batch. Set to 0 to update the counts for every execution.'
+    ),
+    cfg.IntOpt(
+        'execution_log_chunk_size',
+        default=65536,
+        min=1,
+        help='The number of characters of the execution logs read from the '
+             'database at a time when the logs are sent to the client.'
+    ),
 ]
 
 PECAN_GROUP = 'pecan'
@@ -114,6 +148,72 @@ engine_opts = [
         default=3,
         help='Maximum number of concurrent executions per function.'
     ),
+    cfg.IntOpt(
+        'worker_health_ttl',
+        default=60,
+        min=0,
+        help='Time in seconds during which a function service url is '
+             'considered healthy after it was last known to work. Within '
+             'this period the engine sends execution requests to the '
+             'worker without pinging it first. Set to 0 to always ping '
+             'the worker before sending the execution request.'
+    ),
+    cfg.IntOpt(
+        'execution_timeout_margin',
+        default=120,
+        min=0,
+        help='Time in seconds the engine waits for the result of an '
+             'execution in addition to the function timeout. It covers the '
+             'download of the function package and the start of the '
+             'function in the worker.'
+    ),
+    cfg.StrOpt(
+        'worker_routing',
+        default='service',
+        choices=['service', 'least_loaded'],
+        help='How the engine sends the execution requests to the function '
+             'workers. "service" sends them to the service exposed for the '
+             'function. "least_loaded" sends them directly to the worker '
+             'with the least in-flight executions, which requires the '
+             'engine to be able to reach the worker addresses.'
+    ),
+    cfg.BoolOpt(
+        'prefetch_package',
+        default=False,
+        help='Download the function package to the new workers when scaling '
+             'up a function, before the workers start receiving executions. '
+             'It requires the engine to be able to reach the worker '
+             'addresses.'
+    ),
+    cfg.BoolOpt(
+        'async_invoke',
+        default=False,
+        help='Invoke the functions of asynchronous executions from an '
+             'asyncio event loop instead of blocking an RPC thread until '
+             'the function returns.'
+    ),
+    cfg.IntOpt(
+        'async_invoke_connection_limit',
+        default=1000,
+        min=1,
+        help='Maximum number of simultaneous connections to the function '
+             'workers when async_invoke is enabled.'
+    ),
+    cfg.IntOpt(
+        'async_invoke_callback_workers',
+        default=8,
+        min=1,
+        help='Number of threads used to record the results of the '
+             'executions invoked asynchronously.'
+    ),
+    cfg.IntOpt(
+        'execution_log_max_size',
+        default=1048576,
+        min=1,
+        help='Maximum number of characters of the execution logs stored in '
+             'the database. The beginning of the larger logs is truncated, '
+             'the end of the logs is kept.'
+    ),
     cfg.StrOpt(
         'sidecar_image',
         default='openstackqinling/sidecar:0.0.2',
@@ -133,6 +233,22 @@ storage_opts = [
         choices=['local', 'swift'],
         help='Storage provider for function code package.'
     ),
+    cfg.StrOpt(
+        'sendfile_header',
+        choices=['X-Sendfile', 'X-Accel-Redirect'],
+        help='Let the web server in front of Qinling API send the function '
+             'packages stored in the local file system by responding with '
+             'this header. Use X-Sendfile for Apache mod_xsendfile and '
+             'lighttpd, X-Accel-Redirect for nginx. If not set, the '
+             'packages are sent by the API service, using the '
+             'wsgi.file_wrapper of the WSGI server if available.'
+    ),
+    cfg.StrOpt(
+        'sendfile_location',
+        default='/',
+        help='The URI prefix mapped to file_system_dir in the web server, '
+             'used with X-Accel-Redirect.'
+    ),
 ]
 
 KUBERNETES_GROUP = 'kubernetes'
@@ -183,6 +299,22 @@ kubernetes_opts = [
         choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
         help='Log level for kubernetes operations.'
     ),
+    cfg.BoolOpt(
+        'use_watch_cache',
+        default=False,
+        help='Keep a local cache of the pods and deployments fed by the '
+             'Kubernetes watch API, instead of calling the Kubernetes API '
+             'when choosing the workers and waiting for the pods and '
+             'deployments.'
+    ),
+    cfg.StrOpt(
+        'package_cache_host_path',
+        help='Path on the Kubernetes nodes to keep the function packages '
+             'shared by the worker pods on the same node. The sidecars look '
+             'for the package by its md5 in the path before downloading it '
+             'from Qinling. The path should be writable by the sidecar '
+             'user. Disabled if not set.'
+    ),
     cfg.ListOpt(
         'trusted_cidrs',
         deprecated_for_removal=True,
@@ -16,6 +16,7 @@ import contextlib
 
 from oslo_db import api as db_api
 
+from qinling.db import cache
 
 _BACKEND_MAPPING = {
     'sqlalchemy': 'qinling.db.sqlalchemy.api',
@@ -62,6 +63,7 @@ def delete_all():
     delete_function_aliases(insecure=True)
     delete_functions(insecure=True)
     delete_runtimes(insecure=True)
+    cache.METADATA.clear()
 
 
 def conditional_update(model, values, expected_values, **kwargs):
@@ -76,6 +78,14 @@ def get_function(id, insecure=None):
     return IMPL.get_function(id, insecure=insecure)
 
 
+def get_cached_function(id, insecure=None):
+    """Get function from the metadata cache, used to create executions."""
+    return cache.METADATA.get(
+        'function', id, lambda: get_function(id, insecure=insecure),
+        insecure=insecure
+    )
+
+
 def get_functions(limit=None, marker=None, sort_keys=None,
                   sort_dirs=None, fields=None, **kwargs):
     return IMPL.get_functions(
@@ -93,14 +103,20 @@ def create_function(values):
 
 
 def update_function(id, values):
+    cache.METADATA.invalidate('function', id)
     return IMPL.update_function(id, values)
 
 
 def delete_function(id):
+    # The versions and aliases of the function are deleted together.
+    cache.METADATA.invalidate('function', id)
+    cache.METADATA.invalidate('function_version')
+    cache.METADATA.invalidate('function_alias')
     return IMPL.delete_function(id)
 
 
 def delete_functions(**kwargs):
+    cache.METADATA.invalidate('function')
     return IMPL.delete_functions(**kwargs)
 
 
@@ -112,19 +128,28 @@ def get_runtime(id):
     return IMPL.get_runtime(id)
 
 
-def get_runtimes():
-    return IMPL.get_runtimes()
+def get_cached_runtime(id):
+    """Get runtime from the metadata cache, used to create executions."""
+    return cache.METADATA.get('runtime', id, lambda: get_runtime(id),
+                              insecure=False)
+
+
+def get_runtimes(**kwargs):
+    return IMPL.get_runtimes(**kwargs)
 
 
 def delete_runtime(id):
+    cache.METADATA.invalidate('runtime', id)
     return IMPL.delete_runtime(id)
 
 
 def update_runtime(id, values):
+    cache.METADATA.invalidate('runtime', id)
     return IMPL.update_runtime(id, values)
 
 
 def delete_runtimes(**kwargs):
+    cache.METADATA.invalidate('runtime')
     return IMPL.delete_runtimes(**kwargs)
 
 
@@ -140,6 +165,10 @@ def get_executions(**filters):
     return IMPL.get_executions(**filters)
 
 
+def get_execution_counts(**filters):
+    return IMPL.get_execution_counts(**filters)
+
+
 def delete_execution(id):
     return IMPL.delete_execution(id)
 
@@ -152,6 +181,14 @@ def delete_executions(**kwargs):
     return IMPL.delete_executions(**kwargs)
 
 
+def create_execution_log(values):
+    return IMPL.create_execution_log(values)
+
+
+def get_execution_log(execution_id, offset=0, length=None):
+    return IMPL.get_execution_log(execution_id, offset=offset, length=length)
+
+
 def create_job(values):
     return IMPL.create_job(values)
 
@@ -188,19 +225,30 @@ def get_webhook(id, insecure=None):
     return IMPL.get_webhook(id, insecure=insecure)
 
 
+def get_cached_webhook(id, insecure=None):
+    """Get webhook from the metadata cache, used to create executions."""
+    return cache.METADATA.get(
+        'webhook', id, lambda: get_webhook(id, insecure=insecure),
+        insecure=insecure
+    )
+
+
 def get_webhooks(**kwargs):
     return IMPL.get_webhooks(**kwargs)
 
 
 def delete_webhook(id):
+    cache.METADATA.invalidate('webhook', id)
     return IMPL.delete_webhook(id)
 
 
 def update_webhook(id, values):
+    cache.METADATA.invalidate('webhook', id)
     return IMPL.update_webhook(id, values)
 
 
 def delete_webhooks(**kwargs):
+    cache.METADATA.invalidate('webhook')
     return IMPL.delete_webhooks(**kwargs)
 
 
@@ -213,12 +261,27 @@ def get_function_version(function_id, version, **kwargs):
     return IMPL.get_function_version(function_id, version, **kwargs)
 
 
+def get_cached_function_version(function_id, version, insecure=None):
+    """Get function version from the metadata cache.
+
+    It's used to create executions.
+    """
+    return cache.METADATA.get(
+        'function_version', (function_id, version),
+        lambda: get_function_version(function_id, version,
+                                     insecure=insecure),
+        insecure=insecure
+    )
+
+
 # This function is only used in unit test.
 def update_function_version(function_id, version, **kwargs):
+    cache.METADATA.invalidate('function_version', (function_id, version))
     return IMPL.update_function_version(function_id, version, **kwargs)
 
 
 def delete_function_version(function_id, version):
+    cache.METADATA.invalidate('function_version', (function_id, version))
     return IMPL.delete_function_version(function_id, version)
 
 
@@ -234,18 +297,33 @@ def get_function_alias(name, **kwargs):
     return IMPL.get_function_alias(name, **kwargs)
 
 
+def get_cached_function_alias(name, insecure=None):
+    """Get function alias from the metadata cache.
+
+    It's used to create executions.
+    """
+    return cache.METADATA.get(
+        'function_alias', name,
+        lambda: get_function_alias(name, insecure=insecure),
+        insecure=insecure
+    )
+
+
 def get_function_aliases(**kwargs):
     return IMPL.get_function_aliases(**kwargs)
 
 
 def update_function_alias(name, **kwargs):
+    cache.METADATA.invalidate('function_alias', name)
     return IMPL.update_function_alias(name, **kwargs)
 
 
 def delete_function_alias(name, **kwargs):
+    cache.METADATA.invalidate('function_alias', name)
     return IMPL.delete_function_alias(name, **kwargs)
 
 
 # For unit test
 def delete_function_aliases(**kwargs):
+    cache.METADATA.invalidate('function_alias')
     return IMPL.delete_function_aliases(**kwargs)
@@ -0,0 +1,91 @@
+# Copyright 2017 Catalyst IT Limited
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+import threading
+import time
+
+from oslo_config import cfg
+
+from qinling import context
+
+CONF = cfg.CONF
+
+
+class MetadataCache(object):
+    """Process-local cache of the metadata read to create executions.
+
+    The objects are cached for ``metadata_cache_ttl`` seconds, keyed by the
+    object kind, the object key and the project scope of the query, so the
+    cached objects are only visible to the callers that could read them
+    from the database. The entries are invalidated when the objects are
+    updated or deleted in the current process, the other processes see the
+    change when their entries expire.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def get(self, kind, key, loader, insecure=None):
+        """Get the object from the cache, or load it if not cached.
+
+        :param kind: The object kind, e.g. 'function'.
+        :param key: The key identifying the object of the kind.
+        :param loader: The callable to load the object from the database.
+        :param insecure: If the object is loaded regardless of the project,
+            defaults to the admin role of the current context like the db
+            api does.
+        """
+        ttl = CONF.metadata_cache_ttl
+        if ttl <= 0:
+            return loader()
+
+        if insecure is None:
+            insecure = context.get_ctx().is_admin
+        scope = None if insecure else context.get_ctx().projectid
+
+        with self._lock:
+            entry = self._entries.get((kind, key), {}).get(scope)
+            if entry is not None:
+                if time.monotonic() - entry[0] <= ttl:
+                    return entry[1]
+
+                del self._entries[(kind, key)][scope]
+
+        # The objects not found are not cached, the exception is raised to
+        # the caller.
+        loaded_at = time.monotonic()
+        value = loader()
+
+        with self._lock:
+            self._entries.setdefault((kind, key), {})[scope] = (loaded_at,
+                                                                value)
+
+        return value
+
+    def invalidate(self, kind, key=None):
+        """Remove the cached object, or all the objects of the kind."""
+        with self._lock:
+            if key is not None:
+                self._entries.pop((kind, key), None)
+                return
+
+            for k in [k for k in self._entries if k[0] == kind]:
+                del self._entries[k]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+METADATA = MetadataCache()
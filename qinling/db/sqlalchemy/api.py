@@ -155,14 +155,28 @@ def _get_collection(model, insecure=False, limit=None, marker=None,
     query = (db_base.model_query(model, columns) if insecure
              else _secure_query(model, *columns))
     query = db_filters.apply_filters(query, model, **filters)
-    query = _paginate_query(
-        model,
-        limit,
-        marker,
-        sort_keys,
-        sort_dirs,
-        query
-    )
+
+    # The marker is the ID of the last item of the previous page, the next
+    # page is queried by its sort key values.
+    if marker:
+        marker_obj = _get_db_object_by_id(model, marker, insecure=insecure)
+        if not marker_obj:
+            raise exc.DBEntityNotFoundError(
+                "Marker not found [id=%s]" % marker
+            )
+        marker = marker_obj
+
+    try:
+        query = _paginate_query(
+            model,
+            limit,
+            marker,
+            sort_keys,
+            sort_dirs,
+            query
+        )
+    except oslo_db_exc.InvalidSortKey as e:
+        raise exc.DBError("Invalid sort key: %s" % str(e))
 
     try:
         return query.all()
@@ -373,17 +387,100 @@ def get_executions(session=None, **kwargs):
     return _get_collection_sorted_by_time(models.Execution, **kwargs)
 
 
+@db_base.session_aware()
+def get_execution_counts(session=None, **filters):
+    """Count the executions of all projects by function version.
+
+    :return: a dict of execution number keyed by (function_id, version).
+    """
+    model = models.Execution
+    query = db_base.model_query(
+        model,
+        (model.function_id, model.function_version, sa.func.count(model.id))
+    )
+    query = db_filters.apply_filters(query, model, **filters)
+    query = query.group_by(model.function_id, model.function_version)
+
+    return {
+        (function_id, version): count
+        for function_id, version, count in query.all()
+    }
+
+
 @db_base.session_aware()
 def delete_execution(id, session=None):
     execution = get_execution(id)
 
+    # The logs are deleted explicitly as the foreign keys may not be enforced
+    # by the database, e.g. sqlite.
+    _delete_execution_logs(models.ExecutionLog.execution_id == id)
     session.delete(execution)
 
 
 @db_base.insecure_aware()
 @db_base.session_aware()
 def delete_executions(session=None, insecure=None, **kwargs):
-    return _delete_all(models.Execution, insecure=insecure, **kwargs)
+    model = models.Execution
+    query = db_base.model_query(model) if insecure else _secure_query(model)
+    query = query.filter_by(**kwargs).with_entities(model.id)
+    _delete_execution_logs(
+        models.ExecutionLog.execution_id.in_(query.subquery())
+    )
+
+    return _delete_all(model, insecure=insecure, **kwargs)
+
+
+@db_base.session_aware()
+def create_execution_log(values, session=None):
+    execution_log = models.ExecutionLog()
+    execution_log.update(values.copy())
+
+    try:
+        execution_log.save(session=session)
+    except oslo_db_exc.DBDuplicateEntry as e:
+        raise exc.DBError(
+            "Duplicate entry for ExecutionLog: %s" % e.columns
+        )
+
+    return execution_log
+
+
+@db_base.session_aware()
+def get_execution_log(execution_id, offset=0, length=None, session=None):
+    """Get the logs of the execution.
+
+    Only the part of the logs starting at offset, at most length characters,
+    is read from the database. The access to the execution should be checked
+    by the caller.
+
+    :return: the part of the logs.
+    """
+    model = models.ExecutionLog
+    logs = model.logs
+
+    if offset or length is not None:
+        # The index of the first character is 1 in SQL.
+        args = [model.logs, offset + 1]
+        if length is not None:
+            args.append(length)
+        logs = sa.func.substr(*args)
+
+    execution_log = db_base.model_query(model, (logs,)).filter(
+        model.execution_id == execution_id
+    ).first()
+
+    if not execution_log:
+        raise exc.DBEntityNotFoundError(
+            "Execution log not found [execution_id=%s]" % execution_id
+        )
+
+    return execution_log[0] or ''
+
+
+def _delete_execution_logs(criterion):
+    db_base.model_query(models.ExecutionLog).filter(criterion).delete(
+        synchronize_session=False
+    )
 
 
 @db_base.session_aware()
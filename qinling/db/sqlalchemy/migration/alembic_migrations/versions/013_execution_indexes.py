@@ -0,0 +1,45 @@
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+"""Add indexes for executions table
+
+Revision ID: 013
+Revises: 012
+"""
+
+revision = '013'
+down_revision = '012'
+
+from alembic import op
+
+
+def upgrade():
+    op.create_index(
+        'executions_status_function_id_function_version',
+        'executions',
+        ['status', 'function_id', 'function_version']
+    )
+    op.create_index(
+        'executions_project_id_created_at',
+        'executions',
+        ['project_id', 'created_at', 'id']
+    )
+    op.create_index(
+        'executions_function_id_function_version_created_at',
+        'executions',
+        ['function_id', 'function_version', 'created_at', 'id']
+    )
+    op.create_index(
+        'executions_created_at',
+        'executions',
+        ['created_at', 'id']
+    )
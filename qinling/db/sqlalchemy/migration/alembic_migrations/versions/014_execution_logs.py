@@ -0,0 +1,81 @@
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+"""Move execution logs to execution_logs table
+
+Revision ID: 014
+Revises: 013
+"""
+
+revision = '014'
+down_revision = '013'
+
+from alembic import op
+import sqlalchemy as sa
+
+from qinling.db.sqlalchemy import types as st
+
+
+def upgrade():
+    op.create_table(
+        'execution_logs',
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('execution_id', sa.String(length=36), nullable=False),
+        sa.Column('logs', st.LongText(), nullable=True),
+        sa.Column('size', sa.Integer, nullable=True),
+        sa.Column('truncated', sa.BOOLEAN, nullable=True),
+        sa.PrimaryKeyConstraint('execution_id'),
+        sa.ForeignKeyConstraint(
+            ['execution_id'], [u'executions.id'], ondelete='CASCADE'
+        )
+    )
+
+    executions = sa.table(
+        'executions',
+        sa.column('id', sa.String),
+        sa.column('created_at', sa.DateTime),
+        sa.column('logs', st.LongText),
+    )
+    execution_logs = sa.table(
+        'execution_logs',
+        sa.column('created_at', sa.DateTime),
+        sa.column('execution_id', sa.String),
+        sa.column('logs', st.LongText),
+        sa.column('size', sa.Integer),
+        sa.column('truncated', sa.BOOLEAN),
+    )
+
+    # The size is the number of characters, sqlite doesn't have
+    # CHAR_LENGTH and its LENGTH counts the characters.
+    if op.get_bind().dialect.name == 'sqlite':
+        length = sa.func.length
+    else:
+        length = sa.func.char_length
+
+    op.execute(
+        execution_logs.insert().from_select(
+            ['created_at', 'execution_id', 'logs', 'size', 'truncated'],
+            sa.select([
+                executions.c.created_at,
+                executions.c.id,
+                executions.c.logs,
+                length(executions.c.logs),
+                sa.false(),
+            ]).where(
+                sa.and_(executions.c.logs.isnot(None),
+                        executions.c.logs != '')
+            )
+        )
+    )
+
+    op.drop_column('executions', 'logs')
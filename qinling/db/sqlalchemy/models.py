@@ -52,6 +52,33 @@ class Function(model_base.QinlingSecureModelBase):
 class Execution(model_base.QinlingSecureModelBase):
     __tablename__ = 'executions'
 
+    __table_args__ = (
+        sa.Index(
+            '%s_status_function_id_function_version' % __tablename__,
+            'status',
+            'function_id',
+            'function_version'
+        ),
+        sa.Index(
+            '%s_project_id_created_at' % __tablename__,
+            'project_id',
+            'created_at',
+            'id'
+        ),
+        sa.Index(
+            '%s_function_id_function_version_created_at' % __tablename__,
+            'function_id',
+            'function_version',
+            'created_at',
+            'id'
+        ),
+        sa.Index(
+            '%s_created_at' % __tablename__,
+            'created_at',
+            'id'
+        ),
+    )
+
     function_alias = sa.Column(sa.String(255), nullable=True)
     function_id = sa.Column(sa.String(36), nullable=True)
     function_version = sa.Column(sa.Integer, default=0)
@@ -60,7 +87,25 @@ class Execution(model_base.QinlingSecureModelBase):
     input = sa.Column(st.JsonLongDictType())
     result = sa.Column(st.JsonLongDictType())
     description = sa.Column(sa.String(255))
-    logs = sa.Column(sa.Text(), nullable=True)
+
+
+class ExecutionLog(model_base.QinlingModelBase):
+    """The logs of an execution.
+
+    The logs are kept out of the executions table, they are only loaded when
+    requested.
+    """
+    __tablename__ = 'execution_logs'
+
+    execution_id = sa.Column(
+        sa.String(36),
+        sa.ForeignKey(Execution.id, ondelete='CASCADE'),
+        primary_key=True
+    )
+    logs = sa.Column(st.LongText(), nullable=True)
+    # The size of the logs before they were truncated.
+    size = sa.Column(sa.Integer, default=0)
+    truncated = sa.Column(sa.BOOLEAN, default=False)
 
 
 class Job(model_base.QinlingSecureModelBase):
@@ -123,6 +168,9 @@ class FunctionVersion(model_base.QinlingSecureModelBase):
     description = sa.Column(sa.String(255), nullable=True)
     version_number = sa.Column(sa.Integer, default=0)
     count = sa.Column(sa.Integer, default=0)
+    # The md5 of the version package, it's None for the versions created
+    # before it's recorded.
+    md5sum = sa.Column(sa.String(32), nullable=True)
 
 
 class FunctionAlias(model_base.QinlingSecureModelBase):
@@ -28,10 +28,13 @@ CONF = cfg.CONF
 
 
 class DefaultEngine(object):
-    def __init__(self, orchestrator, qinling_endpoint):
+    def __init__(self, orchestrator, qinling_endpoint, invoker=None):
         self.orchestrator = orchestrator
         self.qinling_endpoint = qinling_endpoint
         self.session = requests.Session()
+        self.invoker = invoker
+        self.execution_counter = utils.ExecutionCounter()
+        self.worker_balancer = utils.WorkerLoadBalancer()
 
     def create_runtime(self, ctx, runtime_id):
         LOG.info('Start to create runtime %s.', runtime_id)
@@ -87,6 +90,38 @@ class DefaultEngine(object):
 
         return self.orchestrator.get_pool(runtime_id)
 
+    def _get_function_load(self, function_id, version):
+        """Get the worker number and concurrency of the function."""
+        workers = etcd_util.get_workers(function_id, version)
+        running_execs = self.execution_counter.get(function_id, version)
+        concurrency = (running_execs or 1) / (len(workers) or 1)
+
+        return len(workers), running_execs, concurrency
+
+    def _acquire_worker(self, function_id, version):
+        """Choose the least loaded worker if the requests go to workers.
+
+        :return: None if the requests should be sent to the service url,
+            otherwise the worker url.
+        """
+        if CONF.engine.worker_routing != 'least_loaded':
+            return None
+
+        # The workers failed to be connected recently are skipped, their
+        # executions were sent to the service url.
+        worker_urls = [
+            url for url in etcd_util.get_worker_urls(function_id, version)
+            if not utils.WORKER_HEALTH.is_unreachable(url)
+        ]
+        if not worker_urls:
+            return None
+
+        return self.worker_balancer.acquire(worker_urls)
+
+    def _release_worker(self, worker_url):
+        if worker_url:
+            self.worker_balancer.release(worker_url)
+
     @tenacity.retry(
         wait=tenacity.wait_fixed(1),
         stop=tenacity.stop_after_attempt(30),
@@ -96,8 +131,18 @@ class DefaultEngine(object):
     def function_load_check(self, function_id, version, runtime_id):
         """Check function load and scale the workers if needed.
 
+        The worker lock is only acquired when the function may need to be
+        scaled up, the executions of a function which has enough workers
+        don't contend for the lock.
+
         :return: None if no need to scale up otherwise return the service url
         """
+        worker_num, _, concurrency = self._get_function_load(function_id,
+                                                             version)
+        if (worker_num > 0 and
+                concurrency <= CONF.engine.function_concurrency):
+            return
+
         with etcd_util.get_worker_lock(function_id, version) as lock:
             if not lock.is_acquired():
                 raise exc.EtcdLockException(
@@ -105,20 +150,18 @@ class DefaultEngine(object):
                     '(version %s).' % (function_id, version)
                 )
 
-            workers = etcd_util.get_workers(function_id, version)
-            running_execs = db_api.get_executions(
-                function_id=function_id,
-                function_version=version,
-                status=status.RUNNING
+            # Check again as the function may have been scaled up while
+            # waiting for the lock.
+            worker_num, running_execs, concurrency = (
+                self._get_function_load(function_id, version)
             )
-            concurrency = (len(running_execs) or 1) / (len(workers) or 1)
-            if (len(workers) == 0 or
+            if (worker_num == 0 or
                     concurrency > CONF.engine.function_concurrency):
                 LOG.info(
                     'Scale up function %s(version %s). Current concurrency: '
                     '%s, execution number %s, worker number %s',
-                    function_id, version, concurrency, len(running_execs),
-                    len(workers)
+                    function_id, version, concurrency, running_execs,
+                    worker_num
                 )
 
                 # NOTE(kong): The increase step could be configurable
@@ -126,13 +169,38 @@ class DefaultEngine(object):
                                              runtime_id, 1)
 
     def create_execution(self, ctx, execution_id, function_id,
-                         function_version, runtime_id, input=None):
+                         function_version, runtime_id, input=None,
+                         is_sync=True):
         LOG.info(
             'Creating execution. execution_id=%s, function_id=%s, '
-            'function_version=%s, runtime_id=%s, input=%s',
-            execution_id, function_id, function_version, runtime_id, input
+            'function_version=%s, runtime_id=%s, input=%s, is_sync=%s',
+            execution_id, function_id, function_version, runtime_id, input,
+            is_sync
         )
 
+        # The execution is counted until its result is recorded, which
+        # happens in the invoker callback if it's handed over to the invoker.
+        self.execution_counter.increase(function_id, function_version)
+        handed_over = False
+        try:
+            handed_over = self._create_execution(
+                execution_id, function_id, function_version, runtime_id,
+                input=input, is_sync=is_sync
+            )
+        finally:
+            if not handed_over:
+                self.execution_counter.decrease(function_id,
+                                                function_version)
+
+    def _create_execution(self, execution_id, function_id, function_version,
+                          runtime_id, input=None, is_sync=True):
+        """Run the execution.
+
+        :return: True if the execution is handed over to the invoker.
+        """
+        # The function is not read from the metadata cache, the package md5
+        # sent to the worker must be the one of the latest package, which
+        # may be updated in the API process.
         function = db_api.get_function(function_id)
         source = function.code['source']
         rlimit = {
@@ -161,21 +229,44 @@ class DefaultEngine(object):
         temp_url = etcd_util.get_service_url(function_id, function_version)
         svc_url = svc_url or temp_url
         if svc_url:
-            func_url = '%s/execute' % svc_url
+            md5sum = self._get_package_md5sum(function, function_version)
+            data = utils.get_request_data(
+                CONF, function_id, function_version, execution_id,
+                rlimit, input, function.entry, function.trust_id,
+                self.qinling_endpoint, function.timeout, md5sum=md5sum
+            )
+
+            worker_url = self._acquire_worker(function_id, function_version)
+            func_url = '%s/execute' % (worker_url or svc_url)
+            # The execution is sent to the service if the worker is gone.
+            fallback_url = '%s/execute' % svc_url if worker_url else None
             LOG.debug(
                 'Found service url for function: %s(version %s), execution: '
                 '%s, url: %s',
                 function_id, function_version, execution_id, func_url
             )
 
-            data = utils.get_request_data(
-                CONF, function_id, function_version, execution_id,
-                rlimit, input, function.entry, function.trust_id,
-                self.qinling_endpoint, function.timeout
-            )
-            success, res = utils.url_request(
-                self.session, func_url, body=data
-            )
+            if self.invoker and not is_sync:
+                # The result is recorded by the invoker when the function
+                # returns, there is no need to hold the RPC thread.
+                def _finish(success, res):
+                    self._release_worker(worker_url)
+                    self.execution_counter.decrease(function_id,
+                                                    function_version)
+                    utils.finish_execution(execution_id, success, res,
+                                           is_image_source=is_image_source)
+
+                self.invoker.invoke(func_url, data, _finish,
+                                    fallback_url=fallback_url)
+                return True
+
+            try:
+                success, res = utils.url_request(
+                    self.session, func_url, body=data,
+                    fallback_url=fallback_url
+                )
+            finally:
+                self._release_worker(worker_url)
 
             utils.finish_execution(execution_id, success, res,
                                    is_image_source=is_image_source)
@@ -244,10 +335,21 @@ class DefaultEngine(object):
             count=count
         )
 
+        if CONF.engine.prefetch_package:
+            self._prefetch_package(function_id, function_version,
+                                   worker_names)
+
         for name in worker_names:
             etcd_util.create_worker(function_id, name,
                                     version=function_version)
 
+            if CONF.engine.worker_routing == 'least_loaded':
+                etcd_util.create_worker_url(
+                    function_id, name,
+                    self.orchestrator.get_worker_url(name),
+                    version=function_version
+                )
+
         etcd_util.create_service_url(function_id, service_url,
                                      version=function_version)
 
@@ -256,6 +358,37 @@ class DefaultEngine(object):
 
         return service_url
 
+    def _get_package_md5sum(self, function, function_version):
+        """Get the md5 of the package the workers should run."""
+        if function_version == 0:
+            return function.code.get('md5sum')
+
+        version_db = db_api.get_function_version(function.id,
+                                                 function_version)
+        return version_db.md5sum
+
+    def _prefetch_package(self, function_id, function_version, workers):
+        """Download the function package to the new workers.
+
+        The workers are registered after the package is ready, so the first
+        executions on them don't wait for the download. A worker failed to
+        prefetch still downloads the package when it runs the execution.
+        """
+        function = db_api.get_function(function_id)
+        md5sum = self._get_package_md5sum(function, function_version)
+        data = utils.get_download_data(
+            CONF, function_id, function_version, self.qinling_endpoint,
+            md5sum=md5sum
+        )
+
+        for name in workers:
+            try:
+                self.orchestrator.prefetch_package(name, data)
+            except exc.OrchestratorException as e:
+                LOG.warning('Failed to prefetch package for function '
+                            '%s(version %s) in worker %s: %s', function_id,
+                            function_version, name, str(e))
+
     def scaledown_function(self, ctx, function_id, function_version=0,
                            count=1):
         workers = etcd_util.get_workers(function_id, function_version)
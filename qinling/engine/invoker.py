@@ -0,0 +1,209 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+import asyncio
+from concurrent import futures
+import threading
+
+import aiohttp
+from oslo_config import cfg
+from oslo_log import log as logging
+
+from qinling import context
+from qinling.engine import utils
+
+LOG = logging.getLogger(__name__)
+CONF = cfg.CONF
+
+# Seconds to wait for the event loop to start or stop.
+LOOP_TIMEOUT = 10
+
+
+class AsyncInvoker(object):
+    """Invoke functions from an asyncio event loop.
+
+    The engine RPC thread hands the execution request over to the invoker
+    and returns immediately, the event loop waits for the function result
+    using a pooled HTTP client so that a single engine process can hold a
+    large number of in-flight executions. When the function returns, the
+    callback is run in a small thread pool because it accesses the database.
+    """
+
+    def __init__(self, conf=None):
+        self.conf = conf or CONF
+        self.loop = None
+        self.session = None
+        self._thread = None
+        self._callback_executor = futures.ThreadPoolExecutor(
+            max_workers=self.conf.engine.async_invoke_callback_workers
+        )
+
+    def start(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_loop)
+        self._thread.daemon = True
+        self._thread.start()
+
+        # The HTTP session needs to be created in the running event loop.
+        self.session = asyncio.run_coroutine_threadsafe(
+            self._create_session(), self.loop
+        ).result(timeout=LOOP_TIMEOUT)
+
+        LOG.info('Async function invoker started.')
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    async def _create_session(self):
+        return aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=self.conf.engine.async_invoke_connection_limit,
+                ssl=False
+            )
+        )
+
+    def stop(self):
+        if not self.loop:
+            return
+
+        try:
+            if self.session:
+                asyncio.run_coroutine_threadsafe(
+                    self.session.close(), self.loop
+                ).result(timeout=LOOP_TIMEOUT)
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(timeout=LOOP_TIMEOUT)
+            if self._thread.is_alive():
+                LOG.warning('Async function invoker event loop not stopped '
+                            'in %s seconds.', LOOP_TIMEOUT)
+            else:
+                self.loop.close()
+            self.loop = None
+            self.session = None
+            self._callback_executor.shutdown(wait=True)
+
+        LOG.info('Async function invoker stopped.')
+
+    def invoke(self, url, body, callback, fallback_url=None):
+        """Send the execution request without waiting for the result.
+
+        :param fallback_url: Optional. The url the request is sent to instead
+            if the service can not be connected.
+        :param callback: called with (success, result) once the function
+            returns, in the same way as the return value of url_request.
+        """
+        ctx = context.get_ctx() if context.has_ctx() else None
+
+        def _run_callback(success, res):
+            context.set_ctx(ctx)
+            try:
+                callback(success, res)
+            except Exception:
+                LOG.exception('Failed to handle result of %s', url)
+            finally:
+                context.set_ctx(None)
+
+        async def _invoke():
+            success, res = await self.url_request(url, body=body,
+                                                  fallback_url=fallback_url)
+            await self.loop.run_in_executor(
+                self._callback_executor, _run_callback, success, res
+            )
+
+        return asyncio.run_coroutine_threadsafe(_invoke(), self.loop)
+
+    async def _ping(self, ping_url, attempts=utils.PING_ATTEMPTS):
+        """Ping the service until it responds, like utils._ping_service."""
+        exception = None
+        timeout = aiohttp.ClientTimeout(
+            total=utils.CONNECT_TIMEOUT + utils.PING_TIMEOUT,
+            sock_connect=utils.CONNECT_TIMEOUT
+        )
+
+        for a in range(attempts):
+            if a > 0:
+                await asyncio.sleep(utils.PING_INTERVAL)
+
+            try:
+                async with self.session.get(ping_url, timeout=timeout):
+                    return True
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                exception = e
+
+        LOG.error("Failed to request url %s, error: %s", ping_url,
+                  str(exception))
+
+        return False
+
+    async def url_request(self, url, body=None, fallback_url=None):
+        """Send request to a service url.
+
+        This is the asyncio counterpart of qinling.engine.utils.url_request.
+        """
+        exception = None
+        service_url, ping_url = utils.get_service_urls(url)
+
+        async def _fall_back():
+            LOG.warning("Failed to connect to %s, send the request to %s.",
+                        url, fallback_url)
+            utils.WORKER_HEALTH.mark_unreachable(service_url)
+            return await self.url_request(fallback_url, body=body)
+
+        pinged = False
+        if not utils.WORKER_HEALTH.is_fresh(service_url):
+            attempts = 1 if fallback_url else utils.PING_ATTEMPTS
+            if not await self._ping(ping_url, attempts=attempts):
+                if fallback_url:
+                    return await _fall_back()
+                return utils.get_failed_result(utils.PING_FAILED_OUTPUT)
+
+            pinged = True
+            utils.WORKER_HEALTH.mark_healthy(service_url)
+
+        timeout = aiohttp.ClientTimeout(
+            total=utils.get_request_timeout(body),
+            sock_connect=utils.CONNECT_TIMEOUT
+        )
+
+        for a in range(utils.REQUEST_ATTEMPTS):
+            try:
+                async with self.session.post(url, json=body,
+                                             timeout=timeout) as res:
+                    ret = await res.json(content_type=None)
+                    return utils.get_request_result(service_url, ret)
+            except aiohttp.ClientConnectionError as e:
+                exception = e
+                utils.WORKER_HEALTH.invalidate(service_url)
+
+                if fallback_url:
+                    return await _fall_back()
+
+                if pinged:
+                    await asyncio.sleep(utils.REQUEST_INTERVAL)
+                    continue
+
+                LOG.debug("Failed to connect to %s, ping the service.", url)
+                if not await self._ping(ping_url):
+                    return utils.get_failed_result(utils.PING_FAILED_OUTPUT)
+                pinged = True
+            except Exception as e:
+                LOG.exception(
+                    "Failed to request url %s, error: %s", url, str(e)
+                )
+                return utils.get_failed_result(utils.REQUEST_FAILED_OUTPUT)
+
+        LOG.error("Could not connect to function service. Reason: %s",
+                  exception)
+
+        return utils.get_failed_result(utils.CONNECT_FAILED_OUTPUT)
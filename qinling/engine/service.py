@@ -20,6 +20,7 @@ from oslo_messaging.rpc import dispatcher
 
 from qinling.db import api as db_api
 from qinling.engine import default_engine as engine
+from qinling.engine import invoker as engine_invoker
 from qinling.orchestrator import base as orchestra_base
 from qinling import rpc
 from qinling.services import periodics
@@ -33,6 +34,7 @@ class EngineService(cotyledon.Service):
     def __init__(self, worker_id):
         super(EngineService, self).__init__(worker_id)
         self.server = None
+        self.invoker = None
 
     def run(self):
         qinling_endpoint = keystone_utils.get_qinling_endpoint()
@@ -43,7 +45,13 @@ class EngineService(cotyledon.Service):
         server = CONF.engine.host
         transport = messaging.get_rpc_transport(CONF)
         target = messaging.Target(topic=topic, server=server, fanout=False)
-        endpoint = engine.DefaultEngine(orchestrator, qinling_endpoint)
+
+        if CONF.engine.async_invoke:
+            self.invoker = engine_invoker.AsyncInvoker(CONF)
+            self.invoker.start()
+
+        endpoint = engine.DefaultEngine(orchestrator, qinling_endpoint,
+                                        invoker=self.invoker)
         access_policy = dispatcher.DefaultRPCAccessPolicy
         self.server = messaging.get_rpc_server(
             transport,
@@ -68,3 +76,6 @@ class EngineService(cotyledon.Service):
             LOG.info('Stopping engine...')
             self.server.stop()
             self.server.wait()
+
+        if self.invoker:
+            self.invoker.stop()
@@ -11,8 +11,11 @@
 #    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 #    License for the specific language governing permissions and limitations
 #    under the License.
+import random
+import threading
 import time
 
+from oslo_config import cfg
 from oslo_log import log as logging
 import requests
 import tenacity
@@ -23,41 +26,317 @@ from qinling import status
 from qinling.utils import constants
 
 LOG = logging.getLogger(__name__)
+CONF = cfg.CONF
 
 
-def url_request(request_session, url, body=None):
-    """Send request to a service url."""
-    exception = None
+class WorkerHealthCache(object):
+    """Records when each function service was last known to be healthy.
+
+    A service is known to be healthy when it answered a ping request or
+    successfully handled an execution request. The engine skips the ping
+    request for the services that are still fresh. The workers that could
+    not be connected are recorded as well so that they are not chosen for
+    the executions during the same period.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_healthy = {}
+        self._unreachable = {}
+
+    def is_fresh(self, service_url):
+        ttl = CONF.engine.worker_health_ttl
+        if ttl <= 0:
+            return False
+
+        with self._lock:
+            last_healthy = self._last_healthy.get(service_url)
+            if last_healthy is None:
+                return False
+
+            if time.monotonic() - last_healthy > ttl:
+                del self._last_healthy[service_url]
+                return False
+
+            return True
+
+    def mark_healthy(self, service_url):
+        with self._lock:
+            self._last_healthy[service_url] = time.monotonic()
+            self._unreachable.pop(service_url, None)
+
+    def invalidate(self, service_url):
+        with self._lock:
+            self._last_healthy.pop(service_url, None)
+
+    def mark_unreachable(self, service_url):
+        now = time.monotonic()
+        ttl = CONF.engine.worker_health_ttl
+
+        with self._lock:
+            self._last_healthy.pop(service_url, None)
+
+            # The urls of the deleted workers are never checked again.
+            for url, unreachable in list(self._unreachable.items()):
+                if now - unreachable > ttl:
+                    del self._unreachable[url]
+
+            if ttl > 0:
+                self._unreachable[service_url] = now
+
+    def is_unreachable(self, service_url):
+        with self._lock:
+            unreachable = self._unreachable.get(service_url)
+            if unreachable is None:
+                return False
+
+            if (time.monotonic() - unreachable >
+                    CONF.engine.worker_health_ttl):
+                del self._unreachable[service_url]
+                return False
+
+            return True
+
+
+WORKER_HEALTH = WorkerHealthCache()
+
+
+class ExecutionCounter(object):
+    """Counts the in-flight executions of each function version.
+
+    The counter counts the executions handled by the current engine, it's
+    used by the engine to make scaling decisions without querying the
+    database for every execution. The executions handled by the other
+    engines are estimated from the running executions in database when the
+    counter is reconciled.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {}
+        # The running executions of the other engines at the last reconcile.
+        self._others = {}
+
+    def get(self, function_id, version=0):
+        """Get the in-flight executions of all the engines."""
+        key = (function_id, version)
+
+        with self._lock:
+            return self._counts.get(key, 0) + self._others.get(key, 0)
+
+    def increase(self, function_id, version=0):
+        """Count a new execution, return the count of this engine."""
+        with self._lock:
+            key = (function_id, version)
+            self._counts[key] = self._counts.get(key, 0) + 1
+            return self._counts[key]
+
+    def decrease(self, function_id, version=0):
+        """Count down a finished execution, return the count of this engine.
+        """
+        with self._lock:
+            key = (function_id, version)
+            count = self._counts.get(key, 0) - 1
+            if count > 0:
+                self._counts[key] = count
+            else:
+                self._counts.pop(key, None)
+            return max(count, 0)
+
+    def reconcile(self, running_counts):
+        """Correct the counter with the running executions in database.
+
+        The executions handled by this engine are a subset of the running
+        executions in database, so the local count should never be greater
+        than the database one. A greater value means some executions were
+        not counted down, e.g. their status was changed by someone else.
+        The rest of the running executions are handled by the other engines.
+
+        :param running_counts: a dict of running execution number keyed by
+            (function_id, version).
+        """
+        with self._lock:
+            for key, count in list(self._counts.items()):
+                running = running_counts.get(key, 0)
+                if count <= running:
+                    continue
+
+                LOG.debug('Reconcile execution count of function %s'
+                          '(version %s) from %s to %s', key[0], key[1],
+                          count, running)
+                if running > 0:
+                    self._counts[key] = running
+                else:
+                    del self._counts[key]
+
+            self._others = {}
+            for key, running in running_counts.items():
+                others = running - self._counts.get(key, 0)
+                if others > 0:
+                    self._others[key] = others
+
+
+class WorkerLoadBalancer(object):
+    """Chooses the worker with the least in-flight executions.
+
+    Only the executions sent by the current engine are taken into account.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loads = {}
+
+    def acquire(self, worker_urls):
+        """Choose a worker and count the new execution on it."""
+        with self._lock:
+            # Break ties randomly so that the engines don't all choose the
+            # same worker.
+            url = min(
+                worker_urls,
+                key=lambda u: (self._loads.get(u, 0), random.random())
+            )
+            self._loads[url] = self._loads.get(url, 0) + 1
+            return url
+
+    def release(self, worker_url):
+        with self._lock:
+            load = self._loads.get(worker_url, 0) - 1
+            if load > 0:
+                self._loads[worker_url] = load
+            else:
+                self._loads.pop(worker_url, None)
+
+    def get_load(self, worker_url):
+        with self._lock:
+            return self._loads.get(worker_url, 0)
+
+
+# A function service is pinged every second until it responds.
+PING_ATTEMPTS = 30
+PING_INTERVAL = 1
+PING_TIMEOUT = 3
+# The execution request is sent again when the service can't be connected.
+REQUEST_ATTEMPTS = 10
+REQUEST_INTERVAL = 1
+CONNECT_TIMEOUT = 3
+
+PING_FAILED_OUTPUT = 'Function execution failed.'
+REQUEST_FAILED_OUTPUT = 'Function execution timeout.'
+CONNECT_FAILED_OUTPUT = 'Internal service error.'
+
+
+def get_service_urls(url):
+    """Get the service url and the ping url of a function request url."""
+    temp = url.split('/')
+    temp[-1] = 'ping'
+
+    return '/'.join(temp[:-1]), '/'.join(temp)
+
+
+def get_request_timeout(body):
+    """Get the time in seconds to wait for the result of a request.
+
+    The worker may need to download the function package before running
+    the function, the engine waits for the margin on top of the function
+    timeout.
+    """
+    timeout = ((body or {}).get('timeout') or
+               CONF.resource_limits.default_timeout)
+
+    return timeout + CONF.engine.execution_timeout_margin
 
-    # Send ping request first to make sure the url works
+
+def get_request_result(service_url, result):
+    """Get the return value of url_request from the function response."""
+    WORKER_HEALTH.mark_healthy(service_url)
+
+    return True, result
+
+
+def get_failed_result(output):
+    """Get the return value of url_request when the request failed."""
+    return False, {'output': output}
+
+
+def _ping_service(request_session, ping_url, attempts=PING_ATTEMPTS):
+    """Ping the service until it responds, return False if it never does."""
     try:
-        temp = url.split('/')
-        temp[-1] = 'ping'
-        ping_url = '/'.join(temp)
         r = tenacity.Retrying(
-            wait=tenacity.wait_fixed(1),
-            stop=tenacity.stop_after_attempt(30),
+            wait=tenacity.wait_fixed(PING_INTERVAL),
+            stop=tenacity.stop_after_attempt(attempts),
             reraise=True,
             retry=tenacity.retry_if_exception_type(IOError)
         )
-        r.call(request_session.get, ping_url, timeout=(3, 3), verify=False)
+        r.call(request_session.get, ping_url,
+               timeout=(CONNECT_TIMEOUT, PING_TIMEOUT), verify=False)
     except Exception as e:
         LOG.exception(
             "Failed to request url %s, error: %s", ping_url, str(e)
         )
-        return False, {'output': 'Function execution failed.'}
+        return False
+
+    return True
+
+
+def url_request(request_session, url, body=None, fallback_url=None):
+    """Send request to a service url.
+
+    The service is pinged before sending the request unless it is known to
+    be healthy recently, in which case the ping request is only sent if the
+    service can not be connected.
+
+    :param fallback_url: Optional. The url the request is sent to instead if
+        the service can not be connected, e.g. the function service url when
+        the request is sent to a worker. The service is pinged only once and
+        recorded as unreachable if it fails.
+    """
+    exception = None
+    service_url, ping_url = get_service_urls(url)
+
+    def _fall_back():
+        LOG.warning("Failed to connect to %s, send the request to %s.",
+                    url, fallback_url)
+        WORKER_HEALTH.mark_unreachable(service_url)
+        return url_request(request_session, fallback_url, body=body)
 
-    for a in range(10):
+    pinged = False
+    if not WORKER_HEALTH.is_fresh(service_url):
+        # Send ping request first to make sure the url works
+        attempts = 1 if fallback_url else PING_ATTEMPTS
+        if not _ping_service(request_session, ping_url, attempts=attempts):
+            if fallback_url:
+                return _fall_back()
+            return get_failed_result(PING_FAILED_OUTPUT)
+
+        pinged = True
+        WORKER_HEALTH.mark_healthy(service_url)
+
+    timeout = (CONNECT_TIMEOUT, get_request_timeout(body))
+
+    for a in range(REQUEST_ATTEMPTS):
         res = None
         try:
-            # Default execution max duration is 3min, could be configurable
             res = request_session.post(
-                url, json=body, timeout=(3, 180), verify=False
+                url, json=body, timeout=timeout, verify=False
             )
-            return True, res.json()
+            return get_request_result(service_url, res.json())
         except requests.ConnectionError as e:
             exception = e
-            time.sleep(1)
+            WORKER_HEALTH.invalidate(service_url)
+
+            if fallback_url:
+                return _fall_back()
+
+            if pinged:
+                time.sleep(REQUEST_INTERVAL)
+                continue
+
+            # The service was assumed to be healthy, fall back to wait for
+            # it to be available.
+            LOG.debug("Failed to connect to %s, ping the service.", url)
+            if not _ping_service(request_session, ping_url):
+                return get_failed_result(PING_FAILED_OUTPUT)
+            pinged = True
         except Exception as e:
             LOG.exception(
                 "Failed to request url %s, error: %s", url, str(e)
@@ -66,31 +345,54 @@ def url_request(request_session, url, body=None):
                 LOG.error("Response status: %s, content: %s",
                           res.status_code, res.content)
 
-            return False, {'output': 'Function execution timeout.'}
+            return get_failed_result(REQUEST_FAILED_OUTPUT)
 
     LOG.exception("Could not connect to function service. Reason: %s",
                   exception)
 
-    return False, {'output': 'Internal service error.'}
+    return get_failed_result(CONNECT_FAILED_OUTPUT)
 
 
-def get_request_data(conf, function_id, version, execution_id, rlimit, input,
-                     entry, trust_id, qinling_endpoint, timeout):
-    """Prepare the request body should send to the worker."""
-    ctx = context.get_ctx()
-
+def get_download_url(qinling_endpoint, function_id, version):
     if version == 0:
-        download_url = (
+        return (
             '%s/%s/functions/%s?download=true' %
             (qinling_endpoint.strip('/'), constants.CURRENT_VERSION,
              function_id)
         )
-    else:
-        download_url = (
-            '%s/%s/functions/%s/versions/%s?download=true' %
-            (qinling_endpoint.strip('/'), constants.CURRENT_VERSION,
-             function_id, version)
-        )
+
+    return (
+        '%s/%s/functions/%s/versions/%s?download=true' %
+        (qinling_endpoint.strip('/'), constants.CURRENT_VERSION,
+         function_id, version)
+    )
+
+
+def get_download_data(conf, function_id, version, qinling_endpoint,
+                      md5sum=None):
+    """Prepare the request body should send to the worker sidecar."""
+    data = {
+        'function_id': function_id,
+        'function_version': version,
+        'download_url': get_download_url(qinling_endpoint, function_id,
+                                         version),
+        'md5sum': md5sum,
+        'unzip': True,
+    }
+    if conf.pecan.auth_enable:
+        data['token'] = context.get_ctx().auth_token
+
+    return data
+
+
+def get_request_data(conf, function_id, version, execution_id, rlimit, input,
+                     entry, trust_id, qinling_endpoint, timeout, md5sum=None):
+    """Prepare the request body should send to the worker.
+
+    :param md5sum: Optional. The md5 of the function package, it's used by
+        the worker to tell whether the package it has is up to date.
+    """
+    ctx = context.get_ctx()
 
     data = {
         'execution_id': execution_id,
@@ -100,9 +402,11 @@ def get_request_data(conf, function_id, version, execution_id, rlimit, input,
         'function_id': function_id,
         'function_version': version,
         'entry': entry,
-        'download_url': download_url,
+        'download_url': get_download_url(qinling_endpoint, function_id,
+                                         version),
         'request_id': ctx.request_id,
         'timeout': timeout,
+        'md5sum': md5sum,
     }
     if conf.pecan.auth_enable:
         data.update(
@@ -118,15 +422,38 @@ def get_request_data(conf, function_id, version, execution_id, rlimit, input,
     return data
 
 
+def _truncate_logs(logs):
+    """Truncate the logs to the max size, the end of the logs is kept."""
+    max_size = CONF.engine.execution_log_max_size
+    if len(logs) <= max_size:
+        return logs, False
+
+    marker = constants.EXECUTION_LOG_TRUNCATED % (len(logs) - max_size)
+    return marker + logs[-max_size:], True
+
+
 def db_set_execution_status(execution_id, execution_status, logs, res):
-    db_api.update_execution(
-        execution_id,
-        {
-            'status': execution_status,
-            'logs': logs,
-            'result': res
-        }
-    )
+    with db_api.transaction():
+        db_api.update_execution(
+            execution_id,
+            {
+                'status': execution_status,
+                'result': res
+            }
+        )
+
+        # The logs are stored out of the executions table, nothing is stored
+        # for the executions without logs.
+        if logs:
+            stored_logs, truncated = _truncate_logs(logs)
+            db_api.create_execution_log(
+                {
+                    'execution_id': execution_id,
+                    'logs': stored_logs,
+                    'size': len(logs),
+                    'truncated': truncated
+                }
+            )
 
 
 def finish_execution(execution_id, success, res, is_image_source=False):
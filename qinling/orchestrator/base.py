@@ -61,6 +61,14 @@ class OrchestratorBase(object, metaclass=abc.ABCMeta):
     def delete_worker(self, worker_name, **kwargs):
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def get_worker_url(self, worker_name, **kwargs):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def prefetch_package(self, worker_name, data, **kwargs):
+        raise NotImplementedError
+
 
 def load_orchestrator(conf, qinling_endpoint):
     global ORCHESTRATOR
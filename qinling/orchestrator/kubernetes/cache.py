@@ -0,0 +1,187 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+import threading
+import time
+
+from kubernetes import watch
+from oslo_log import log as logging
+
+LOG = logging.getLogger(__name__)
+
+# The watch is restarted periodically to refresh the whole cache.
+WATCH_TIMEOUT = 300
+
+
+def _is_older(obj, resource_version):
+    """Check if the resource is older than the given resource version.
+
+    The resource versions should be opaque to the clients, but they are the
+    etcd revisions, so they are compared as integers. The resource is not
+    taken as older if any of the versions is not an integer.
+    """
+    try:
+        return int(obj.metadata.resource_version) < int(resource_version)
+    except (TypeError, ValueError):
+        return False
+
+
+class ResourceCache(object):
+    """Local cache of the Kubernetes resources in a namespace.
+
+    The resources are listed once and then kept up to date by the watch API
+    in a background thread, so that reading the resources doesn't need to
+    call the Kubernetes API. Callers can also wait for a resource to reach
+    a given state without polling.
+    """
+
+    def __init__(self, list_func, namespace, kind):
+        self.list_func = list_func
+        self.namespace = namespace
+        self.kind = kind
+
+        self._cond = threading.Condition()
+        self._items = {}
+        self._watch = None
+        self._stopped = False
+        self._thread = None
+
+    def start(self):
+        # The initial listing is done in the caller thread so that the cache
+        # is ready to use when start() returns.
+        resource_version = self._relist()
+
+        self._thread = threading.Thread(target=self._run,
+                                        args=(resource_version,))
+        self._thread.daemon = True
+        self._thread.start()
+
+        LOG.info('Kubernetes %s cache started.', self.kind)
+
+    def stop(self):
+        self._stopped = True
+        if self._watch:
+            self._watch.stop()
+
+    def _relist(self):
+        ret = self.list_func(self.namespace)
+        list_version = ret.metadata.resource_version
+
+        with self._cond:
+            items = {}
+            for obj in ret.items:
+                old = self._items.get(obj.metadata.name)
+                # The resource may be updated by put() after it's listed.
+                if old is not None and _is_older(
+                    obj, old.metadata.resource_version
+                ):
+                    obj = old
+                items[obj.metadata.name] = obj
+
+            # The resources not listed are deleted, unless they are put()
+            # after the list.
+            for name, old in self._items.items():
+                if name not in items and _is_older(
+                    ret, old.metadata.resource_version
+                ):
+                    items[name] = old
+
+            self._items = items
+            self._cond.notify_all()
+
+        return list_version
+
+    def _run(self, resource_version):
+        while not self._stopped:
+            try:
+                if not resource_version:
+                    resource_version = self._relist()
+
+                self._watch = watch.Watch()
+                for event in self._watch.stream(
+                    self.list_func, self.namespace,
+                    resource_version=resource_version,
+                    timeout_seconds=WATCH_TIMEOUT
+                ):
+                    if event['type'] == 'ERROR':
+                        # Most likely the resource version is too old, list
+                        # the resources again.
+                        LOG.debug('Kubernetes %s watch error: %s', self.kind,
+                                  event['object'])
+                        break
+
+                    self._handle_event(event['type'], event['object'])
+            except Exception:
+                LOG.exception('Failed to watch Kubernetes %s.', self.kind)
+                time.sleep(1)
+
+            resource_version = None
+
+    def _handle_event(self, event_type, obj):
+        with self._cond:
+            old = self._items.get(obj.metadata.name)
+
+            if event_type == 'DELETED':
+                self._items.pop(obj.metadata.name, None)
+            elif old is None or not _is_older(
+                obj, old.metadata.resource_version
+            ):
+                # The watch event may be older than the resource put().
+                self._items[obj.metadata.name] = obj
+
+            self._cond.notify_all()
+
+    def put(self, obj):
+        """Update the cache with the resource returned by an API call.
+
+        So that the change made by the engine is seen immediately instead of
+        after the watch event is received.
+        """
+        self._handle_event('MODIFIED', obj)
+
+    def get(self, name):
+        with self._cond:
+            return self._items.get(name)
+
+    def list(self, labels=None, without_labels=None):
+        """List the resources.
+
+        :param labels: a dict of labels the resources should have.
+        :param without_labels: a list of label keys the resources should
+            not have.
+        """
+        labels = labels or {}
+        without_labels = without_labels or []
+
+        def _match(obj):
+            obj_labels = obj.metadata.labels or {}
+            if any(k in obj_labels for k in without_labels):
+                return False
+            return all(obj_labels.get(k) == str(v) for k, v in labels.items())
+
+        with self._cond:
+            return [i for i in self._items.values() if _match(i)]
+
+    def wait_for(self, name, predicate, timeout=None):
+        """Wait until the resource satisfies the predicate.
+
+        :param predicate: a function accepting the resource, or None if the
+            resource doesn't exist.
+        :return: the resource, or None if timeout.
+        """
+        with self._cond:
+            if self._cond.wait_for(
+                lambda: predicate(self._items.get(name)), timeout=timeout
+            ):
+                return self._items.get(name)
+
+        return None
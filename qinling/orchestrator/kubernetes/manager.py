@@ -26,6 +26,7 @@ import yaml
 from qinling.engine import utils
 from qinling import exceptions as exc
 from qinling.orchestrator import base
+from qinling.orchestrator.kubernetes import cache as k8s_cache
 from qinling.orchestrator.kubernetes import utils as k8s_util
 from qinling.utils import common
 
@@ -33,6 +34,18 @@ from qinling.utils import common
 LOG = logging.getLogger(__name__)
 
 TEMPLATES_DIR = (os.path.dirname(os.path.realpath(__file__)) + '/templates/')
+# The port the runtime server listens on in the worker container.
+WORKER_PORT = 9090
+
+
+def _deployment_available(deployment):
+    return (deployment is not None and deployment.status.replicas and
+            deployment.status.replicas ==
+            deployment.status.available_replicas)
+
+
+def _pod_succeeded(pod):
+    return pod is not None and pod.status.phase == 'Succeeded'
 
 
 class KubernetesManager(base.OrchestratorBase):
@@ -64,6 +77,22 @@ class KubernetesManager(base.OrchestratorBase):
         # http://docs.python-requests.org/en/master/user/advanced/#session-objects
         self.session = requests.Session()
 
+        self.pod_cache = None
+        self.deployment_cache = None
+        if self.conf.kubernetes.use_watch_cache:
+            self.pod_cache = k8s_cache.ResourceCache(
+                self.v1.list_namespaced_pod,
+                self.conf.kubernetes.namespace,
+                'pod'
+            )
+            self.pod_cache.start()
+            self.deployment_cache = k8s_cache.ResourceCache(
+                self.v1extension.list_namespaced_deployment,
+                self.conf.kubernetes.namespace,
+                'deployment'
+            )
+            self.deployment_cache.start()
+
     def _ensure_namespace(self):
         ret = self.v1.list_namespace()
         cur_names = [i.metadata.name for i in ret.items]
@@ -92,27 +121,56 @@ class KubernetesManager(base.OrchestratorBase):
         reraise=True,
         retry=tenacity.retry_if_exception_type(exc.OrchestratorException)
     )
-    def _wait_deployment_available(self, name):
+    def _poll_deployment_available(self, name):
         ret = self.v1extension.read_namespaced_deployment(
             name,
             self.conf.kubernetes.namespace
         )
 
-        if (not ret.status.replicas or
-                ret.status.replicas != ret.status.available_replicas):
+        if not _deployment_available(ret):
             raise exc.OrchestratorException('Deployment %s not ready.' % name)
 
+    def _wait_deployment_available(self, name):
+        if not self.deployment_cache:
+            return self._poll_deployment_available(name)
+
+        if not self.deployment_cache.wait_for(name, _deployment_available,
+                                              timeout=600):
+            raise exc.OrchestratorException('Deployment %s not ready.' % name)
+
+    def _list_pods(self, labels, without_labels=None):
+        if self.pod_cache:
+            return self.pod_cache.list(labels=labels,
+                                       without_labels=without_labels)
+
+        selector = common.convert_dict_to_string(labels)
+        if without_labels:
+            selector = ','.join(
+                ['!%s' % k for k in without_labels] + [selector]
+            )
+
+        ret = self.v1.list_namespaced_pod(
+            self.conf.kubernetes.namespace,
+            label_selector=selector
+        )
+        return ret.items
+
     def get_pool(self, name):
         total = 0
         available = 0
 
-        try:
-            ret = self.v1extension.read_namespaced_deployment(
-                name,
-                namespace=self.conf.kubernetes.namespace
-            )
-        except Exception:
-            raise exc.RuntimeNotFoundException()
+        if self.deployment_cache:
+            ret = self.deployment_cache.get(name)
+            if not ret:
+                raise exc.RuntimeNotFoundException()
+        else:
+            try:
+                ret = self.v1extension.read_namespaced_deployment(
+                    name,
+                    namespace=self.conf.kubernetes.namespace
+                )
+            except Exception:
+                raise exc.RuntimeNotFoundException()
 
         if not ret.status.replicas:
             return {"total": total, "available": available}
@@ -120,12 +178,8 @@ class KubernetesManager(base.OrchestratorBase):
         total = ret.status.replicas
 
         labels = {'runtime_id': name}
-        selector = common.convert_dict_to_string(labels)
-        ret = self.v1.list_namespaced_pod(
-            self.conf.kubernetes.namespace,
-            label_selector='!function_id,%s' % selector
-        )
-        available = len(ret.items)
+        pods = self._list_pods(labels, without_labels=['function_id'])
+        available = len(pods)
 
         return {"total": total, "available": available}
 
@@ -138,7 +192,9 @@ class KubernetesManager(base.OrchestratorBase):
                 "container_name": 'worker',
                 "image": image,
                 "sidecar_image": self.conf.engine.sidecar_image,
-                "trusted": str(trusted).lower()
+                "trusted": str(trusted).lower(),
+                "package_cache_host_path":
+                    self.conf.kubernetes.package_cache_host_path
             }
         )
 
@@ -260,29 +316,24 @@ class KubernetesManager(base.OrchestratorBase):
                                function_version=0):
         # If there is already a pod for function, reuse it.
         if function_id:
-            ret = self.v1.list_namespaced_pod(
-                self.conf.kubernetes.namespace,
-                label_selector='function_id=%s,function_version=%s' %
-                               (function_id, function_version)
+            pods = self._list_pods(
+                {'function_id': function_id,
+                 'function_version': function_version}
             )
-            if len(ret.items) >= count:
+            if len(pods) >= count:
                 LOG.debug(
                     "Function %s(version %s) already associates to a pod with "
                     "at least %d worker(s). ",
                     function_id, function_version, count
                 )
-                return ret.items[:count]
+                return pods[:count]
 
-        selector = common.convert_dict_to_string(labels)
-        ret = self.v1.list_namespaced_pod(
-            self.conf.kubernetes.namespace,
-            label_selector='!function_id,%s' % selector
-        )
+        pods = self._list_pods(labels, without_labels=['function_id'])
 
-        if len(ret.items) < count:
+        if len(pods) < count:
             return []
 
-        return ret.items[-count:]
+        return pods[-count:]
 
     def _prepare_pod(self, pod, deployment_name, function_id, version,
                      labels=None):
@@ -406,9 +457,12 @@ class KubernetesManager(base.OrchestratorBase):
                 'labels': pod_labels
             }
         }
-        self.v1.patch_namespaced_pod(
+        ret = self.v1.patch_namespaced_pod(
             name, self.conf.kubernetes.namespace, body
         )
+        if self.pod_cache:
+            # Make sure the pod is not chosen again as a free worker.
+            self.pod_cache.put(ret)
 
         LOG.debug('Labels updated for pod %s', name)
 
@@ -495,14 +549,20 @@ class KubernetesManager(base.OrchestratorBase):
 
             duration = 0
             try:
-                r = tenacity.Retrying(
-                    wait=tenacity.wait_fixed(1),
-                    stop=tenacity.stop_after_delay(timeout),
-                    retry=tenacity.retry_if_exception_type(
-                        exc.TimeoutException),
-                    reraise=True
-                )
-                pod = r.call(_wait_complete)
+                if self.pod_cache:
+                    pod = self.pod_cache.wait_for(identifier, _pod_succeeded,
+                                                  timeout=timeout)
+                    if not pod:
+                        raise exc.TimeoutException()
+                else:
+                    r = tenacity.Retrying(
+                        wait=tenacity.wait_fixed(1),
+                        stop=tenacity.stop_after_delay(timeout),
+                        retry=tenacity.retry_if_exception_type(
+                            exc.TimeoutException),
+                        reraise=True
+                    )
+                    pod = r.call(_wait_complete)
 
                 statuses = pod.status.container_statuses
                 for s in statuses:
@@ -590,3 +650,43 @@ class KubernetesManager(base.OrchestratorBase):
             pod_name,
             self.conf.kubernetes.namespace,
         )
+
+    def get_worker_url(self, pod_name, **kwargs):
+        """Get the address to send requests to the pod directly."""
+        pod = self.v1.read_namespaced_pod(
+            pod_name,
+            self.conf.kubernetes.namespace
+        )
+
+        return 'http://%s:%s' % (pod.status.pod_ip, WORKER_PORT)
+
+    def prefetch_package(self, pod_name, data, **kwargs):
+        """Ask the pod to download the function package.
+
+        The sidecar only listens on the loopback interface of the pod, the
+        request is sent to the runtime server, which passes it to the
+        sidecar.
+
+        :param data: the download request body sent to the sidecar.
+        """
+        pod = self.v1.read_namespaced_pod(
+            pod_name,
+            self.conf.kubernetes.namespace
+        )
+        url = 'http://%s:%s/prefetch' % (pod.status.pod_ip, WORKER_PORT)
+
+        LOG.debug('Prefetch package for function %s(version %s) in pod %s',
+                  data['function_id'], data['function_version'], pod_name)
+
+        try:
+            resp = self.session.post(url, json=data)
+        except Exception as e:
+            raise exc.OrchestratorException(
+                'Failed to prefetch package in pod %s: %s' % (pod_name, e)
+            )
+
+        if not resp.ok:
+            raise exc.OrchestratorException(
+                'Failed to prefetch package in pod %s: %s' %
+                (pod_name, resp.content)
+            )
@@ -183,7 +183,8 @@ class EngineClient(object):
                 function_id=function_id,
                 function_version=version,
                 runtime_id=runtime_id,
-                input=input
+                input=input,
+                is_sync=False
             )
 
     @wrap_messaging_exception
@@ -91,6 +91,16 @@ def handle_function_service_expiration(ctx, engine):
         etcd_util.delete_function(v.function_id, v.version_number)
 
 
+@periodics.periodic(60)
+def handle_execution_counter(engine):
+    """Reconcile the in-flight execution counter of the engine."""
+    try:
+        running_counts = db_api.get_execution_counts(status=status.RUNNING)
+        engine.execution_counter.reconcile(running_counts)
+    except Exception:
+        LOG.exception('Failed to reconcile the execution counter.')
+
+
 @periodics.periodic(3)
 def handle_job(engine_client):
     """Execute job task with no db transactions."""
@@ -195,6 +205,7 @@ def start_function_mapping_handler(engine):
         ctx=context.Context(),
         engine=engine
     )
+    worker.add(handle_execution_counter, engine=engine)
     _periodic_tasks[constants.PERIODIC_FUNC_MAPPING_HANDLER] = worker
 
     thread = threading.Thread(target=worker.start)
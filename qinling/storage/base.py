@@ -30,7 +30,8 @@ class PackageStorage(object, metaclass=abc.ABCMeta):
 
         :param project_id: Project ID.
         :param function: Function ID.
-        :param data: Package file content.
+        :param data: Package file content, or a file object to read the
+            content from.
         :param kwargs: A dict may including
             - md5sum: The MD5 provided by the user.
         :return: A tuple (if the package is updated, MD5 value of the package)
@@ -38,19 +39,23 @@ class PackageStorage(object, metaclass=abc.ABCMeta):
         raise NotImplementedError
 
     @abc.abstractmethod
-    def retrieve(self, project_id, function, md5sum, version=0):
+    def retrieve(self, project_id, function, md5sum, version=0,
+                 version_md5sum=None):
         """Get function package data.
 
         :param project_id: Project ID.
         :param function: Function ID.
         :param md5sum: The function MD5.
         :param version: Optional. The function version number.
+        :param version_md5sum: Optional. The MD5 of the function version
+            package.
         :return: File descriptor that needs to close outside.
         """
         raise NotImplementedError
 
     @abc.abstractmethod
-    def delete(self, project_id, function, md5sum, version=0):
+    def delete(self, project_id, function, md5sum, version=0,
+               version_md5sum=None):
         raise NotImplementedError
 
     @abc.abstractmethod
@@ -12,16 +12,19 @@
 #    See the License for the specific language governing permissions and
 #    limitations under the License.
 
+import hashlib
 import os
 import shutil
 import zipfile
 
+from oslo_concurrency import lockutils
 from oslo_log import log as logging
 from oslo_utils import fileutils
 
 from qinling import exceptions as exc
 from qinling.storage import base
 from qinling.utils import common
+from qinling.utils import constants
 
 LOG = logging.getLogger(__name__)
 PACKAGE_NAME_TEMPLATE = "%s_%s.zip"
@@ -29,20 +32,91 @@ PACKAGE_NAME_TEMPLATE = "%s_%s.zip"
 PACKAGE_PATH_TEMPLATE = "%s/%s_%s.zip"
 # Package path name including version
 PACKAGE_VERSION_TEMPLATE = "%s_%s_%s.zip"
+# The packages with the same content are hard links to the same file in the
+# blob directory of the project, named by the package md5.
+BLOB_DIR = 'blobs'
+BLOB_LOCK = 'blobs'
+CHUNK_SIZE = 65536
+PACKAGE_SIZE_ERROR = ("Package size exceeds the limit of %s bytes." %
+                      constants.MAX_PACKAGE_SIZE)
 
 
 class FileSystemStorage(base.PackageStorage):
-    """Interact with file system for function package storage."""
+    """Interact with file system for function package storage.
+
+    The function and version packages are hard links to the blobs named by
+    the package md5, so the same package is only stored once and the
+    version creation doesn't copy the package. The blob is removed when
+    there is no package linked to it. The blobs are kept per project, the
+    packages of different projects are never linked together.
+    """
 
     def __init__(self, conf):
         self.base_path = conf.storage.file_system_dir
 
+    def _get_blob_dir(self, project_id):
+        return os.path.join(self.base_path, BLOB_DIR, project_id)
+
+    def _get_blob_path(self, project_id, md5sum):
+        return os.path.join(self._get_blob_dir(project_id), md5sum[:2],
+                            '%s.zip' % md5sum)
+
+    def _blob_lock(self, project_id):
+        """Lock the blobs of the project across the API processes."""
+        lock_path = self._get_blob_dir(project_id)
+        fileutils.ensure_tree(lock_path)
+
+        return lockutils.lock(BLOB_LOCK, external=True, lock_path=lock_path)
+
+    def _link_blob(self, project_id, package, md5sum):
+        """Link the package to the blob with the same content.
+
+        The package is added as the blob if the blob doesn't exist, otherwise
+        the package is replaced with a link to the blob. The package is
+        left as it is if hard links are not supported.
+        """
+        blob = self._get_blob_path(project_id, md5sum)
+
+        try:
+            fileutils.ensure_tree(os.path.dirname(blob))
+            with self._blob_lock(project_id):
+                try:
+                    os.link(package, blob)
+                except FileExistsError:
+                    new_package = '%s.link' % package
+                    os.link(blob, new_package)
+                    os.rename(new_package, package)
+        except OSError as e:
+            LOG.warning('Failed to link package %s to blob: %s', package,
+                        str(e))
+
+    def _remove_package(self, project_id, package):
+        """Remove the package, and the blob if no package links to it.
+
+        The blob is checked in the same lock as the package is removed, so
+        that it's not removed while another package is linked to it.
+        """
+        md5sum = os.path.splitext(os.path.basename(package))[0].rsplit(
+            '_', 1)[-1]
+        blob = self._get_blob_path(project_id, md5sum)
+
+        with self._blob_lock(project_id):
+            os.remove(package)
+
+            try:
+                if os.stat(blob).st_nlink == 1:
+                    os.remove(blob)
+            except OSError:
+                pass
+
     def store(self, project_id, function, data, md5sum=None):
         """Store the function package data to local file system.
 
         :param project_id: Project ID.
         :param function: Function ID.
-        :param data: Package file content.
+        :param data: Package file content, or a file object to read the
+            content from. The file object is read in chunks so that the
+            package is not loaded into memory.
         :param md5sum: The MD5 provided by the user.
         :return: A tuple (if the package is updated, MD5 value of the package)
         """
@@ -53,32 +127,100 @@ class FileSystemStorage(base.PackageStorage):
         project_path = os.path.join(self.base_path, project_id)
         fileutils.ensure_tree(project_path)
 
-        # Check md5
-        md5_actual = common.md5(content=data)
-        if md5sum and md5_actual != md5sum:
-            raise exc.InputException("Package md5 mismatch.")
+        new_func_zip = os.path.join(project_path, '%s.zip.new' % function)
 
-        func_zip = os.path.join(
-            project_path,
-            PACKAGE_NAME_TEMPLATE % (function, md5_actual)
-        )
-        if os.path.exists(func_zip):
-            return False, md5_actual
+        if isinstance(data, bytes):
+            if len(data) > constants.MAX_PACKAGE_SIZE:
+                raise exc.InputException(PACKAGE_SIZE_ERROR)
 
-        # Save package
-        new_func_zip = os.path.join(project_path, '%s.zip.new' % function)
-        with open(new_func_zip, 'wb') as fd:
-            fd.write(data)
+            # Check md5
+            md5_actual = common.md5(content=data)
+            if md5sum and md5_actual != md5sum:
+                raise exc.InputException("Package md5 mismatch.")
+
+            func_zip = os.path.join(
+                project_path,
+                PACKAGE_NAME_TEMPLATE % (function, md5_actual)
+            )
+            if os.path.exists(func_zip):
+                return False, md5_actual
+
+            # Save package
+            with open(new_func_zip, 'wb') as fd:
+                fd.write(data)
+        else:
+            # The md5 is known after the package is saved.
+            md5_actual = self._write_package(data, new_func_zip)
+            if md5sum and md5_actual != md5sum:
+                fileutils.delete_if_exists(new_func_zip)
+                raise exc.InputException("Package md5 mismatch.")
+
+            func_zip = os.path.join(
+                project_path,
+                PACKAGE_NAME_TEMPLATE % (function, md5_actual)
+            )
+            if os.path.exists(func_zip):
+                fileutils.delete_if_exists(new_func_zip)
+                return False, md5_actual
 
         if not zipfile.is_zipfile(new_func_zip):
             fileutils.delete_if_exists(new_func_zip)
             raise exc.InputException("Package is not a valid ZIP package.")
 
         os.rename(new_func_zip, func_zip)
+        self._link_blob(project_id, func_zip, md5_actual)
 
         return True, md5_actual
 
-    def retrieve(self, project_id, function, md5sum, version=0):
+    def _write_package(self, f, path):
+        """Write the package data read from the file object in chunks.
+
+        :return: MD5 value of the package.
+        """
+        hash_md5 = hashlib.md5()
+        size = 0
+
+        try:
+            with open(path, 'wb') as fd:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                    size += len(chunk)
+                    if size > constants.MAX_PACKAGE_SIZE:
+                        raise exc.InputException(PACKAGE_SIZE_ERROR)
+
+                    hash_md5.update(chunk)
+                    fd.write(chunk)
+        except Exception:
+            fileutils.delete_if_exists(path)
+            raise
+
+        return hash_md5.hexdigest()
+
+    def _get_version_package(self, project_id, function, version,
+                             md5sum=None):
+        """Get the package path of the function version.
+
+        The path is known if the version MD5 is provided, otherwise the
+        project directory is scanned, e.g. for the versions created before
+        the MD5 is recorded.
+
+        :return: The package path, or None if not found.
+        """
+        project_dir = os.path.join(self.base_path, project_id)
+        if md5sum:
+            return os.path.join(
+                project_dir,
+                PACKAGE_VERSION_TEMPLATE % (function, version, md5sum)
+            )
+
+        prefix = "%s_%d_" % (function, version)
+        for filename in os.listdir(project_dir):
+            if filename.startswith(prefix) and filename.endswith('.zip'):
+                return os.path.join(project_dir, filename)
+
+        return None
+
+    def retrieve(self, project_id, function, md5sum, version=0,
+                 version_md5sum=None):
         """Get function package data.
 
         If version is not 0, return the package data of that specific function
@@ -88,6 +230,8 @@ class FileSystemStorage(base.PackageStorage):
         :param function: Function ID.
         :param md5sum: The function MD5.
         :param version: Optional. The function version number.
+        :param version_md5sum: Optional. The MD5 of the function version
+            package.
         :return: File descriptor that needs to close outside.
         """
         LOG.debug(
@@ -97,14 +241,9 @@ class FileSystemStorage(base.PackageStorage):
         )
 
         if version != 0:
-            project_dir = os.path.join(self.base_path, project_id)
-            for filename in os.listdir(project_dir):
-                root, ext = os.path.splitext(filename)
-                if (root.startswith("%s_%d" % (function, version))
-                        and ext == '.zip'):
-                    func_zip = os.path.join(project_dir, filename)
-                    break
-            else:
+            func_zip = self._get_version_package(project_id, function,
+                                                 version, version_md5sum)
+            if not func_zip:
                 raise exc.StorageNotFoundException(
                     'Package of version %d function %s for project %s not '
                     'found.' % (version, function, project_id)
@@ -127,7 +266,8 @@ class FileSystemStorage(base.PackageStorage):
 
         return f
 
-    def delete(self, project_id, function, md5sum, version=0):
+    def delete(self, project_id, function, md5sum, version=0,
+               version_md5sum=None):
         LOG.debug(
             'Deleting package data, function: %s, version: %s, md5sum: %s, '
             'project: %s',
@@ -135,14 +275,9 @@ class FileSystemStorage(base.PackageStorage):
         )
 
         if version != 0:
-            project_dir = os.path.join(self.base_path, project_id)
-            for filename in os.listdir(project_dir):
-                root, ext = os.path.splitext(filename)
-                if (root.startswith("%s_%d" % (function, version))
-                        and ext == '.zip'):
-                    func_zip = os.path.join(project_dir, filename)
-                    break
-            else:
+            func_zip = self._get_version_package(project_id, function,
+                                                 version, version_md5sum)
+            if not func_zip:
                 return
         else:
             func_zip = os.path.join(
@@ -151,7 +286,7 @@ class FileSystemStorage(base.PackageStorage):
             )
 
         if os.path.exists(func_zip):
-            os.remove(func_zip)
+            self._remove_package(project_id, func_zip)
 
     def changed_since(self, project_id, function, l_md5, version):
         """Check if the function package has changed.
@@ -197,7 +332,12 @@ class FileSystemStorage(base.PackageStorage):
                                     (function, old_version + 1, l_md5))
 
         try:
-            shutil.copyfile(src_package, dest_package)
+            try:
+                # The package data is not copied, the new version package is
+                # another link to the same blob.
+                os.link(src_package, dest_package)
+            except OSError:
+                shutil.copyfile(src_package, dest_package)
         except Exception:
             msg = "Failed to create new function version."
             LOG.exception(msg)
@@ -21,6 +21,7 @@ import pecan
 import pecan.testing
 from webtest import app as webtest_app
 
+from qinling.storage import base as storage_base
 from qinling.tests.unit import base
 
 CONF = cfg.CONF
@@ -34,6 +35,12 @@ class APITest(base.DbTestCase):
         package_dir = tempfile.mkdtemp(prefix='tmp_qinling')
         self.override_config('file_system_dir', package_dir, 'storage')
         self.addCleanup(shutil.rmtree, package_dir, True)
+        # The storage provider is loaded only once and shared by the
+        # controllers, use the package directory of the test.
+        provider = storage_base.load_storage_provider(CONF)
+        patcher = mock.patch.object(provider, 'base_path', package_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
 
         # Disable authentication by default for API tests.
         self.override_config('auth_enable', False, group='pecan')
@@ -41,6 +48,8 @@ class APITest(base.DbTestCase):
         # Disable job handler. The following pecan app instantiation will
         # invoke qinling.api.app:setup_app()
         self.override_config('enable_job_handler', False, group='api')
+        self.override_config('execution_count_flush_interval', 0,
+                             group='api')
 
         pecan_opts = CONF.pecan
         self.app = pecan.testing.load_test_app({
@@ -14,6 +14,7 @@
 
 from unittest import mock
 
+from qinling import context
 from qinling.db import api as db_api
 from qinling import exceptions as exc
 from qinling import status
@@ -26,6 +27,7 @@ class TestExecutionController(base.APITest):
 
         db_func = self.create_function()
         self.func_id = db_func.id
+        self.runtime_id = db_func.runtime_id
 
     @mock.patch('qinling.rpc.EngineClient.create_execution')
     def test_create_with_function(self, mock_create_execution):
@@ -83,6 +85,39 @@ class TestExecutionController(base.APITest):
         resp = self.app.get('/v1/functions/%s/versions/1' % self.func_id)
         self.assertEqual(1, resp.json.get('count'))
 
+    @mock.patch('qinling.rpc.EngineClient.create_execution')
+    def test_create_with_cached_function(self, mock_rpc):
+        body = {
+            'function_id': self.func_id,
+        }
+        resp = self.app.post_json('/v1/executions', body)
+        self.assertEqual(201, resp.status_int)
+
+        with mock.patch.object(db_api, 'get_function',
+                               wraps=db_api.get_function) as mock_get:
+            resp = self.app.post_json('/v1/executions', body)
+
+        self.assertEqual(201, resp.status_int)
+        mock_get.assert_not_called()
+
+        resp = self.app.get('/v1/functions/%s' % self.func_id)
+        self.assertEqual(2, resp.json.get('count'))
+
+    @mock.patch('qinling.rpc.EngineClient.create_execution')
+    def test_create_runtime_updated(self, mock_rpc):
+        body = {
+            'function_id': self.func_id,
+        }
+        resp = self.app.post_json('/v1/executions', body)
+        self.assertEqual(201, resp.status_int)
+
+        # We need to set context as it was removed after the API call
+        context.set_ctx(self.ctx)
+        db_api.update_runtime(self.runtime_id, {'status': status.ERROR})
+        resp = self.app.post_json('/v1/executions', body, expect_errors=True)
+
+        self.assertEqual(409, resp.status_int)
+
     def test_create_with_invalid_alias(self):
         body = {
             'function_alias': 'fake_alias',
@@ -167,6 +202,77 @@ class TestExecutionController(base.APITest):
         self.assertEqual(200, resp.status_int)
         self._assert_single_item(resp.json['executions'], id=exec_id)
 
+    def test_get_all_pagination(self):
+        exec_ids = set(
+            self.create_execution(function_id=self.func_id).id
+            for _ in range(3)
+        )
+
+        resp = self.app.get('/v1/executions?limit=2')
+
+        self.assertEqual(200, resp.status_int)
+        self.assertEqual(2, len(resp.json['executions']))
+        next_url = resp.json['next']
+        self.assertIn('limit=2', next_url)
+        self.assertIn(
+            'marker=%s' % resp.json['executions'][-1]['id'], next_url
+        )
+        ids = set(e['id'] for e in resp.json['executions'])
+
+        resp = self.app.get(next_url)
+
+        self.assertEqual(200, resp.status_int)
+        self.assertEqual(1, len(resp.json['executions']))
+        self.assertNotIn('next', resp.json)
+        ids.update(e['id'] for e in resp.json['executions'])
+        self.assertEqual(exec_ids, ids)
+
+    def test_get_all_max_limit(self):
+        self.override_config('max_limit', 1, 'api')
+        self.create_execution(function_id=self.func_id)
+        self.create_execution(function_id=self.func_id)
+
+        resp = self.app.get('/v1/executions?limit=10')
+
+        self.assertEqual(200, resp.status_int)
+        self.assertEqual(1, len(resp.json['executions']))
+        self.assertIn('next', resp.json)
+
+    def test_get_all_without_limit(self):
+        self.override_config('max_limit', 1, 'api')
+        self.create_execution(function_id=self.func_id)
+        self.create_execution(function_id=self.func_id)
+
+        resp = self.app.get('/v1/executions')
+
+        # The max limit only caps the limit sent by the client.
+        self.assertEqual(200, resp.status_int)
+        self.assertEqual(2, len(resp.json['executions']))
+        self.assertNotIn('next', resp.json)
+
+    def test_get_all_fields(self):
+        exec_id = self.create_execution(function_id=self.func_id).id
+
+        resp = self.app.get(
+            '/v1/executions?fields=status&sort_keys=status&sort_dirs=desc'
+        )
+
+        self.assertEqual(200, resp.status_int)
+        actual = self._assert_single_item(
+            resp.json['executions'], id=exec_id
+        )
+        self.assertEqual(status.RUNNING, actual['status'])
+        self.assertNotIn('function_id', actual)
+        self.assertNotIn('input', actual)
+
+    def test_get_all_invalid_params(self):
+        for params in ['limit=0', 'fields=logs', 'sort_keys=logs',
+                       'sort_dirs=up']:
+            resp = self.app.get('/v1/executions?%s' % params,
+                                expect_errors=True)
+
+            self.assertEqual(400, resp.status_int)
+
     @mock.patch('qinling.rpc.EngineClient.create_execution')
     def test_delete(self, mock_create_execution):
         body = {
@@ -178,3 +284,76 @@ class TestExecutionController(base.APITest):
         resp = self.app.delete('/v1/executions/%s' % exec_id)
 
         self.assertEqual(204, resp.status_int)
+
+    def test_delete_with_logs(self):
+        exec_id = self.create_execution(function_id=self.func_id).id
+        db_api.create_execution_log(
+            {'execution_id': exec_id, 'logs': 'execution log'}
+        )
+
+        resp = self.app.delete('/v1/executions/%s' % exec_id)
+
+        self.assertEqual(204, resp.status_int)
+        self.assertRaises(exc.DBEntityNotFoundError,
+                          db_api.get_execution_log, exec_id)
+
+    def _create_execution_with_logs(self, logs):
+        exec_id = self.create_execution(function_id=self.func_id,
+                                        status=status.SUCCESS).id
+        db_api.create_execution_log(
+            {'execution_id': exec_id, 'logs': logs, 'size': len(logs)}
+        )
+
+        return exec_id
+
+    def test_get_logs(self):
+        exec_id = self._create_execution_with_logs('execution log')
+
+        resp = self.app.get('/v1/executions/%s/log' % exec_id)
+
+        self.assertEqual(200, resp.status_int)
+        self.assertEqual('execution log', resp.text)
+
+    def test_get_logs_offset(self):
+        exec_id = self._create_execution_with_logs('execution log')
+
+        resp = self.app.get(
+            '/v1/executions/%s/log?offset=10&length=2' % exec_id
+        )
+
+        self.assertEqual(200, resp.status_int)
+        self.assertEqual('lo', resp.text)
+
+    def test_get_logs_chunked(self):
+        self.override_config('execution_log_chunk_size', 4, 'api')
+        exec_id = self._create_execution_with_logs('execution log')
+
+        resp = self.app.get('/v1/executions/%s/log' % exec_id)
+
+        self.assertEqual(200, resp.status_int)
+        self.assertEqual('execution log', resp.text)
+
+        resp = self.app.get(
+            '/v1/executions/%s/log?offset=1&length=6' % exec_id
+        )
+
+        self.assertEqual(200, resp.status_int)
+        self.assertEqual('xecuti', resp.text)
+
+    def test_get_logs_not_finished(self):
+        exec_id = self.create_execution(function_id=self.func_id).id
+
+        resp = self.app.get('/v1/executions/%s/log' % exec_id)
+
+        self.assertEqual(204, resp.status_int)
+
+    def test_get_logs_invalid_params(self):
+        exec_id = self._create_execution_with_logs('execution log')
+
+        for params in ['offset=-1', 'length=a']:
+            resp = self.app.get(
+                '/v1/executions/%s/log?%s' % (exec_id, params),
+                expect_errors=True
+            )
+
+            self.assertEqual(400, resp.status_int)
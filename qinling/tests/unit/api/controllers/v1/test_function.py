@@ -14,17 +14,23 @@
 
 from datetime import datetime
 import json
+import os
 import tempfile
 from unittest import mock
 import uuid
 
 from oslo_config import cfg
+import webob
 
 from qinling.db import api as db_api
+from qinling.db.sqlalchemy import models
 from qinling import status
+from qinling.storage import file_system
 from qinling.tests.unit.api import base
 from qinling.tests.unit import base as unit_base
 from qinling.utils import constants
+from qinling.utils import executions
+from qinling.utils import rest_utils
 
 
 class TestFunctionController(base.APITest):
@@ -208,6 +214,90 @@ class TestFunctionController(base.APITest):
         self.assertEqual(200, resp.status_int)
         self._assertDictContainsSubset(resp.json, expected)
 
+    def _create_package(self, function_id, data):
+        package_path = os.path.join(
+            cfg.CONF.storage.file_system_dir,
+            file_system.PACKAGE_PATH_TEMPLATE %
+            (unit_base.DEFAULT_PROJECT_ID, function_id, 'fake_md5')
+        )
+        os.makedirs(os.path.dirname(package_path), exist_ok=True)
+        with open(package_path, 'wb') as f:
+            f.write(data)
+
+    def test_get_download(self):
+        db_func = self.create_function(runtime_id=self.runtime_id)
+        self._create_package(db_func.id, b'fake package data')
+
+        resp = self.app.get('/v1/functions/%s?download=true' % db_func.id)
+
+        self.assertEqual(200, resp.status_int)
+        self.assertEqual(b'fake package data', resp.body)
+        self.assertEqual('17', resp.headers['Content-Length'])
+        self.assertEqual('"fake_md5"', resp.headers['ETag'])
+        self.assertEqual('bytes', resp.headers['Accept-Ranges'])
+
+    def test_get_download_not_modified(self):
+        db_func = self.create_function(runtime_id=self.runtime_id)
+        self._create_package(db_func.id, b'fake package data')
+
+        resp = self.app.get(
+            '/v1/functions/%s?download=true' % db_func.id,
+            headers={'If-None-Match': '"fake_md5"'}
+        )
+
+        self.assertEqual(304, resp.status_int)
+        self.assertEqual(b'', resp.body)
+
+    def test_get_download_range(self):
+        db_func = self.create_function(runtime_id=self.runtime_id)
+        self._create_package(db_func.id, b'fake package data')
+
+        resp = self.app.get(
+            '/v1/functions/%s?download=true' % db_func.id,
+            headers={'Range': 'bytes=5-', 'If-Range': '"fake_md5"'}
+        )
+
+        self.assertEqual(206, resp.status_int)
+        self.assertEqual(b'package data', resp.body)
+        self.assertEqual('bytes 5-16/17', resp.headers['Content-Range'])
+
+    def test_get_download_file_wrapper(self):
+        db_func = self.create_function(runtime_id=self.runtime_id)
+        self._create_package(db_func.id, b'fake package data')
+        file_wrapper = mock.Mock()
+        req = webob.Request.blank(
+            '/v1/functions/%s?download=true' % db_func.id,
+            environ={'wsgi.file_wrapper': file_wrapper}
+        )
+        start_response = mock.Mock()
+
+        app_iter = self.app.app(req.environ, start_response)
+
+        # The file wrapper is returned to the WSGI server without being read.
+        self.assertIs(file_wrapper.return_value, app_iter)
+        start_response.assert_called_once_with('200 OK', mock.ANY)
+        f, block_size = file_wrapper.call_args[0]
+        f.close()
+        self.assertEqual(rest_utils.FILE_BLOCK_SIZE, block_size)
+
+    def test_get_download_sendfile_header(self):
+        self.override_config('sendfile_header', 'X-Accel-Redirect',
+                             'storage')
+        self.override_config('sendfile_location', '/packages/', 'storage')
+        db_func = self.create_function(runtime_id=self.runtime_id)
+        self._create_package(db_func.id, b'fake package data')
+
+        resp = self.app.get('/v1/functions/%s?download=true' % db_func.id)
+
+        self.assertEqual(200, resp.status_int)
+        self.assertEqual(b'', resp.body)
+        self.assertEqual(
+            '/packages/%s/%s_fake_md5.zip' %
+            (unit_base.DEFAULT_PROJECT_ID, db_func.id),
+            resp.headers['X-Accel-Redirect']
+        )
+        self.assertEqual('"fake_md5"', resp.headers['ETag'])
+
     def test_get_all(self):
         db_func = self.create_function(runtime_id=self.runtime_id)
         expected = {
@@ -228,6 +318,27 @@ class TestFunctionController(base.APITest):
         )
         self._assertDictContainsSubset(actual, expected)
 
+    def test_get_all_fields(self):
+        self.override_config('execution_count_flush_interval', 1, 'api')
+        db_func = self.create_function(runtime_id=self.runtime_id)
+
+        # The execution count not written to the database yet.
+        with mock.patch.object(executions.InvocationCounter,
+                               '_start_flusher'):
+            executions.INVOCATION_COUNTER.increase(models.Function,
+                                                   db_func.id)
+        self.addCleanup(executions.INVOCATION_COUNTER.clear)
+
+        resp = self.app.get('/v1/functions?fields=name,count')
+
+        self.assertEqual(200, resp.status_int)
+        actual = self._assert_single_item(
+            resp.json['functions'], id=db_func.id
+        )
+        self.assertEqual(
+            {'id': db_func.id, 'name': db_func.name, 'count': 1}, actual
+        )
+
     def test_put_name(self):
         db_func = self.create_function(runtime_id=self.runtime_id)
 
@@ -523,9 +634,9 @@ class TestFunctionController(base.APITest):
         mock_package_delete.assert_has_calls(
             [
                 mock.call(unit_base.DEFAULT_PROJECT_ID, func_id, None,
-                          version=1),
+                          version=1, version_md5sum=None),
                 mock.call(unit_base.DEFAULT_PROJECT_ID, func_id, None,
-                          version=2),
+                          version=2, version_md5sum=None),
                 mock.call(unit_base.DEFAULT_PROJECT_ID, func_id, "fake_md5")
             ]
         )
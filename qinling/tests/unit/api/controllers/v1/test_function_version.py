@@ -15,8 +15,10 @@
 from datetime import datetime
 from datetime import timedelta
 import json
+import os
 from unittest import mock
 
+from oslo_config import cfg
 
 from qinling import context
 from qinling.db import api as db_api
@@ -64,6 +66,7 @@ class TestFunctionVersionController(base.APITest):
         with db_api.transaction():
             func_db = db_api.get_function(self.func_id)
             self.assertEqual(1, len(func_db.versions))
+            self.assertEqual("fake_md5", func_db.versions[0].md5sum)
 
         # Verify the latest function version by calling API
         resp = self.app.get('/v1/functions/%s' % self.func_id)
@@ -134,6 +137,50 @@ class TestFunctionVersionController(base.APITest):
         self.assertEqual(200, resp.status_int)
         self.assertEqual("version 1", resp.json.get('description'))
 
+    def test_get_download(self):
+        db_api.increase_function_version(self.func_id, 0,
+                                         description="version 1")
+        project_dir = os.path.join(cfg.CONF.storage.file_system_dir,
+                                   unit_base.DEFAULT_PROJECT_ID)
+        os.makedirs(project_dir, exist_ok=True)
+        with open(os.path.join(project_dir,
+                               '%s_1_fake_md5.zip' % self.func_id), 'wb') as f:
+            f.write(b'fake package data')
+
+        resp = self.app.get(
+            '/v1/functions/%s/versions/1?download=true' % self.func_id
+        )
+
+        self.assertEqual(200, resp.status_int)
+        self.assertEqual(b'fake package data', resp.body)
+        etag = resp.headers['ETag']
+
+        resp = self.app.get(
+            '/v1/functions/%s/versions/1?download=true' % self.func_id,
+            headers={'If-None-Match': etag}
+        )
+
+        self.assertEqual(304, resp.status_int)
+
+    def test_get_download_md5(self):
+        db_api.increase_function_version(self.func_id, 0,
+                                         description="version 1",
+                                         md5sum="fake_md5")
+        project_dir = os.path.join(cfg.CONF.storage.file_system_dir,
+                                   unit_base.DEFAULT_PROJECT_ID)
+        os.makedirs(project_dir, exist_ok=True)
+        with open(os.path.join(project_dir,
+                               '%s_1_fake_md5.zip' % self.func_id), 'wb') as f:
+            f.write(b'fake package data')
+
+        resp = self.app.get(
+            '/v1/functions/%s/versions/1?download=true' % self.func_id
+        )
+
+        self.assertEqual(200, resp.status_int)
+        self.assertEqual(b'fake package data', resp.body)
+        self.assertEqual('"fake_md5"', resp.headers['ETag'])
+
     @mock.patch('qinling.utils.etcd_util.delete_function')
     @mock.patch('qinling.rpc.EngineClient.delete_function')
     @mock.patch('qinling.storage.file_system.FileSystemStorage.delete')
@@ -149,7 +196,7 @@ class TestFunctionVersionController(base.APITest):
         mock_etcd_delete.assert_called_once_with(self.func_id, version=1)
         mock_package_delete.assert_called_once_with(
             unit_base.DEFAULT_PROJECT_ID,
-            self.func_id, None, version=1
+            self.func_id, None, version=1, version_md5sum=None
         )
 
         # We need to set context as it was removed after the API call
@@ -265,3 +265,23 @@ class TestWebhookController(base.APITest):
             'description': constants.EXECUTION_BY_WEBHOOK % webhook.id
         }
         mock_create_execution.assert_called_once_with(mock.ANY, params)
+
+    def test_get_all_fields(self):
+        webhook = self.create_webhook(function_id=self.func_id)
+
+        resp = self.app.get('/v1/webhooks?fields=webhook_url')
+
+        self.assertEqual(200, resp.status_int)
+        actual = self._assert_single_item(resp.json['webhooks'],
+                                          id=webhook.id)
+        self.assertIn('/webhooks/%s/invoke' % webhook.id,
+                      actual['webhook_url'])
+        self.assertNotIn('function_id', actual)
+
+    def test_get_all_invalid_sort_key(self):
+        self.create_webhook(function_id=self.func_id)
+
+        resp = self.app.get('/v1/webhooks?sort_keys=webhook_url',
+                            expect_errors=True)
+
+        self.assertEqual(400, resp.status_int)
@@ -0,0 +1,83 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+import datetime
+import importlib
+
+from alembic import migration
+from alembic import operations
+import sqlalchemy as sa
+
+from qinling.tests.unit import base
+
+VERSIONS = 'qinling.db.sqlalchemy.migration.alembic_migrations.versions'
+
+
+class TestExecutionLogsMigration(base.BaseTest):
+    """Run the 014 migration on sqlite with the existing executions."""
+
+    def setUp(self):
+        super(TestExecutionLogsMigration, self).setUp()
+
+        self.engine = sa.create_engine('sqlite://')
+        self.addCleanup(self.engine.dispose)
+
+        metadata = sa.MetaData()
+        self.executions = sa.Table(
+            'executions', metadata,
+            sa.Column('id', sa.String(36), primary_key=True),
+            sa.Column('created_at', sa.DateTime()),
+            sa.Column('status', sa.String(32)),
+            sa.Column('logs', sa.Text()),
+        )
+        metadata.create_all(self.engine)
+
+    def _upgrade(self):
+        version = importlib.import_module(VERSIONS + '.014_execution_logs')
+
+        with self.engine.begin() as conn:
+            context = migration.MigrationContext.configure(conn)
+            with operations.Operations.context(context):
+                version.upgrade()
+
+    def test_upgrade(self):
+        created_at = datetime.datetime(2018, 1, 1)
+        with self.engine.begin() as conn:
+            conn.execute(self.executions.insert(), [
+                {'id': 'exec1', 'created_at': created_at,
+                 'status': 'success', 'logs': u'Start\nrésultat\n'},
+                {'id': 'exec2', 'created_at': created_at,
+                 'status': 'success', 'logs': ''},
+                {'id': 'exec3', 'created_at': created_at,
+                 'status': 'running', 'logs': None},
+            ])
+
+        self._upgrade()
+
+        with self.engine.connect() as conn:
+            rows = conn.execute(sa.text(
+                'SELECT execution_id, created_at, logs, size, truncated '
+                'FROM execution_logs'
+            )).fetchall()
+            columns = [
+                c['name'] for c in sa.inspect(conn).get_columns('executions')
+            ]
+
+        self.assertEqual(1, len(rows))
+        execution_id, log_created_at, logs, size, truncated = rows[0]
+        self.assertEqual('exec1', execution_id)
+        self.assertEqual(u'Start\nrésultat\n', logs)
+        # The size is the number of characters.
+        self.assertEqual(15, size)
+        self.assertFalse(truncated)
+        self.assertIsNotNone(log_created_at)
+        self.assertNotIn('logs', columns)
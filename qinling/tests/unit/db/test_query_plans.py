@@ -0,0 +1,111 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+import sqlalchemy as sa
+
+from qinling.db import api as db_api
+from qinling.db import base as db_base
+from qinling import status
+from qinling.tests.unit import base
+
+
+class TestExecutionQueryPlans(base.DbTestCase):
+    """Check the hot queries of the executions table use the indexes.
+
+    The query plans are explained by sqlite, the tables are created from the
+    models which declare the same indexes as the migrations.
+    """
+
+    def setUp(self):
+        super(TestExecutionQueryPlans, self).setUp()
+
+        self.func_id = self.create_function().id
+        self.execution_id = self.create_execution(
+            function_id=self.func_id
+        ).id
+
+        self.engine = db_base.get_engine()
+        if self.engine.dialect.name != 'sqlite':
+            self.skipTest('Query plans are only checked on sqlite.')
+
+        self.statements = []
+        sa.event.listen(self.engine, 'before_cursor_execute',
+                        self._record_statement)
+        self.addCleanup(sa.event.remove, self.engine,
+                        'before_cursor_execute', self._record_statement)
+
+    def _record_statement(self, conn, cursor, statement, parameters, context,
+                          executemany):
+        if (statement.lstrip().upper().startswith('SELECT') and
+                'FROM executions' in statement):
+            self.statements.append((statement, parameters))
+
+    def _explain(self, statement, parameters):
+        conn = self.engine.raw_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('EXPLAIN QUERY PLAN %s' % statement, parameters)
+            # The last column of the rows is the plan detail.
+            return [row[-1] for row in cursor.fetchall()]
+        finally:
+            conn.close()
+
+    def _assert_index_used(self, index):
+        self.assertEqual(1, len(self.statements))
+
+        plan = self._explain(*self.statements[0])
+
+        self.assertTrue(
+            any('INDEX %s ' % index in '%s ' % d for d in plan),
+            'Index %s not used: %s' % (index, plan)
+        )
+        # The rows are not sorted or grouped out of the index.
+        for detail in plan:
+            self.assertNotIn('TEMP B-TREE', detail)
+
+    def test_get_execution_counts(self):
+        db_api.get_execution_counts(status=status.RUNNING)
+
+        self._assert_index_used(
+            'executions_status_function_id_function_version'
+        )
+
+    def test_get_executions(self):
+        db_api.get_executions(limit=10)
+
+        self._assert_index_used('executions_project_id_created_at')
+
+    def test_get_executions_marker(self):
+        db_api.get_executions(limit=10, marker=self.execution_id)
+
+        # The marker object is queried by id first.
+        self.statements.pop(0)
+        self._assert_index_used('executions_project_id_created_at')
+
+    def test_get_executions_desc(self):
+        db_api.get_executions(limit=10, sort_keys=['created_at', 'id'],
+                              sort_dirs=['desc', 'desc'])
+
+        self._assert_index_used('executions_project_id_created_at')
+
+    def test_get_executions_by_function(self):
+        db_api.get_executions(limit=10, function_id=self.func_id,
+                              function_version=0)
+
+        self._assert_index_used(
+            'executions_function_id_function_version_created_at'
+        )
+
+    def test_get_executions_insecure(self):
+        db_api.get_executions(limit=10, insecure=True)
+
+        self._assert_index_used('executions_created_at')
@@ -41,6 +41,7 @@ class TestDefaultEngine(base.DbTestCase):
     def _create_running_executions(self, function_id, num):
         for _ in range(num):
             self.create_execution(function_id=function_id)
+            self.default_engine.execution_counter.increase(function_id, 0)
 
     def test_create_runtime(self):
         runtime = self.create_runtime()
@@ -132,7 +133,7 @@ class TestDefaultEngine(base.DbTestCase):
 
         self.default_engine.function_load_check(function_id, 0, runtime_id)
 
-        mock_getworkers.assert_called_once_with(function_id, 0)
+        mock_getworkers.assert_has_calls([mock.call(function_id, 0)] * 2)
         mock_scaleup.assert_called_once_with(None, function_id, 0, runtime_id,
                                              1)
 
@@ -155,7 +156,7 @@ class TestDefaultEngine(base.DbTestCase):
 
         self.default_engine.function_load_check(function_id, 0, runtime_id)
 
-        mock_getworkers.assert_called_once_with(function_id, 0)
+        mock_getworkers.assert_has_calls([mock.call(function_id, 0)] * 2)
         mock_scaleup.assert_called_once_with(None, function_id, 0, runtime_id,
                                              1)
 
@@ -179,12 +180,37 @@ class TestDefaultEngine(base.DbTestCase):
         self.default_engine.function_load_check(function_id, 0, runtime_id)
 
         mock_getworkers.assert_called_once_with(function_id, 0)
+        mock_getlock.assert_not_called()
+        mock_scaleup.assert_not_called()
+
+    @mock.patch('qinling.engine.default_engine.DefaultEngine.scaleup_function')
+    @mock.patch('qinling.utils.etcd_util.get_workers')
+    @mock.patch('qinling.utils.etcd_util.get_worker_lock')
+    def test_function_load_check_scaled_up_while_waiting_lock(
+        self, mock_getlock, mock_getworkers, mock_scaleup
+    ):
+        function = self.create_function()
+        function_id = function.id
+        runtime_id = function.runtime_id
+        lock = mock.Mock()
+        lock.is_acquired.return_value = True
+        mock_getlock.return_value.__enter__.return_value = lock
+
+        # The function is scaled up by someone else after the first check.
+        mock_getworkers.side_effect = [['worker1'], ['worker1', 'worker2']]
+        self._create_running_executions(function_id, 4)
+
+        self.default_engine.function_load_check(function_id, 0, runtime_id)
+
+        mock_getlock.assert_called_once_with(function_id, 0)
+        self.assertEqual(2, mock_getworkers.call_count)
         mock_scaleup.assert_not_called()
 
+    @mock.patch('qinling.engine.default_engine.DefaultEngine.scaleup_function')
     @mock.patch('qinling.utils.etcd_util.get_workers')
     @mock.patch('qinling.utils.etcd_util.get_worker_lock')
     def test_function_load_check_lock_wait(self, mock_getlock,
-                                           mock_getworkers):
+                                           mock_getworkers, mock_scaleup):
         function = self.create_function()
         function_id = function.id
         runtime_id = function.runtime_id
@@ -193,13 +219,19 @@ class TestDefaultEngine(base.DbTestCase):
         # Lock is acquired upon the third try.
         lock.is_acquired.side_effect = [False, False, True]
         mock_getworkers.return_value = ['worker1']
-        self._create_running_executions(function_id, 3)
+        self._create_running_executions(function_id, 4)
 
         self.default_engine.function_load_check(function_id, 0, runtime_id)
 
         self.assertEqual(3, lock.is_acquired.call_count)
-        mock_getworkers.assert_called_once_with(function_id, 0)
+        # Workers are checked without lock in each try and once more after
+        # the lock is acquired.
+        self.assertEqual(4, mock_getworkers.call_count)
+        mock_scaleup.assert_called_once_with(None, function_id, 0, runtime_id,
+                                             1)
 
+    @mock.patch('qinling.utils.etcd_util.get_workers', mock.Mock(
+        return_value=[]))
     @mock.patch('qinling.utils.etcd_util.get_worker_lock')
     def test_function_load_check_failed_to_get_worker_lock(self, mock_getlock):
         function = self.create_function()
@@ -307,10 +339,12 @@ class TestDefaultEngine(base.DbTestCase):
         execution_2 = db_api.get_execution(execution_2_id)
 
         self.assertEqual(status.SUCCESS, execution_1.status)
-        self.assertEqual('fake log', execution_1.logs)
+        self.assertEqual('fake log',
+                         db_api.get_execution_log(execution_1_id))
         self.assertEqual({"duration": 5}, execution_1.result)
         self.assertEqual(status.FAILED, execution_2.status)
-        self.assertEqual('', execution_2.logs)
+        self.assertRaises(exc.DBEntityNotFoundError,
+                          db_api.get_execution_log, execution_2_id)
         self.assertEqual(
             {'duration': 0, 'output': 'Function execution failed.'},
             execution_2.result
@@ -353,7 +387,8 @@ class TestDefaultEngine(base.DbTestCase):
         execution = db_api.get_execution(execution_id)
 
         self.assertEqual(status.ERROR, execution.status)
-        self.assertEqual('', execution.logs)
+        self.assertRaises(exc.DBEntityNotFoundError,
+                          db_api.get_execution_log, execution_id)
         self.assertEqual({'output': 'Function execution failed.'},
                          execution.result)
 
@@ -394,7 +429,8 @@ class TestDefaultEngine(base.DbTestCase):
         execution = db_api.get_execution(execution_id)
 
         self.assertEqual(execution.status, status.SUCCESS)
-        self.assertEqual(execution.logs, 'execution log')
+        self.assertEqual('execution log',
+                         db_api.get_execution_log(execution_id))
         self.assertEqual(execution.result, {'output': 'success output'})
 
     def test_create_execution_loadcheck_exception(self):
@@ -415,7 +451,8 @@ class TestDefaultEngine(base.DbTestCase):
         execution = db_api.get_execution(execution_id)
 
         self.assertEqual(status.ERROR, execution.status)
-        self.assertEqual('', execution.logs)
+        self.assertRaises(exc.DBEntityNotFoundError,
+                          db_api.get_execution_log, execution_id)
         self.assertEqual({'output': 'Function execution failed.'},
                          execution.result)
 
@@ -451,17 +488,268 @@ class TestDefaultEngine(base.DbTestCase):
         engine_utils_get_request_data_mock.assert_called_once_with(
             mock.ANY, function_id, 0, execution_id, self.rlimit,
             'input', function.entry, function.trust_id,
-            self.qinling_endpoint, function.timeout)
+            self.qinling_endpoint, function.timeout, md5sum='fake_md5')
         engine_utils_url_request_mock.assert_called_once_with(
-            self.default_engine.session, 'svc_url/execute', body='data')
+            self.default_engine.session, 'svc_url/execute', body='data',
+            fallback_url=None)
 
         execution = db_api.get_execution(execution_id)
 
         self.assertEqual(execution.status, status.FAILED)
-        self.assertEqual(execution.logs, 'execution log')
+        self.assertEqual('execution log',
+                         db_api.get_execution_log(execution_id))
         self.assertEqual(execution.result,
                          {'success': False, 'output': 'failed output'})
 
+    @mock.patch('qinling.engine.utils.get_request_data')
+    @mock.patch('qinling.engine.utils.url_request')
+    @mock.patch('qinling.utils.etcd_util.get_service_url')
+    def test_create_execution_async_invoke(
+        self,
+        etcd_util_get_service_url_mock,
+        engine_utils_url_request_mock,
+        engine_utils_get_request_data_mock
+    ):
+        function = self.create_function()
+        function_id = function.id
+        runtime_id = function.runtime_id
+        execution = self.create_execution(function_id=function_id)
+        execution_id = execution.id
+        invoker = mock.Mock()
+        self.default_engine.invoker = invoker
+        self.default_engine.function_load_check = mock.Mock(return_value='')
+        etcd_util_get_service_url_mock.return_value = 'svc_url'
+        engine_utils_get_request_data_mock.return_value = 'data'
+
+        self.default_engine.create_execution(
+            mock.Mock(), execution_id, function_id, 0, runtime_id,
+            is_sync=False)
+
+        engine_utils_url_request_mock.assert_not_called()
+        invoker.invoke.assert_called_once_with(
+            'svc_url/execute', 'data', mock.ANY, fallback_url=None)
+        execution = db_api.get_execution(execution_id)
+        self.assertEqual(status.RUNNING, execution.status)
+
+        # Simulate the function returns.
+        callback = invoker.invoke.call_args[0][2]
+        callback(True, {'success': True, 'logs': 'execution log',
+                        'output': 'success output'})
+
+        execution = db_api.get_execution(execution_id)
+        self.assertEqual(status.SUCCESS, execution.status)
+        self.assertEqual('execution log',
+                         db_api.get_execution_log(execution_id))
+        self.assertEqual({'output': 'success output'}, execution.result)
+
+    @mock.patch('qinling.engine.utils.get_request_data')
+    @mock.patch('qinling.engine.utils.url_request')
+    @mock.patch('qinling.utils.etcd_util.get_service_url')
+    def test_create_execution_async_invoke_sync_execution(
+        self,
+        etcd_util_get_service_url_mock,
+        engine_utils_url_request_mock,
+        engine_utils_get_request_data_mock
+    ):
+        function = self.create_function()
+        function_id = function.id
+        runtime_id = function.runtime_id
+        execution = self.create_execution(function_id=function_id)
+        execution_id = execution.id
+        invoker = mock.Mock()
+        self.default_engine.invoker = invoker
+        self.default_engine.function_load_check = mock.Mock(return_value='')
+        etcd_util_get_service_url_mock.return_value = 'svc_url'
+        engine_utils_get_request_data_mock.return_value = 'data'
+        engine_utils_url_request_mock.return_value = (
+            True, {'output': 'success output'})
+
+        self.default_engine.create_execution(
+            mock.Mock(), execution_id, function_id, 0, runtime_id)
+
+        invoker.invoke.assert_not_called()
+        engine_utils_url_request_mock.assert_called_once_with(
+            self.default_engine.session, 'svc_url/execute', body='data',
+            fallback_url=None)
+        execution = db_api.get_execution(execution_id)
+        self.assertEqual(status.SUCCESS, execution.status)
+
+    @mock.patch('qinling.engine.utils.get_request_data')
+    @mock.patch('qinling.engine.utils.url_request')
+    @mock.patch('qinling.utils.etcd_util.get_service_url')
+    def test_create_execution_counted(
+        self,
+        etcd_util_get_service_url_mock,
+        engine_utils_url_request_mock,
+        engine_utils_get_request_data_mock
+    ):
+        function = self.create_function()
+        function_id = function.id
+        runtime_id = function.runtime_id
+        execution = self.create_execution(function_id=function_id)
+        counter = self.default_engine.execution_counter
+        counts = []
+
+        def _load_check(function_id, version, runtime_id):
+            counts.append(counter.get(function_id, version))
+
+        self.default_engine.function_load_check = _load_check
+        etcd_util_get_service_url_mock.return_value = 'svc_url'
+        engine_utils_url_request_mock.return_value = (
+            True, {'output': 'success output'})
+
+        self.default_engine.create_execution(
+            mock.Mock(), execution.id, function_id, 0, runtime_id)
+
+        self.assertEqual([1], counts)
+        self.assertEqual(0, counter.get(function_id, 0))
+
+    @mock.patch('qinling.engine.utils.get_request_data')
+    @mock.patch('qinling.utils.etcd_util.get_service_url')
+    def test_create_execution_counted_async_invoke(
+        self,
+        etcd_util_get_service_url_mock,
+        engine_utils_get_request_data_mock
+    ):
+        function = self.create_function()
+        function_id = function.id
+        runtime_id = function.runtime_id
+        execution = self.create_execution(function_id=function_id)
+        invoker = mock.Mock()
+        self.default_engine.invoker = invoker
+        self.default_engine.function_load_check = mock.Mock(return_value='')
+        etcd_util_get_service_url_mock.return_value = 'svc_url'
+        counter = self.default_engine.execution_counter
+
+        self.default_engine.create_execution(
+            mock.Mock(), execution.id, function_id, 0, runtime_id,
+            is_sync=False)
+
+        # The execution is still running until the function returns.
+        self.assertEqual(1, counter.get(function_id, 0))
+
+        callback = invoker.invoke.call_args[0][2]
+        callback(True, {'output': 'success output'})
+
+        self.assertEqual(0, counter.get(function_id, 0))
+
+    def test_create_execution_counted_exception(self):
+        function_id = common.generate_unicode_uuid()
+        runtime_id = common.generate_unicode_uuid()
+
+        self.assertRaises(
+            exc.DBEntityNotFoundError,
+            self.default_engine.create_execution,
+            mock.Mock(), common.generate_unicode_uuid(), function_id, 0,
+            runtime_id
+        )
+        self.assertEqual(
+            0, self.default_engine.execution_counter.get(function_id, 0))
+
+    @mock.patch('qinling.engine.utils.get_request_data')
+    @mock.patch('qinling.engine.utils.url_request')
+    @mock.patch('qinling.utils.etcd_util.get_worker_urls')
+    @mock.patch('qinling.utils.etcd_util.get_service_url')
+    def test_create_execution_least_loaded_worker(
+        self,
+        etcd_util_get_service_url_mock,
+        etcd_util_get_worker_urls_mock,
+        engine_utils_url_request_mock,
+        engine_utils_get_request_data_mock
+    ):
+        self.override_config('worker_routing', 'least_loaded', 'engine')
+        function = self.create_function()
+        function_id = function.id
+        runtime_id = function.runtime_id
+        execution = self.create_execution(function_id=function_id)
+        self.default_engine.function_load_check = mock.Mock(return_value='')
+        etcd_util_get_service_url_mock.return_value = 'svc_url'
+        etcd_util_get_worker_urls_mock.return_value = ['pod1_url',
+                                                       'pod2_url']
+        engine_utils_get_request_data_mock.return_value = 'data'
+        engine_utils_url_request_mock.return_value = (
+            True, {'output': 'success output'})
+        # pod1 is busy with another execution.
+        balancer = self.default_engine.worker_balancer
+        balancer.acquire(['pod1_url'])
+
+        self.default_engine.create_execution(
+            mock.Mock(), execution.id, function_id, 0, runtime_id)
+
+        etcd_util_get_worker_urls_mock.assert_called_once_with(function_id, 0)
+        engine_utils_url_request_mock.assert_called_once_with(
+            self.default_engine.session, 'pod2_url/execute', body='data',
+            fallback_url='svc_url/execute')
+        self.assertEqual(1, balancer.get_load('pod1_url'))
+        self.assertEqual(0, balancer.get_load('pod2_url'))
+
+    @mock.patch('qinling.engine.utils.WORKER_HEALTH')
+    @mock.patch('qinling.engine.utils.get_request_data')
+    @mock.patch('qinling.engine.utils.url_request')
+    @mock.patch('qinling.utils.etcd_util.get_worker_urls')
+    @mock.patch('qinling.utils.etcd_util.get_service_url')
+    def test_create_execution_least_loaded_skip_unreachable_worker(
+        self,
+        etcd_util_get_service_url_mock,
+        etcd_util_get_worker_urls_mock,
+        engine_utils_url_request_mock,
+        engine_utils_get_request_data_mock,
+        worker_health_mock
+    ):
+        self.override_config('worker_routing', 'least_loaded', 'engine')
+        function = self.create_function()
+        function_id = function.id
+        execution = self.create_execution(function_id=function_id)
+        self.default_engine.function_load_check = mock.Mock(return_value='')
+        etcd_util_get_service_url_mock.return_value = 'svc_url'
+        etcd_util_get_worker_urls_mock.return_value = ['pod1_url',
+                                                       'pod2_url']
+        engine_utils_get_request_data_mock.return_value = 'data'
+        engine_utils_url_request_mock.return_value = (
+            True, {'output': 'success output'})
+        # pod2 could not be connected.
+        worker_health_mock.is_unreachable.side_effect = (
+            lambda url: url == 'pod2_url'
+        )
+        self.default_engine.worker_balancer.acquire(['pod1_url'])
+
+        self.default_engine.create_execution(
+            mock.Mock(), execution.id, function_id, 0, function.runtime_id)
+
+        engine_utils_url_request_mock.assert_called_once_with(
+            self.default_engine.session, 'pod1_url/execute', body='data',
+            fallback_url='svc_url/execute')
+
+    @mock.patch('qinling.engine.utils.get_request_data')
+    @mock.patch('qinling.engine.utils.url_request')
+    @mock.patch('qinling.utils.etcd_util.get_worker_urls')
+    @mock.patch('qinling.utils.etcd_util.get_service_url')
+    def test_create_execution_least_loaded_no_worker_url(
+        self,
+        etcd_util_get_service_url_mock,
+        etcd_util_get_worker_urls_mock,
+        engine_utils_url_request_mock,
+        engine_utils_get_request_data_mock
+    ):
+        self.override_config('worker_routing', 'least_loaded', 'engine')
+        function = self.create_function()
+        function_id = function.id
+        runtime_id = function.runtime_id
+        execution = self.create_execution(function_id=function_id)
+        self.default_engine.function_load_check = mock.Mock(return_value='')
+        etcd_util_get_service_url_mock.return_value = 'svc_url'
+        etcd_util_get_worker_urls_mock.return_value = []
+        engine_utils_get_request_data_mock.return_value = 'data'
+        engine_utils_url_request_mock.return_value = (
+            True, {'output': 'success output'})
+
+        self.default_engine.create_execution(
+            mock.Mock(), execution.id, function_id, 0, runtime_id)
+
+        engine_utils_url_request_mock.assert_called_once_with(
+            self.default_engine.session, 'svc_url/execute', body='data',
+            fallback_url=None)
+
     def test_delete_function(self):
         function_id = common.generate_unicode_uuid()
 
@@ -492,6 +780,108 @@ class TestDefaultEngine(base.DbTestCase):
         etcd_util_create_service_url_mock.assert_called_once_with(
             function_id, 'url', version=0)
 
+    @mock.patch('qinling.utils.etcd_util.create_worker_url')
+    @mock.patch('qinling.utils.etcd_util.create_service_url')
+    @mock.patch('qinling.utils.etcd_util.create_worker')
+    def test_scaleup_function_least_loaded(
+        self,
+        etcd_util_create_worker_mock,
+        etcd_util_create_service_url_mock,
+        etcd_util_create_worker_url_mock
+    ):
+        self.override_config('worker_routing', 'least_loaded', 'engine')
+        function_id = common.generate_unicode_uuid()
+        runtime_id = common.generate_unicode_uuid()
+        self.orchestrator.scaleup_function.return_value = (['worker'], 'url')
+        self.orchestrator.get_worker_url.return_value = 'worker_url'
+
+        self.default_engine.scaleup_function(
+            mock.Mock(), function_id, 0, runtime_id)
+
+        self.orchestrator.get_worker_url.assert_called_once_with('worker')
+        etcd_util_create_worker_mock.assert_called_once_with(
+            function_id, 'worker', version=0)
+        etcd_util_create_worker_url_mock.assert_called_once_with(
+            function_id, 'worker', 'worker_url', version=0)
+
+    @mock.patch('qinling.utils.etcd_util.create_service_url')
+    @mock.patch('qinling.utils.etcd_util.create_worker')
+    def test_scaleup_function_prefetch_package(
+        self,
+        etcd_util_create_worker_mock,
+        etcd_util_create_service_url_mock
+    ):
+        self.override_config('prefetch_package', True, 'engine')
+        self.override_config('auth_enable', False, 'pecan')
+        function = self.create_function()
+        function_id = function.id
+        runtime_id = function.runtime_id
+        self.orchestrator.scaleup_function.return_value = (['worker'], 'url')
+
+        manager = mock.Mock()
+        manager.attach_mock(self.orchestrator.prefetch_package, 'prefetch')
+        manager.attach_mock(etcd_util_create_worker_mock, 'create_worker')
+
+        self.default_engine.scaleup_function(
+            mock.Mock(), function_id, 0, runtime_id)
+
+        data = {
+            'function_id': function_id,
+            'function_version': 0,
+            'download_url': 'http://127.0.0.1:7070/v1/functions/%s'
+                            '?download=true' % function_id,
+            'md5sum': 'fake_md5',
+            'unzip': True,
+        }
+        # The worker is registered after the package is downloaded.
+        manager.assert_has_calls([
+            mock.call.prefetch('worker', data),
+            mock.call.create_worker(function_id, 'worker', version=0)
+        ])
+
+    @mock.patch('qinling.utils.etcd_util.create_service_url')
+    @mock.patch('qinling.utils.etcd_util.create_worker')
+    def test_scaleup_function_prefetch_package_version(
+        self,
+        etcd_util_create_worker_mock,
+        etcd_util_create_service_url_mock
+    ):
+        self.override_config('prefetch_package', True, 'engine')
+        self.override_config('auth_enable', False, 'pecan')
+        function = self.create_function()
+        function_id = function.id
+        self.create_function_version(0, function_id=function_id,
+                                     md5sum='version_md5')
+        self.orchestrator.scaleup_function.return_value = (['worker'], 'url')
+
+        self.default_engine.scaleup_function(
+            mock.Mock(), function_id, 1, function.runtime_id)
+
+        # The package of the version is identified by its own md5.
+        data = self.orchestrator.prefetch_package.call_args[0][1]
+        self.assertEqual(1, data['function_version'])
+        self.assertEqual('version_md5', data['md5sum'])
+
+    @mock.patch('qinling.utils.etcd_util.create_service_url')
+    @mock.patch('qinling.utils.etcd_util.create_worker')
+    def test_scaleup_function_prefetch_package_failed(
+        self,
+        etcd_util_create_worker_mock,
+        etcd_util_create_service_url_mock
+    ):
+        self.override_config('prefetch_package', True, 'engine')
+        function = self.create_function()
+        self.orchestrator.scaleup_function.return_value = (['worker'], 'url')
+        self.orchestrator.prefetch_package.side_effect = (
+            exc.OrchestratorException()
+        )
+
+        self.default_engine.scaleup_function(
+            mock.Mock(), function.id, 0, function.runtime_id)
+
+        etcd_util_create_worker_mock.assert_called_once_with(
+            function.id, 'worker', version=0)
+
     @mock.patch('qinling.utils.etcd_util.create_service_url')
     @mock.patch('qinling.utils.etcd_util.create_worker')
     def test_scaleup_function_multiple_workers(
@@ -0,0 +1,106 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+import asyncio
+from unittest import mock
+
+from oslo_config import cfg
+
+from qinling import config
+from qinling import context
+from qinling.engine import invoker
+from qinling.engine import utils
+from qinling.tests.unit import base
+
+CONF = cfg.CONF
+
+
+class TestAsyncInvoker(base.BaseTest):
+    def setUp(self):
+        super(TestAsyncInvoker, self).setUp()
+        CONF.register_opts(config.engine_opts, config.ENGINE_GROUP)
+        CONF.register_opts(config.rlimits_opts, config.RLIMITS_GROUP)
+
+        self.invoker = invoker.AsyncInvoker(CONF)
+        self.invoker.start()
+        self.addCleanup(self.invoker.stop)
+
+    def test_invoke(self):
+        ctx = base.get_context()
+        context.set_ctx(ctx)
+        self.addCleanup(context.set_ctx, None)
+        results = []
+
+        def _callback(success, res):
+            results.append((success, res, context.get_ctx()))
+
+        with mock.patch.object(
+            self.invoker, 'url_request',
+            new=mock.AsyncMock(return_value=(True, {'output': 'result'}))
+        ) as url_request_mock:
+            future = self.invoker.invoke('http://svc/execute', {'a': 1},
+                                         _callback)
+            future.result(timeout=5)
+
+        url_request_mock.assert_awaited_once_with('http://svc/execute',
+                                                  body={'a': 1},
+                                                  fallback_url=None)
+        self.assertEqual([(True, {'output': 'result'}, ctx)], results)
+
+    def test_invoke_callback_exception(self):
+        callback = mock.Mock(side_effect=RuntimeError)
+
+        with mock.patch.object(
+            self.invoker, 'url_request',
+            new=mock.AsyncMock(return_value=(False, {'output': 'failed'}))
+        ):
+            future = self.invoker.invoke('http://svc/execute', {}, callback)
+            future.result(timeout=5)
+
+        callback.assert_called_once_with(False, {'output': 'failed'})
+
+    def test_url_request(self):
+        health_cache = utils.WorkerHealthCache()
+        health_cache.mark_healthy('http://svc')
+        patcher = mock.patch.object(utils, 'WORKER_HEALTH', health_cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        response = mock.Mock()
+        response.json = mock.AsyncMock(return_value={'output': 'result'})
+        post = mock.MagicMock()
+        post.return_value.__aenter__.return_value = response
+        session = self.invoker.session
+        self.invoker.session = mock.Mock(post=post)
+        self.addCleanup(setattr, self.invoker, 'session', session)
+
+        success, res = asyncio.run_coroutine_threadsafe(
+            self.invoker.url_request('http://svc/execute',
+                                     body={'timeout': 30}),
+            self.invoker.loop
+        ).result(timeout=5)
+
+        self.assertTrue(success)
+        self.assertEqual({'output': 'result'}, res)
+        # The timeout is derived from the function timeout.
+        timeout = post.call_args[1]['timeout']
+        self.assertEqual(30 + CONF.engine.execution_timeout_margin,
+                         timeout.total)
+
+    def test_stop(self):
+        thread = self.invoker._thread
+
+        self.invoker.stop()
+
+        self.assertFalse(thread.is_alive())
+        self.assertIsNone(self.invoker.loop)
+        # Stopping again does nothing.
+        self.invoker.stop()
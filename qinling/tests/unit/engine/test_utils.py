@@ -0,0 +1,316 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+from unittest import mock
+
+from oslo_config import cfg
+import requests
+
+from qinling import config
+from qinling.db import api as db_api
+from qinling.engine import utils
+from qinling import exceptions as exc
+from qinling import status
+from qinling.tests.unit import base
+from qinling.utils import constants
+
+SERVICE_URL = 'http://127.0.0.1:9090'
+EXECUTE_URL = SERVICE_URL + '/execute'
+PING_URL = SERVICE_URL + '/ping'
+CONF = cfg.CONF
+
+
+class TestUrlRequest(base.BaseTest):
+    def setUp(self):
+        super(TestUrlRequest, self).setUp()
+        CONF.register_opts(config.engine_opts, config.ENGINE_GROUP)
+        CONF.register_opts(config.rlimits_opts, config.RLIMITS_GROUP)
+
+        self.health_cache = utils.WorkerHealthCache()
+        patcher = mock.patch.object(utils, 'WORKER_HEALTH',
+                                    self.health_cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.session = mock.Mock()
+        self.session.post.return_value.json.return_value = {
+            'output': 'result'
+        }
+
+    def test_url_request_ping_first(self):
+        success, res = utils.url_request(self.session, EXECUTE_URL, body={})
+
+        self.assertTrue(success)
+        self.assertEqual({'output': 'result'}, res)
+        self.session.get.assert_called_once_with(
+            PING_URL, timeout=(3, 3), verify=False
+        )
+        self.assertTrue(self.health_cache.is_fresh(SERVICE_URL))
+
+    def test_url_request_skip_ping_for_healthy_service(self):
+        self.health_cache.mark_healthy(SERVICE_URL)
+
+        success, res = utils.url_request(self.session, EXECUTE_URL,
+                                         body={'timeout': 30})
+
+        self.assertTrue(success)
+        self.session.get.assert_not_called()
+        # The engine waits for the function timeout and the margin.
+        self.session.post.assert_called_once_with(
+            EXECUTE_URL, json={'timeout': 30}, timeout=(3, 150), verify=False
+        )
+
+    def test_url_request_default_timeout(self):
+        self.override_config('execution_timeout_margin', 60, 'engine')
+        self.health_cache.mark_healthy(SERVICE_URL)
+
+        utils.url_request(self.session, EXECUTE_URL, body={})
+
+        self.session.post.assert_called_once_with(
+            EXECUTE_URL, json={},
+            timeout=(3, CONF.resource_limits.default_timeout + 60),
+            verify=False
+        )
+
+    def test_url_request_health_cache_disabled(self):
+        self.override_config('worker_health_ttl', 0, 'engine')
+        self.health_cache.mark_healthy(SERVICE_URL)
+
+        utils.url_request(self.session, EXECUTE_URL, body={})
+
+        self.session.get.assert_called_once_with(
+            PING_URL, timeout=(3, 3), verify=False
+        )
+
+    @mock.patch('time.monotonic')
+    def test_url_request_health_expired(self, mock_time):
+        mock_time.return_value = 100
+        self.health_cache.mark_healthy(SERVICE_URL)
+        mock_time.return_value = 1000
+
+        utils.url_request(self.session, EXECUTE_URL, body={})
+
+        self.session.get.assert_called_once_with(
+            PING_URL, timeout=(3, 3), verify=False
+        )
+
+    def test_url_request_ping_on_connection_error(self):
+        self.health_cache.mark_healthy(SERVICE_URL)
+        response = mock.Mock()
+        response.json.return_value = {'output': 'result'}
+        self.session.post.side_effect = [requests.ConnectionError, response]
+
+        success, res = utils.url_request(self.session, EXECUTE_URL, body={})
+
+        self.assertTrue(success)
+        self.assertEqual({'output': 'result'}, res)
+        self.session.get.assert_called_once_with(
+            PING_URL, timeout=(3, 3), verify=False
+        )
+        self.assertEqual(2, self.session.post.call_count)
+
+    @mock.patch('tenacity.nap.time.sleep', mock.Mock())
+    def test_url_request_ping_failed(self):
+        self.session.get.side_effect = requests.ConnectionError
+
+        success, res = utils.url_request(self.session, EXECUTE_URL, body={})
+
+        self.assertFalse(success)
+        self.assertEqual({'output': 'Function execution failed.'}, res)
+        self.session.post.assert_not_called()
+        self.assertFalse(self.health_cache.is_fresh(SERVICE_URL))
+
+
+    def test_url_request_fallback_on_ping_failed(self):
+        fallback_url = 'http://svc:9090/execute'
+
+        def _get(url, **kwargs):
+            if url == PING_URL:
+                raise requests.ConnectionError()
+
+        self.session.get.side_effect = _get
+
+        success, res = utils.url_request(self.session, EXECUTE_URL, body={},
+                                         fallback_url=fallback_url)
+
+        self.assertTrue(success)
+        # The worker is pinged only once.
+        self.assertEqual(
+            [mock.call(PING_URL, timeout=(3, 3), verify=False),
+             mock.call('http://svc:9090/ping', timeout=(3, 3),
+                       verify=False)],
+            self.session.get.call_args_list
+        )
+        self.session.post.assert_called_once_with(
+            fallback_url, json={}, timeout=mock.ANY, verify=False
+        )
+        self.assertTrue(self.health_cache.is_unreachable(SERVICE_URL))
+
+    def test_url_request_fallback_on_connection_error(self):
+        fallback_url = 'http://svc:9090/execute'
+        self.health_cache.mark_healthy(SERVICE_URL)
+        self.health_cache.mark_healthy('http://svc:9090')
+        response = mock.Mock()
+        response.json.return_value = {'output': 'result'}
+        self.session.post.side_effect = [requests.ConnectionError, response]
+
+        success, res = utils.url_request(self.session, EXECUTE_URL, body={},
+                                         fallback_url=fallback_url)
+
+        self.assertTrue(success)
+        self.assertEqual({'output': 'result'}, res)
+        self.session.get.assert_not_called()
+        self.assertEqual(fallback_url, self.session.post.call_args[0][0])
+        self.assertFalse(self.health_cache.is_fresh(SERVICE_URL))
+        self.assertTrue(self.health_cache.is_unreachable(SERVICE_URL))
+
+
+class TestWorkerHealthCache(base.BaseTest):
+    def setUp(self):
+        super(TestWorkerHealthCache, self).setUp()
+        CONF.register_opts(config.engine_opts, config.ENGINE_GROUP)
+
+        self.health_cache = utils.WorkerHealthCache()
+
+    @mock.patch('time.monotonic')
+    def test_unreachable_expired(self, mock_time):
+        mock_time.return_value = 100
+        self.health_cache.mark_unreachable(SERVICE_URL)
+
+        self.assertTrue(self.health_cache.is_unreachable(SERVICE_URL))
+
+        mock_time.return_value = 1000
+        self.assertFalse(self.health_cache.is_unreachable(SERVICE_URL))
+
+    @mock.patch('time.monotonic')
+    def test_unreachable_pruned(self, mock_time):
+        mock_time.return_value = 100
+        self.health_cache.mark_unreachable('http://gone:9090')
+        mock_time.return_value = 1000
+
+        self.health_cache.mark_unreachable(SERVICE_URL)
+
+        self.assertEqual([SERVICE_URL],
+                         list(self.health_cache._unreachable))
+
+    def test_healthy_not_unreachable(self):
+        self.health_cache.mark_unreachable(SERVICE_URL)
+
+        self.health_cache.mark_healthy(SERVICE_URL)
+
+        self.assertFalse(self.health_cache.is_unreachable(SERVICE_URL))
+
+
+class TestExecutionCounter(base.BaseTest):
+    def setUp(self):
+        super(TestExecutionCounter, self).setUp()
+        self.counter = utils.ExecutionCounter()
+
+    def test_increase_decrease(self):
+        self.assertEqual(1, self.counter.increase('func', 0))
+        self.assertEqual(2, self.counter.increase('func', 0))
+        self.assertEqual(1, self.counter.increase('func', 1))
+
+        self.assertEqual(1, self.counter.decrease('func', 0))
+        self.assertEqual(1, self.counter.get('func', 0))
+        self.assertEqual(1, self.counter.get('func', 1))
+
+    def test_decrease_not_below_zero(self):
+        self.assertEqual(0, self.counter.decrease('func', 0))
+        self.assertEqual(0, self.counter.get('func', 0))
+
+    def test_reconcile(self):
+        for _ in range(3):
+            self.counter.increase('func1', 0)
+            self.counter.increase('func2', 0)
+            self.counter.increase('func3', 0)
+
+        self.counter.reconcile({('func1', 0): 1, ('func2', 0): 5,
+                                ('func4', 0): 2})
+
+        self.assertEqual(1, self.counter.get('func1', 0))
+        self.assertEqual(0, self.counter.get('func3', 0))
+        # The executions of the other engines are counted.
+        self.assertEqual(5, self.counter.get('func2', 0))
+        self.assertEqual(2, self.counter.get('func4', 0))
+
+        self.assertEqual(2, self.counter.decrease('func2', 0))
+        self.assertEqual(4, self.counter.get('func2', 0))
+
+        # The executions of the other engines finished.
+        self.counter.reconcile({('func2', 0): 2})
+
+        self.assertEqual(2, self.counter.get('func2', 0))
+        self.assertEqual(0, self.counter.get('func4', 0))
+
+
+class TestWorkerLoadBalancer(base.BaseTest):
+    def setUp(self):
+        super(TestWorkerLoadBalancer, self).setUp()
+        self.balancer = utils.WorkerLoadBalancer()
+
+    def test_acquire_least_loaded(self):
+        urls = ['url1', 'url2', 'url3']
+
+        chosen = [self.balancer.acquire(urls) for _ in range(3)]
+
+        self.assertCountEqual(urls, chosen)
+
+        self.balancer.release('url2')
+
+        self.assertEqual('url2', self.balancer.acquire(urls))
+        self.assertEqual(1, self.balancer.get_load('url2'))
+
+    def test_release(self):
+        self.balancer.acquire(['url1'])
+        self.balancer.release('url1')
+        self.balancer.release('url1')
+
+        self.assertEqual(0, self.balancer.get_load('url1'))
+
+
+class TestFinishExecution(base.DbTestCase):
+    def setUp(self):
+        super(TestFinishExecution, self).setUp()
+        self.execution_id = self.create_execution().id
+
+    def test_finish_execution(self):
+        utils.finish_execution(self.execution_id, True,
+                               {'logs': 'execution log', 'output': 'ok'})
+
+        execution = db_api.get_execution(self.execution_id)
+        self.assertEqual(status.SUCCESS, execution.status)
+        self.assertEqual({'output': 'ok'}, execution.result)
+        self.assertEqual('execution log',
+                         db_api.get_execution_log(self.execution_id))
+        self.assertEqual('log',
+                         db_api.get_execution_log(self.execution_id,
+                                                  offset=10, length=5))
+
+    def test_finish_execution_truncate_logs(self):
+        self.override_config('execution_log_max_size', 5, 'engine')
+
+        utils.finish_execution(self.execution_id, True,
+                               {'logs': 'execution log'})
+
+        self.assertEqual(
+            constants.EXECUTION_LOG_TRUNCATED % 8 + 'n log',
+            db_api.get_execution_log(self.execution_id)
+        )
+
+    def test_finish_execution_without_logs(self):
+        utils.finish_execution(self.execution_id, False, {'logs': ''})
+
+        execution = db_api.get_execution(self.execution_id)
+        self.assertEqual(status.FAILED, execution.status)
+        self.assertRaises(exc.DBEntityNotFoundError,
+                          db_api.get_execution_log, self.execution_id)
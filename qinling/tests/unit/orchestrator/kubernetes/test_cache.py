@@ -0,0 +1,143 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+import threading
+from unittest import mock
+
+from qinling.orchestrator.kubernetes import cache as k8s_cache
+from qinling.tests.unit import base
+
+
+def _create_pod(name, labels=None, phase='Running', resource_version='1'):
+    pod = mock.Mock()
+    pod.metadata.name = name
+    pod.metadata.resource_version = resource_version
+    pod.metadata.labels = labels
+    pod.status.phase = phase
+    return pod
+
+
+class TestResourceCache(base.BaseTest):
+    def setUp(self):
+        super(TestResourceCache, self).setUp()
+
+        self.list_func = mock.Mock()
+        ret = mock.Mock()
+        ret.items = [
+            _create_pod('pod1', {'runtime_id': 'runtime'}),
+            _create_pod('pod2', {'runtime_id': 'runtime',
+                                 'function_id': 'func',
+                                 'function_version': '0'}),
+        ]
+        ret.metadata.resource_version = '100'
+        self.list_func.return_value = ret
+
+        self.watch = mock.Mock()
+        self.watch_stopped = threading.Event()
+
+        def _stream(*args, **kwargs):
+            yield {'type': 'ADDED', 'object': _create_pod('pod3')}
+            yield {'type': 'DELETED', 'object': _create_pod('pod1')}
+            self.cache.stop()
+            self.watch_stopped.set()
+
+        self.watch.stream.side_effect = _stream
+        mock.patch('kubernetes.watch.Watch',
+                   return_value=self.watch).start()
+
+        self.cache = k8s_cache.ResourceCache(self.list_func, 'ns', 'pod')
+
+    def test_start(self):
+        self.cache.start()
+        self.watch_stopped.wait(5)
+
+        self.list_func.assert_called_once_with('ns')
+        self.watch.stream.assert_called_once_with(
+            self.list_func, 'ns', resource_version='100',
+            timeout_seconds=k8s_cache.WATCH_TIMEOUT
+        )
+        self.assertIsNone(self.cache.get('pod1'))
+        self.assertIsNotNone(self.cache.get('pod2'))
+        self.assertIsNotNone(self.cache.get('pod3'))
+
+    def test_list(self):
+        self.cache._relist()
+
+        pods = self.cache.list(labels={'runtime_id': 'runtime'},
+                               without_labels=['function_id'])
+        self.assertEqual(['pod1'], [p.metadata.name for p in pods])
+
+        pods = self.cache.list(
+            labels={'function_id': 'func', 'function_version': 0}
+        )
+        self.assertEqual(['pod2'], [p.metadata.name for p in pods])
+
+    def test_put(self):
+        self.cache._relist()
+
+        self.cache.put(_create_pod('pod1', {'runtime_id': 'runtime',
+                                            'function_id': 'func'}))
+
+        pods = self.cache.list(labels={'runtime_id': 'runtime'},
+                               without_labels=['function_id'])
+        self.assertEqual([], pods)
+
+    def test_relist_keep_newer(self):
+        self.cache._relist()
+        self.cache.put(_create_pod('pod1', {'function_id': 'func'},
+                                   resource_version='101'))
+        self.cache.put(_create_pod('pod4', resource_version='101'))
+        self.cache.put(_create_pod('pod5', resource_version='99'))
+
+        self.cache._relist()
+
+        # The resources put after the list are kept.
+        self.assertEqual({'function_id': 'func'},
+                         self.cache.get('pod1').metadata.labels)
+        self.assertIsNotNone(self.cache.get('pod4'))
+        self.assertIsNone(self.cache.get('pod5'))
+
+    def test_handle_event_older(self):
+        self.cache._relist()
+        self.cache.put(_create_pod('pod1', phase='Succeeded',
+                                   resource_version='101'))
+
+        self.cache._handle_event('MODIFIED', _create_pod(
+            'pod1', phase='Running', resource_version='100'))
+
+        self.assertEqual('Succeeded', self.cache.get('pod1').status.phase)
+
+    def test_wait_for(self):
+        self.cache._relist()
+
+        def _succeed():
+            self.cache._handle_event(
+                'MODIFIED', _create_pod('pod1', phase='Succeeded')
+            )
+
+        timer = threading.Timer(0.1, _succeed)
+        timer.start()
+        self.addCleanup(timer.cancel)
+
+        pod = self.cache.wait_for(
+            'pod1', lambda p: p is not None and p.status.phase == 'Succeeded',
+            timeout=5
+        )
+
+        self.assertEqual('Succeeded', pod.status.phase)
+
+    def test_wait_for_timeout(self):
+        self.cache._relist()
+
+        pod = self.cache.wait_for('pod1', lambda p: p is None, timeout=0.1)
+
+        self.assertIsNone(pod)
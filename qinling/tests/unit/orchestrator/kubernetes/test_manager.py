@@ -163,6 +163,39 @@ class TestKubernetesManager(base.DbTestCase):
         self.k8s_v1_ext.read_namespaced_deployment.assert_called_once_with(
             fake_deployment_name, self.fake_namespace)
 
+    def test_create_pool_package_cache_host_path(self):
+        ret = mock.Mock()
+        ret.status.replicas = 5
+        ret.status.available_replicas = 5
+        self.k8s_v1_ext.read_namespaced_deployment.return_value = ret
+        self.override_config('package_cache_host_path', '/var/lib/qinling',
+                             config.KUBERNETES_GROUP)
+        fake_deployment_name = self.rand_name('deployment', prefix=self.prefix)
+        fake_image = self.rand_name('image', prefix=self.prefix)
+
+        self.manager.create_pool(fake_deployment_name, fake_image)
+
+        body = self.k8s_v1_ext.create_namespaced_deployment.call_args[1][
+            'body']
+        pod_spec = body['spec']['template']['spec']
+        self.assertIn(
+            {'name': 'package-cache-folder',
+             'hostPath': {'path': '/var/lib/qinling',
+                          'type': 'DirectoryOrCreate'}},
+            pod_spec['volumes']
+        )
+        sidecar = pod_spec['containers'][1]
+        self.assertIn(
+            {'name': 'package-cache-folder',
+             'mountPath': '/var/qinling/package-cache'},
+            sidecar['volumeMounts']
+        )
+        self.assertEqual(
+            [{'name': 'QINLING_NODE_CACHE_DIR',
+              'value': '/var/qinling/package-cache'}],
+            sidecar['env']
+        )
+
     def test_create_pool_wait_deployment_available(self):
         ret1 = mock.Mock()
         ret1.status.replicas = 0
@@ -617,6 +650,47 @@ class TestKubernetesManager(base.DbTestCase):
         expected_output = {'duration': 10, 'logs': fake_log}
         self.assertEqual(expected_output, output)
 
+    def test_run_execution_image_type_function_watch_cache(self):
+        pod = mock.Mock()
+        status = mock.Mock()
+        status.state.terminated.finished_at = datetime.datetime(2018, 9, 4, 10,
+                                                                1, 50)
+        status.state.terminated.started_at = datetime.datetime(2018, 9, 4, 10,
+                                                               1, 40)
+        pod.status.container_statuses = [status]
+        self.manager.pod_cache = mock.Mock()
+        self.manager.pod_cache.wait_for.return_value = pod
+        self.k8s_v1_api.read_namespaced_pod_log.return_value = 'fake log'
+        execution_id = common.generate_unicode_uuid()
+        function_id = common.generate_unicode_uuid()
+        identifier = 'fake_identifier'
+
+        result, output = self.manager.run_execution(
+            execution_id, function_id, 0, identifier=identifier, timeout=10)
+
+        self.manager.pod_cache.wait_for.assert_called_once_with(
+            identifier, k8s_manager._pod_succeeded, timeout=10)
+        self.k8s_v1_api.read_namespaced_pod.assert_not_called()
+        self.assertTrue(result)
+        self.assertEqual({'duration': 10, 'logs': 'fake log'}, output)
+
+    def test_run_execution_image_type_function_watch_cache_timeout(self):
+        self.manager.pod_cache = mock.Mock()
+        self.manager.pod_cache.wait_for.return_value = None
+        execution_id = common.generate_unicode_uuid()
+        function_id = common.generate_unicode_uuid()
+        identifier = 'fake_identifier'
+
+        result, output = self.manager.run_execution(
+            execution_id, function_id, 0, identifier=identifier, timeout=10)
+
+        self.assertFalse(result)
+        self.assertEqual(
+            {'output': 'Function execution timeout.', 'duration': 10},
+            output)
+        self.k8s_v1_api.delete_namespaced_pod.assert_called_once_with(
+            identifier, self.fake_namespace)
+
     def test_run_execution_image_type_function_retry(self):
         pod1 = mock.Mock()
         pod1.status.phase = ''
@@ -710,6 +784,7 @@ class TestKubernetesManager(base.DbTestCase):
             'download_url': download_url,
             'request_id': self.ctx.request_id,
             'timeout': timeout,
+            'md5sum': None,
         }
 
         mock_request.assert_called_once_with(
@@ -834,6 +909,41 @@ class TestKubernetesManager(base.DbTestCase):
         self.k8s_v1_api.create_namespaced_service.assert_called_once_with(
             self.fake_namespace, yaml.safe_load(service_body))
 
+    def test_scaleup_function_watch_cache(self):
+        pod = mock.Mock()
+        pod.metadata.name = self.rand_name('pod', prefix=self.prefix)
+        pod.metadata.labels = {'pod1_key1': 'pod1_value1'}
+        self.manager.pod_cache = mock.Mock()
+        list_calls = []
+
+        def _list(labels=None, without_labels=None):
+            # The labels are updated by the manager after the pods are
+            # listed, keep a copy.
+            list_calls.append((dict(labels), without_labels))
+            return [pod]
+
+        self.manager.pod_cache.list.side_effect = _list
+        self.k8s_v1_api.create_namespaced_service.return_value = (
+            self._create_service()
+        )
+        self.k8s_v1_api.list_node.return_value = (
+            self._create_nodes_with_external_ip()
+        )
+        runtime_id = common.generate_unicode_uuid()
+        function_id = common.generate_unicode_uuid()
+
+        pod_names, service_url = self.manager.scaleup_function(
+            function_id, 0, identifier=runtime_id
+        )
+
+        self.assertEqual([pod.metadata.name], pod_names)
+        self.k8s_v1_api.list_namespaced_pod.assert_not_called()
+        self.assertEqual([({'runtime_id': runtime_id}, ['function_id'])],
+                         list_calls)
+        # The pod labels are updated in cache.
+        self.manager.pod_cache.put.assert_called_once_with(
+            self.k8s_v1_api.patch_namespaced_pod.return_value)
+
     def test_scaleup_function_not_enough_workers(self):
         runtime_id = common.generate_unicode_uuid()
         function_id = common.generate_unicode_uuid()
@@ -923,3 +1033,41 @@ class TestKubernetesManager(base.DbTestCase):
         self.k8s_v1_api.delete_namespaced_pod.assert_called_once_with(
             pod_name, self.fake_namespace
         )
+
+    def test_get_worker_url(self):
+        pod_name = self.rand_name('pod', prefix=self.prefix)
+        pod = mock.Mock()
+        pod.status.pod_ip = '10.0.0.5'
+        self.k8s_v1_api.read_namespaced_pod.return_value = pod
+
+        url = self.manager.get_worker_url(pod_name)
+
+        self.assertEqual('http://10.0.0.5:9090', url)
+        self.k8s_v1_api.read_namespaced_pod.assert_called_once_with(
+            pod_name, self.fake_namespace
+        )
+
+    @mock.patch('requests.Session.post')
+    def test_prefetch_package(self, post_mock):
+        pod_name = self.rand_name('pod', prefix=self.prefix)
+        pod = mock.Mock()
+        pod.status.pod_ip = '10.0.0.5'
+        self.k8s_v1_api.read_namespaced_pod.return_value = pod
+        data = {'function_id': 'fake_function_id', 'function_version': 0}
+
+        self.manager.prefetch_package(pod_name, data)
+
+        post_mock.assert_called_once_with(
+            'http://10.0.0.5:9090/prefetch', json=data
+        )
+
+    @mock.patch('requests.Session.post')
+    def test_prefetch_package_failed(self, post_mock):
+        pod_name = self.rand_name('pod', prefix=self.prefix)
+        post_mock.return_value.ok = False
+        data = {'function_id': 'fake_function_id', 'function_version': 0}
+
+        self.assertRaises(
+            exc.OrchestratorException,
+            self.manager.prefetch_package, pod_name, data
+        )
@@ -0,0 +1,234 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+import collections
+import hashlib
+import importlib.util
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
+import zipfile
+
+from qinling.tests.unit import base
+
+SIDECAR_FILE = os.path.join(
+    os.path.dirname(__file__), '..', '..', '..', '..', 'runtimes', 'sidecar',
+    'sidecar.py'
+)
+
+
+def _load_sidecar():
+    spec = importlib.util.spec_from_file_location('sidecar', SIDECAR_FILE)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+sidecar = _load_sidecar()
+
+
+def _create_zip(files, compression=zipfile.ZIP_DEFLATED):
+    data = io.BytesIO()
+    with zipfile.ZipFile(data, 'w', compression) as zf:
+        for name, content in files.items():
+            zf.writestr(name, content)
+    return data.getvalue()
+
+
+def _create_response(data, chunk_size=100):
+    resp = mock.Mock()
+    resp.status_code = 200
+    resp.headers = {'ETag': '"fake_etag"'}
+    resp.iter_content.return_value = [
+        data[i:i + chunk_size] for i in range(0, len(data), chunk_size)
+    ]
+    return resp
+
+
+class TestSidecar(base.BaseTest):
+    def setUp(self):
+        super(TestSidecar, self).setUp()
+
+        package_dir = tempfile.mkdtemp(prefix='tmp_qinling')
+        self.addCleanup(shutil.rmtree, package_dir, True)
+        self.cache_dir = os.path.join(package_dir, 'cache')
+
+        for name, value in [
+            ('PACKAGE_DIR', package_dir),
+            ('CACHE_DIR', self.cache_dir),
+            ('LOCK_PATH', os.path.join(package_dir, 'lock')),
+            ('_packages', collections.OrderedDict()),
+            ('_pinned', {}),
+            ('_packages_loaded', False),
+        ]:
+            patcher = mock.patch.object(sidecar, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        patcher = mock.patch.object(sidecar.requests, 'get')
+        self.get_mock = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.client = sidecar.app.test_client()
+        self.package = _create_zip(
+            {'main.py': 'def main():\n    return "hello"\n' * 50,
+             'lib/util.py': 'VALUE = 1\n'}
+        )
+        self.md5sum = hashlib.md5(self.package).hexdigest()
+
+    def _download(self, function_id='func', md5sum=None, **kwargs):
+        body = {
+            'download_url': 'http://qinling/download',
+            'function_id': function_id,
+            'function_version': 0,
+            'md5sum': md5sum or self.md5sum,
+        }
+        body.update(kwargs)
+        return self.client.post('/download', json=body)
+
+    def test_download(self):
+        self.get_mock.return_value = _create_response(self.package)
+
+        resp = self._download()
+
+        self.assertEqual(200, resp.status_code)
+        name = 'func_0_%s' % self.md5sum
+        package_dir = os.path.join(self.cache_dir, name)
+        self.assertEqual(
+            {'package_file': os.path.join(self.cache_dir, '%s.zip' % name),
+             'package_dir': package_dir},
+            resp.get_json()
+        )
+        with open(os.path.join(package_dir, 'lib', 'util.py')) as f:
+            self.assertEqual('VALUE = 1\n', f.read())
+        self.assertIn(name, sidecar._packages)
+        # Temporary files are removed.
+        self.assertEqual(
+            sorted([name, '%s.zip' % name]), sorted(os.listdir(self.cache_dir))
+        )
+
+    def test_download_cached(self):
+        self.get_mock.return_value = _create_response(self.package)
+        self._download()
+
+        with mock.patch('os.path.isdir') as isdir_mock:
+            resp = self._download()
+
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual(1, self.get_mock.call_count)
+        isdir_mock.assert_not_called()
+
+    def test_download_md5_mismatch(self):
+        self.get_mock.return_value = _create_response(self.package)
+
+        resp = self._download(md5sum='0' * 32)
+
+        self.assertEqual(500, resp.status_code)
+        self.assertIn(b'md5 mismatch', resp.data)
+        self.assertEqual([], os.listdir(self.cache_dir))
+        self.assertEqual({}, sidecar._packages)
+
+    def test_download_found_on_disk(self):
+        name = 'func_0_%s' % self.md5sum
+        os.makedirs(os.path.join(self.cache_dir, name))
+        sidecar._load_packages()
+        sidecar._packages.clear()
+
+        resp = self._download()
+
+        self.assertEqual(200, resp.status_code)
+        self.get_mock.assert_not_called()
+        self.assertIn(name, sidecar._packages)
+
+    @mock.patch.object(sidecar, 'KEEP_PACKAGE_FILE', False)
+    def test_download_unzip_after_download(self):
+        self.get_mock.return_value = _create_response(self.package)
+
+        with mock.patch.object(
+            sidecar, '_stream_extract',
+            side_effect=sidecar._UnsupportedZip('fake')
+        ):
+            resp = self._download()
+
+        self.assertEqual(200, resp.status_code)
+        # The package is extracted from the downloaded file instead of
+        # being downloaded again.
+        self.assertEqual(1, self.get_mock.call_count)
+        name = 'func_0_%s' % self.md5sum
+        self.assertEqual([name], os.listdir(self.cache_dir))
+        self.assertIsNone(resp.get_json()['package_file'])
+        self.assertTrue(
+            os.path.isfile(os.path.join(self.cache_dir, name, 'main.py'))
+        )
+
+    def test_download_stored_zip(self):
+        package = _create_zip({'main.py': 'x = 1\n'}, zipfile.ZIP_STORED)
+        self.get_mock.return_value = _create_response(package, chunk_size=7)
+
+        resp = self._download(md5sum=hashlib.md5(package).hexdigest())
+
+        self.assertEqual(200, resp.status_code)
+        with open(os.path.join(resp.get_json()['package_dir'],
+                               'main.py')) as f:
+            self.assertEqual('x = 1\n', f.read())
+
+    def test_download_evict(self):
+        packages = [_create_zip({'main.py': str(i) * 1000})
+                    for i in range(3)]
+        md5sums = [hashlib.md5(p).hexdigest() for p in packages]
+        self.get_mock.side_effect = [_create_response(p) for p in packages]
+
+        with mock.patch.object(sidecar, 'CACHE_SIZE', 2500):
+            resp = self._download('func1', md5sum=md5sums[0])
+            package_dir = resp.get_json()['package_dir']
+            # The first package is used by the warm executor.
+            self._download('func2', md5sum=md5sums[1], client=1,
+                           in_use=[package_dir])
+            self._download('func3', md5sum=md5sums[2], client=1,
+                           in_use=[package_dir])
+
+        self.assertEqual(
+            ['func1_0_%s' % md5sums[0], 'func3_0_%s' % md5sums[2]],
+            list(sidecar._packages)
+        )
+        self.assertTrue(os.path.isdir(package_dir))
+        self.assertFalse(os.path.exists(
+            os.path.join(self.cache_dir, 'func2_0_%s' % md5sums[1])
+        ))
+
+    @mock.patch.object(sidecar, 'time')
+    def test_download_pin_expired(self, time_mock):
+        packages = [_create_zip({'main.py': str(i) * 1000})
+                    for i in range(3)]
+        md5sums = [hashlib.md5(p).hexdigest() for p in packages]
+        self.get_mock.side_effect = [_create_response(p) for p in packages]
+        time_mock.time.return_value = 1000
+
+        with mock.patch.object(sidecar, 'CACHE_SIZE', 2500):
+            resp = self._download('func1', md5sum=md5sums[0])
+            package_dir = resp.get_json()['package_dir']
+            self._download('func2', md5sum=md5sums[1], client=1,
+                           in_use=[package_dir])
+            # The runtime process is gone and never reports again.
+            time_mock.time.return_value = 1001 + sidecar.PIN_TTL
+            self._download('func3', md5sum=md5sums[2], client=2,
+                           in_use=[])
+
+        # The package used by the gone process is removed.
+        self.assertEqual(
+            ['func2_0_%s' % md5sums[1], 'func3_0_%s' % md5sums[2]],
+            list(sidecar._packages)
+        )
+        self.assertFalse(os.path.exists(package_dir))
+        self.assertEqual([2], list(sidecar._pinned))
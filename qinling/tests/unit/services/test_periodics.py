@@ -20,9 +20,11 @@ from oslo_config import cfg
 
 from qinling import context
 from qinling.db import api as db_api
+from qinling.engine import utils as engine_utils
 from qinling.services import periodics
 from qinling import status
 from qinling.tests.unit import base
+from qinling.utils import executions
 
 CONF = cfg.CONF
 
@@ -31,6 +33,12 @@ class TestPeriodics(base.DbTestCase):
     def setUp(self):
         super(TestPeriodics, self).setUp()
         self.override_config('auth_enable', False, group='pecan')
+        self.addCleanup(executions.INVOCATION_COUNTER.clear)
+
+        patcher = mock.patch.object(executions.InvocationCounter,
+                                    '_start_flusher')
+        patcher.start()
+        self.addCleanup(patcher.stop)
 
     @mock.patch('qinling.utils.etcd_util.delete_function')
     @mock.patch('qinling.utils.etcd_util.get_service_url')
@@ -108,6 +116,21 @@ class TestPeriodics(base.DbTestCase):
         )
         mock_etcd_delete.assert_called_once_with(function_id, 0)
 
+    def test_handle_execution_counter(self):
+        function_id = self.create_function().id
+        self.create_execution(function_id=function_id)
+        self.create_execution(function_id=function_id)
+        self.create_execution(function_id=function_id, status=status.SUCCESS)
+        mock_engine = mock.Mock()
+        mock_engine.execution_counter = engine_utils.ExecutionCounter()
+        for _ in range(4):
+            mock_engine.execution_counter.increase(function_id, 0)
+
+        periodics.handle_execution_counter(mock_engine)
+
+        self.assertEqual(
+            2, mock_engine.execution_counter.get(function_id, 0))
+
     @mock.patch('qinling.utils.jobs.get_next_execution_time')
     def test_job_handler(self, mock_get_next):
         db_func = self.create_function()
@@ -128,6 +151,7 @@ class TestPeriodics(base.DbTestCase):
         mock_get_next.return_value = now + timedelta(seconds=1)
 
         periodics.handle_job(e_client)
+        executions.INVOCATION_COUNTER.flush()
         context.set_ctx(self.ctx)
 
         db_job = db_api.get_job(job_id)
@@ -138,6 +162,7 @@ class TestPeriodics(base.DbTestCase):
         self.assertEqual(1, len(db_execs))
 
         periodics.handle_job(e_client)
+        executions.INVOCATION_COUNTER.flush()
         context.set_ctx(self.ctx)
 
         db_job = db_api.get_job(job_id)
@@ -172,6 +197,7 @@ class TestPeriodics(base.DbTestCase):
         mock_next_time.return_value = now + timedelta(seconds=1)
 
         periodics.handle_job(e_client)
+        executions.INVOCATION_COUNTER.flush()
         context.set_ctx(self.ctx)
 
         db_job = db_api.get_job(job_id)
@@ -185,6 +211,7 @@ class TestPeriodics(base.DbTestCase):
         self.assertEqual(1, len(db_execs))
 
         periodics.handle_job(e_client)
+        executions.INVOCATION_COUNTER.flush()
         context.set_ctx(self.ctx)
 
         db_job = db_api.get_job(job_id)
@@ -219,6 +246,7 @@ class TestPeriodics(base.DbTestCase):
         )
 
         periodics.handle_job(e_client)
+        executions.INVOCATION_COUNTER.flush()
         context.set_ctx(self.ctx)
 
         # Create function version 1 and update the alias.
@@ -226,6 +254,7 @@ class TestPeriodics(base.DbTestCase):
         db_api.update_function_alias(alias_name, function_version=1)
 
         periodics.handle_job(e_client)
+        executions.INVOCATION_COUNTER.flush()
         context.set_ctx(self.ctx)
 
         db_func = db_api.get_function(function_id)
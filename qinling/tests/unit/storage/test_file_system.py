@@ -12,8 +12,12 @@
 #    See the License for the specific language governing permissions and
 #    limitations under the License.
 
+import io
 import os
+import shutil
+import tempfile
 from unittest import mock
+import zipfile
 
 from oslo_config import cfg
 
@@ -22,6 +26,7 @@ from qinling import exceptions as exc
 from qinling.storage import file_system
 from qinling.tests.unit import base
 from qinling.utils import common
+from qinling.utils import constants
 
 CONF = cfg.CONF
 FAKE_STORAGE_PATH = 'TMP_DIR'
@@ -35,12 +40,13 @@ class TestFileSystemStorage(base.BaseTest):
         self.project_id = base.DEFAULT_PROJECT_ID
         self.storage = file_system.FileSystemStorage(CONF)
 
+    @mock.patch.object(file_system.FileSystemStorage, '_link_blob')
     @mock.patch('oslo_utils.fileutils.ensure_tree')
     @mock.patch('os.rename')
     @mock.patch('qinling.storage.file_system.open')
     @mock.patch('zipfile.is_zipfile')
     def test_store(self, is_zipfile_mock, open_mock, rename_mock,
-                   ensure_tree_mock):
+                   ensure_tree_mock, link_blob_mock):
         is_zipfile_mock.return_value = True
         fake_fd = mock.Mock()
         open_mock.return_value.__enter__.return_value = fake_fd
@@ -69,6 +75,8 @@ class TestFileSystemStorage(base.BaseTest):
         fake_fd.write.assert_called_once_with(function_data)
         is_zipfile_mock.assert_called_once_with(temp_package_path)
         rename_mock.assert_called_once_with(temp_package_path, package_path)
+        link_blob_mock.assert_called_once_with(self.project_id, package_path,
+                                               md5)
 
     @mock.patch('oslo_utils.fileutils.ensure_tree')
     @mock.patch('os.path.exists')
@@ -109,6 +117,123 @@ class TestFileSystemStorage(base.BaseTest):
         ensure_tree_mock.assert_called_once_with(
             os.path.join(FAKE_STORAGE_PATH, self.project_id))
 
+    def _create_local_storage(self):
+        storage_path = tempfile.mkdtemp(prefix='TestFileSystemStorage')
+        self.addCleanup(shutil.rmtree, storage_path, True)
+        self.override_config('file_system_dir', storage_path, 'storage')
+        return storage_path, file_system.FileSystemStorage(CONF)
+
+    def _create_package_data(self):
+        f = io.BytesIO()
+        with zipfile.ZipFile(f, 'w') as zf:
+            zf.writestr('main.py', 'def main():\n    pass\n')
+        return f.getvalue()
+
+    def test_store_file(self):
+        storage_path, storage = self._create_local_storage()
+        function = self.rand_name('function', prefix='TestFileSystemStorage')
+        function_data = self._create_package_data()
+        md5 = common.md5(content=function_data)
+
+        package_updated, ret_md5 = storage.store(
+            self.project_id, function, io.BytesIO(function_data)
+        )
+
+        self.assertTrue(package_updated)
+        self.assertEqual(md5, ret_md5)
+        package_path = os.path.join(
+            storage_path,
+            file_system.PACKAGE_PATH_TEMPLATE % (self.project_id, function,
+                                                 md5)
+        )
+        with open(package_path, 'rb') as f:
+            self.assertEqual(function_data, f.read())
+
+        # Store the same package again.
+        package_updated, ret_md5 = storage.store(
+            self.project_id, function, io.BytesIO(function_data)
+        )
+
+        self.assertFalse(package_updated)
+        self.assertEqual(
+            ['%s_%s.zip' % (function, md5)],
+            os.listdir(os.path.join(storage_path, self.project_id))
+        )
+
+    def test_store_file_md5_mismatch(self):
+        storage_path, storage = self._create_local_storage()
+        function = self.rand_name('function', prefix='TestFileSystemStorage')
+
+        self.assertRaisesRegex(
+            exc.InputException,
+            "^Package md5 mismatch\.$",
+            storage.store,
+            self.project_id, function,
+            io.BytesIO(self._create_package_data()), md5sum="Not a md5sum"
+        )
+        self.assertEqual(
+            [], os.listdir(os.path.join(storage_path, self.project_id))
+        )
+
+    def test_store_same_package(self):
+        storage_path, storage = self._create_local_storage()
+        function_data = self._create_package_data()
+        md5 = common.md5(content=function_data)
+
+        storage.store(self.project_id, 'fake_function_1', function_data)
+        storage.store(self.project_id, 'fake_function_2',
+                      io.BytesIO(function_data))
+
+        blob = os.path.join(storage_path, file_system.BLOB_DIR,
+                            self.project_id, md5[:2], '%s.zip' % md5)
+        for function in ['fake_function_1', 'fake_function_2']:
+            package_path = os.path.join(
+                storage_path,
+                file_system.PACKAGE_PATH_TEMPLATE % (self.project_id,
+                                                     function, md5)
+            )
+            self.assertTrue(os.path.samefile(blob, package_path))
+        self.assertEqual(3, os.stat(blob).st_nlink)
+
+    def test_store_same_package_other_project(self):
+        storage_path, storage = self._create_local_storage()
+        function_data = self._create_package_data()
+        md5 = common.md5(content=function_data)
+
+        storage.store(self.project_id, 'fake_function_1', function_data)
+        storage.store('other_project', 'fake_function_2', function_data)
+
+        # The packages of different projects are not linked together.
+        package_path = os.path.join(
+            storage_path,
+            file_system.PACKAGE_PATH_TEMPLATE % (self.project_id,
+                                                 'fake_function_1', md5)
+        )
+        other_package_path = os.path.join(
+            storage_path,
+            file_system.PACKAGE_PATH_TEMPLATE % ('other_project',
+                                                 'fake_function_2', md5)
+        )
+        self.assertFalse(os.path.samefile(package_path, other_package_path))
+        self.assertEqual(2, os.stat(package_path).st_nlink)
+        self.assertEqual(2, os.stat(other_package_path).st_nlink)
+
+    @mock.patch.object(constants, 'MAX_PACKAGE_SIZE', 10)
+    def test_store_file_too_large(self):
+        storage_path, storage = self._create_local_storage()
+        function = self.rand_name('function', prefix='TestFileSystemStorage')
+
+        self.assertRaisesRegex(
+            exc.InputException,
+            "^Package size exceeds the limit",
+            storage.store,
+            self.project_id, function,
+            io.BytesIO(self._create_package_data())
+        )
+        self.assertEqual(
+            [], os.listdir(os.path.join(storage_path, self.project_id))
+        )
+
     @mock.patch('oslo_utils.fileutils.delete_if_exists')
     @mock.patch('oslo_utils.fileutils.ensure_tree')
     @mock.patch('qinling.storage.file_system.open')
@@ -196,6 +321,25 @@ class TestFileSystemStorage(base.BaseTest):
 
         mock_exist.assert_called_once_with(version_zip)
 
+    @mock.patch('qinling.storage.file_system.open')
+    @mock.patch('os.path.exists')
+    @mock.patch('os.listdir')
+    def test_retrieve_version_md5(self, mock_list, mock_exist, mock_open):
+        function = "fake_function_id"
+        version = 1
+        md5 = "md5"
+        mock_exist.return_value = True
+
+        self.storage.retrieve(self.project_id, function, None,
+                              version=version, version_md5sum=md5)
+
+        version_zip = os.path.join(FAKE_STORAGE_PATH, self.project_id,
+                                   "%s_%s_%s.zip" % (function, version, md5))
+
+        mock_list.assert_not_called()
+        mock_exist.assert_called_once_with(version_zip)
+        mock_open.assert_called_once_with(version_zip, 'rb')
+
     @mock.patch('os.listdir')
     def test_retrieve_version_not_found(self, mock_list):
         function = "fake_function_id"
@@ -211,6 +355,8 @@ class TestFileSystemStorage(base.BaseTest):
             version=version
         )
 
+    @mock.patch.object(file_system.FileSystemStorage, '_blob_lock',
+                       mock.MagicMock())
     @mock.patch('os.path.exists')
     @mock.patch('os.remove')
     def test_delete(self, remove_mock, exists_mock):
@@ -227,6 +373,8 @@ class TestFileSystemStorage(base.BaseTest):
         exists_mock.assert_called_once_with(package_path)
         remove_mock.assert_called_once_with(package_path)
 
+    @mock.patch.object(file_system.FileSystemStorage, '_blob_lock',
+                       mock.MagicMock())
     @mock.patch('os.path.exists')
     @mock.patch('os.remove')
     @mock.patch('os.listdir')
@@ -306,3 +454,55 @@ class TestFileSystemStorage(base.BaseTest):
                                    "fake_function_1_fake_md5.zip")
 
         mock_copy.assert_called_once_with(expect_src, expect_dest)
+
+    @mock.patch('oslo_concurrency.lockutils.lock')
+    def test_delete_linked_package_locked(self, lock_mock):
+        storage_path, storage = self._create_local_storage()
+        function_data = self._create_package_data()
+        md5 = common.md5(content=function_data)
+        storage.store(self.project_id, 'fake_function', function_data)
+        lock_mock.reset_mock()
+
+        storage.delete(self.project_id, 'fake_function', md5)
+
+        # The blob is checked and removed in the lock of the project blobs.
+        lock_mock.assert_called_once_with(
+            file_system.BLOB_LOCK, external=True,
+            lock_path=os.path.join(storage_path, file_system.BLOB_DIR,
+                                   self.project_id)
+        )
+        self.assertEqual(
+            [], os.listdir(os.path.join(storage_path, file_system.BLOB_DIR,
+                                        self.project_id, md5[:2]))
+        )
+
+    def test_copy_and_delete_linked_package(self):
+        storage_path, storage = self._create_local_storage()
+        function_data = self._create_package_data()
+        md5 = common.md5(content=function_data)
+        storage.store(self.project_id, 'fake_function', function_data)
+
+        storage.copy(self.project_id, 'fake_function', md5, 0)
+
+        package_path = os.path.join(
+            storage_path,
+            file_system.PACKAGE_PATH_TEMPLATE % (self.project_id,
+                                                 'fake_function', md5)
+        )
+        version_path = os.path.join(storage_path, self.project_id,
+                                    'fake_function_1_%s.zip' % md5)
+        blob = os.path.join(storage_path, file_system.BLOB_DIR,
+                            self.project_id, md5[:2], '%s.zip' % md5)
+        self.assertTrue(os.path.samefile(package_path, version_path))
+        self.assertEqual(3, os.stat(blob).st_nlink)
+
+        storage.delete(self.project_id, 'fake_function', md5)
+
+        self.assertFalse(os.path.exists(package_path))
+        self.assertEqual(2, os.stat(blob).st_nlink)
+
+        storage.delete(self.project_id, 'fake_function', md5, version=1,
+                       version_md5sum=md5)
+
+        self.assertFalse(os.path.exists(version_path))
+        self.assertFalse(os.path.exists(blob))
@@ -0,0 +1,136 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+import threading
+from unittest import mock
+
+from qinling.db import api as db_api
+from qinling.db.sqlalchemy import models
+from qinling.tests.unit import base
+from qinling.utils import executions
+
+
+class TestInvocationCounter(base.DbTestCase):
+    def setUp(self):
+        super(TestInvocationCounter, self).setUp()
+        self.override_config('execution_count_flush_interval', 1, 'api')
+
+        self.counter = executions.InvocationCounter()
+        patcher = mock.patch.object(self.counter, '_start_flusher')
+        self.mock_start_flusher = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(executions, 'INVOCATION_COUNTER',
+                                    self.counter)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.function_id = self.create_function().id
+
+    def test_increase_and_flush(self):
+        self.counter.increase(models.Function, self.function_id)
+        self.counter.increase(models.Function, self.function_id)
+
+        self.assertEqual(0, db_api.get_function(self.function_id).count)
+        self.assertEqual(
+            2, self.counter.get(models.Function, self.function_id)
+        )
+
+        self.counter.flush()
+
+        self.assertEqual(2, db_api.get_function(self.function_id).count)
+        self.assertEqual(
+            0, self.counter.get(models.Function, self.function_id)
+        )
+
+    def test_increase_without_batch(self):
+        self.override_config('execution_count_flush_interval', 0, 'api')
+
+        self.counter.increase(models.Function, self.function_id)
+
+        self.assertEqual(1, db_api.get_function(self.function_id).count)
+        self.mock_start_flusher.assert_not_called()
+
+    @mock.patch.object(db_api, 'conditional_update')
+    def test_flush_failed(self, mock_update):
+        mock_update.side_effect = Exception('fake error')
+        self.counter.increase(models.Function, self.function_id)
+
+        self.counter.flush()
+
+        # The count is kept to be written later.
+        self.assertEqual(
+            1, self.counter.get(models.Function, self.function_id)
+        )
+        self.assertEqual(
+            1, executions.get_count(db_api.get_function(self.function_id))
+        )
+
+    def test_flush_concurrently(self):
+        writing = threading.Event()
+        written = threading.Event()
+        updates = []
+
+        def _update_count(model, id, count):
+            updates.append(count)
+            writing.set()
+            written.wait(5)
+
+        self.counter.increase(models.Function, self.function_id)
+
+        with mock.patch.object(executions, '_update_count', _update_count):
+            first = threading.Thread(target=self.counter.flush)
+            first.start()
+            writing.wait(5)
+
+            # The second flush waits for the first one to finish.
+            self.counter.increase(models.Function, self.function_id)
+            second = threading.Thread(target=self.counter.flush)
+            second.start()
+            second.join(0.1)
+            self.assertTrue(second.is_alive())
+            self.assertEqual(
+                2, self.counter.get(models.Function, self.function_id)
+            )
+
+            written.set()
+            first.join(5)
+            second.join(5)
+
+        self.assertEqual([1, 1], updates)
+        self.assertEqual(
+            0, self.counter.get(models.Function, self.function_id)
+        )
+
+    @mock.patch('os.getpid')
+    def test_flusher_started_per_process(self, mock_getpid):
+        mock_getpid.return_value = 100
+        self.counter.increase(models.Function, self.function_id)
+        self.counter.increase(models.Function, self.function_id)
+
+        self.mock_start_flusher.assert_called_once_with(1)
+
+        # The API worker forked from the process.
+        mock_getpid.return_value = 101
+        self.counter.increase(models.Function, self.function_id)
+
+        self.assertEqual(2, self.mock_start_flusher.call_count)
+
+    @mock.patch.object(executions, 'time')
+    def test_flush_periodically(self, mock_time):
+        self.counter.increase(models.Function, self.function_id)
+        # Stop the loop after the first flush.
+        mock_time.sleep.side_effect = [None, StopIteration()]
+
+        self.assertRaises(StopIteration, self.counter._flush_periodically, 1)
+
+        mock_time.sleep.assert_called_with(1)
+        self.assertEqual(1, db_api.get_function(self.function_id).count)
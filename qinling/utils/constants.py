@@ -26,3 +26,5 @@ IMAGE_FUNCTION = 'image'
 MAX_PACKAGE_SIZE = 51 * 1024 * 1024
 
 MAX_VERSION_NUMBER = 10
+
+EXECUTION_LOG_TRUNCATED = '[%s characters of the logs are truncated]\n'
@@ -70,6 +70,7 @@ def create_worker(function_id, worker, version=0):
 def delete_worker(function_id, worker, version=0):
     client = get_client()
     client.delete('%s_%s/worker_%s' % (function_id, version, worker))
+    client.delete('%s_%s/url_%s' % (function_id, version, worker))
 
 
 def get_workers(function_id, version=0):
@@ -79,6 +80,18 @@ def get_workers(function_id, version=0):
     return workers
 
 
+def create_worker_url(function_id, worker, url, version=0):
+    """Create the address of the worker in etcd."""
+    client = get_client()
+    client.create('%s_%s/url_%s' % (function_id, version, worker), url)
+
+
+def get_worker_urls(function_id, version=0):
+    client = get_client()
+    values = client.get_prefix("%s_%s/url_" % (function_id, version))
+    return [encodeutils.safe_decode(v[0]) for v in values]
+
+
 def delete_function(function_id, version=0):
     client = get_client()
     client.delete_prefix("%s_%s" % (function_id, version))
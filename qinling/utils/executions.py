@@ -11,6 +11,12 @@
 #    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 #    See the License for the specific language governing permissions and
 #    limitations under the License.
+import atexit
+import os
+import threading
+import time
+
+from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_serialization import jsonutils
 
@@ -21,51 +27,124 @@ from qinling import status
 from qinling.utils import constants
 
 LOG = logging.getLogger(__name__)
-
-
-def _update_function_db(function_id, pre_count):
-    # Function update is done using UPDATE ... FROM ... WHERE
-    # non-locking clause.
-    while True:
-        modified = db_api.conditional_update(
-            models.Function,
-            {
-                'count': pre_count + 1,
-            },
-            {
-                'id': function_id,
-                'count': pre_count
-            },
-            insecure=True,
-        )
-        if not modified:
-            LOG.warning("Retrying to update function count.")
-            pre_count += 1
-            continue
-        else:
-            break
-
-
-def _update_function_version_db(version_id, pre_count):
-    # Update is done using UPDATE ... FROM ... WHERE non-locking clause.
-    while True:
-        modified = db_api.conditional_update(
-            models.FunctionVersion,
-            {
-                'count': pre_count + 1,
-            },
-            {
-                'id': version_id,
-                'count': pre_count
-            },
-            insecure=True,
-        )
-        if not modified:
-            LOG.warning("Retrying to update function version count.")
-            pre_count += 1
-            continue
-        else:
-            break
+CONF = cfg.CONF
+
+
+def _update_count(model, id, count):
+    # The count is increased in a single UPDATE statement, so it doesn't
+    # depend on the count read before, which may be cached.
+    db_api.conditional_update(
+        model,
+        {
+            'count': model.count + count,
+        },
+        {
+            'id': id,
+        },
+        insecure=True,
+    )
+
+
+class InvocationCounter(object):
+    """Accumulates the execution counts of functions and function versions.
+
+    The counts are written to the database in batches by flush(), so that
+    the executions of a function don't update the same database row one by
+    one. flush() is called periodically by a thread started in the process
+    counting the executions, and when the process exits. The counts not
+    written yet are added to the counts shown by the API.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # The periodic flush and the flush at exit may run at the same time,
+        # only one batch is written at a time.
+        self._flush_lock = threading.Lock()
+        self._counts = {}
+        self._flushing = {}
+        self._flusher_pid = None
+
+    def get(self, model, id):
+        key = (model, id)
+
+        with self._lock:
+            return self._counts.get(key, 0) + self._flushing.get(key, 0)
+
+    def increase(self, model, id):
+        interval = CONF.api.execution_count_flush_interval
+        if interval <= 0:
+            _update_count(model, id, 1)
+            return
+
+        with self._lock:
+            key = (model, id)
+            self._counts[key] = self._counts.get(key, 0) + 1
+
+            # The API workers are forked after the application is set up,
+            # so the flush thread is started by the process which counts the
+            # executions.
+            if self._flusher_pid != os.getpid():
+                self._flusher_pid = os.getpid()
+                self._start_flusher(interval)
+
+    def _start_flusher(self, interval):
+        thread = threading.Thread(target=self._flush_periodically,
+                                  args=(interval,))
+        thread.daemon = True
+        thread.start()
+
+        atexit.register(self.flush)
+
+        LOG.info('Execution count flusher started.')
+
+    def _flush_periodically(self, interval):
+        while True:
+            time.sleep(interval)
+            self.flush()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                self._flushing, self._counts = self._counts, {}
+                counts = self._flushing
+
+            if not counts:
+                return
+
+            flushed = False
+            try:
+                with db_api.transaction():
+                    for (model, id), count in counts.items():
+                        _update_count(model, id, count)
+                flushed = True
+            except Exception:
+                LOG.exception('Failed to update the execution counts, will '
+                              'retry later.')
+            finally:
+                with self._lock:
+                    # The counts failed to be written are merged back with
+                    # the executions counted in the meantime.
+                    if not flushed:
+                        for key, count in counts.items():
+                            self._counts[key] = (self._counts.get(key, 0) +
+                                                 count)
+                    self._flushing = {}
+
+    def clear(self):
+        with self._lock:
+            self._counts.clear()
+
+
+INVOCATION_COUNTER = InvocationCounter()
+
+
+def get_count(db_obj):
+    """Get the execution count of the function or function version.
+
+    The count includes the executions not written to the database yet.
+    """
+    return (db_obj.count or 0) + INVOCATION_COUNTER.get(type(db_obj),
+                                                        db_obj.id)
 
 
 def create_execution(engine_client, params):
@@ -76,18 +155,21 @@ def create_execution(engine_client, params):
     input = params.get('input')
 
     if function_alias:
-        alias_db = db_api.get_function_alias(function_alias)
+        alias_db = db_api.get_cached_function_alias(function_alias)
         function_id = alias_db.function_id
         version = alias_db.function_version
         params.update({'function_id': function_id,
                        'function_version': version})
 
-    func_db = db_api.get_function(function_id)
+    func_db = db_api.get_cached_function(function_id)
     runtime_id = func_db.runtime_id
 
     # Image type function does not need runtime
     if runtime_id:
-        runtime_db = db_api.get_runtime(runtime_id)
+        runtime_db = db_api.get_cached_runtime(runtime_id)
+        if runtime_db and runtime_db.status != status.AVAILABLE:
+            # The runtime may have become available after it was cached.
+            runtime_db = db_api.get_runtime(runtime_id)
         if runtime_db and runtime_db.status != status.AVAILABLE:
             raise exc.RuntimeNotAvailableException(
                 'Runtime %s is not available.' % func_db.runtime_id
@@ -101,12 +183,10 @@ def create_execution(engine_client, params):
             )
 
         # update version count
-        version_db = db_api.get_function_version(function_id, version)
-        pre_version_count = version_db.count
-        _update_function_version_db(version_db.id, pre_version_count)
+        version_db = db_api.get_cached_function_version(function_id, version)
+        INVOCATION_COUNTER.increase(models.FunctionVersion, version_db.id)
     else:
-        pre_count = func_db.count
-        _update_function_db(function_id, pre_count)
+        INVOCATION_COUNTER.increase(models.Function, function_id)
 
     # input in params should be a string.
     if input:
@@ -13,20 +13,30 @@
 #    limitations under the License.
 
 import functools
+import io
 import json
+import os
 
+from oslo_config import cfg
 from oslo_log import log as logging
 import pecan
 import webob
+from webob.static import FileIter
 from wsme import exc as wsme_exc
+from wsme import types as wtypes
 
 from qinling import context
 from qinling import exceptions as exc
 
 LOG = logging.getLogger(__name__)
+CONF = cfg.CONF
 
+# Block size of the package files passed to wsgi.file_wrapper.
+FILE_BLOCK_SIZE = 65536
 FILTER_TYPES = ('in', 'nin', 'eq', 'neq', 'gt', 'gte', 'lt', 'lte', 'has')
 LIST_VALUE_FILTER_TYPES = {'in', 'nin'}
+SORT_DIRS = ('asc', 'desc')
+PAGINATION_PARAMS = ('limit', 'marker')
 
 
 def wrap_wsme_controller_exception(func):
@@ -75,6 +85,97 @@ def wrap_pecan_controller_exception(func):
     return wrapped
 
 
+class PackageResponse(webob.Response):
+    """The response sending a function package.
+
+    pecan reads the body of a response with status 200 to check whether it's
+    empty and should be turned into 204, unless the body is a generator which
+    it only peeks at. The package is given to pecan behind a generator that
+    doesn't read it, and the package itself is sent once pecan is done, so
+    the WSGI server still gets its file wrapper and the range requests are
+    still served from the FileIter. pecan unsets the content length when it
+    replaces the generator, so the package length is kept as well.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(PackageResponse, self).__init__(*args, **kwargs)
+
+        self.package = []
+        self.package_length = None
+        self.app_iter = self._iter_package()
+
+    def _iter_package(self):
+        # The empty chunk is what pecan peeks at.
+        yield b''
+
+        for chunk in self.package:
+            yield chunk
+
+    def __call__(self, environ, start_response):
+        self._app_iter = self.package
+        if self.package_length is not None:
+            self.content_length = self.package_length
+
+        return super(PackageResponse, self).__call__(environ, start_response)
+
+
+def get_package_response(f, filename, etag=None):
+    """Get the response sending the function package.
+
+    For the package files, ETag, conditional and range requests are
+    supported so that the clients can validate the package they have and
+    resume the interrupted downloads. The package files are sent without
+    being read in the API process when the WSGI server or the web server in
+    front supports it.
+
+    :param f: A file object or an iterable of the package data.
+    :param filename: The file name used in Content-Disposition.
+    :param etag: Optional. The ETag of the package, generated from the file
+        size and modification time if not provided.
+    :return: The response to return from the controller.
+    """
+    resp = PackageResponse(
+        status=200,
+        content_type='application/zip',
+        content_disposition='attachment; filename="%s"' % filename
+    )
+
+    if not isinstance(f, io.IOBase):
+        resp.package = f
+        return resp
+
+    stat = os.fstat(f.fileno())
+    resp.last_modified = int(stat.st_mtime)
+    resp.etag = etag or '%x-%x' % (int(stat.st_mtime), stat.st_size)
+    resp.conditional_response = True
+
+    sendfile_header = CONF.storage.sendfile_header
+    if sendfile_header:
+        # The web server sends the file and handles the range requests.
+        path = f.name
+        if sendfile_header == 'X-Accel-Redirect':
+            path = '%s/%s' % (
+                CONF.storage.sendfile_location.rstrip('/'),
+                os.path.relpath(path, CONF.storage.file_system_dir)
+            )
+        f.close()
+        resp.headers[sendfile_header] = path
+        return resp
+
+    # The WSGI server may send the file with sendfile(2) instead of reading
+    # it in the API process. FileIter is used for range requests as it can
+    # seek to the range.
+    file_wrapper = pecan.request.environ.get('wsgi.file_wrapper')
+    if file_wrapper and not pecan.request.range:
+        resp.package = file_wrapper(f, FILE_BLOCK_SIZE)
+    else:
+        resp.package = FileIter(f)
+    resp.package_length = stat.st_size
+    resp.accept_ranges = 'bytes'
+
+    return resp
+
+
 def get_filters(**params):
     """Create filters from REST request parameters.
 
@@ -145,3 +246,125 @@ def get_project_params(project_id, all_projects):
         all_projects = True
 
     return project_id, all_projects
+
+
+def _split(value):
+    return [v.strip() for v in value.split(',') if v.strip()] if value else []
+
+
+def get_pagination_params(cls, model, limit=None, sort_keys=None,
+                          sort_dirs=None, fields=None):
+    """Validate the pagination parameters of a list request.
+
+    :param cls: The resource class of the list items.
+    :param model: The db model of the list items.
+    :param limit: Optional. Maximum number of items to return, can not
+        exceed [api]max_limit. All the items are returned if not provided.
+    :param sort_keys: Optional. Comma-separated resource fields to sort the
+        items by, defaults to 'created_at'. Only the fields stored in the
+        database can be sorted by.
+    :param sort_dirs: Optional. Comma-separated sort directions, 'asc' or
+        'desc', for each sort key.
+    :param fields: Optional. Comma-separated resource fields to return.
+    :return: A tuple (limit, sort keys list, sort dirs list, fields list).
+    """
+    if limit is not None:
+        if limit <= 0:
+            raise exc.InputException("Limit must be positive.")
+        limit = min(limit, CONF.api.max_limit)
+
+    resource_fields = cls.get_fields()
+    sortable_keys = set(resource_fields) & set(model.__table__.columns.keys())
+
+    sort_keys = _split(sort_keys) or ['created_at']
+    sort_dirs = _split(sort_dirs)
+    invalid_keys = set(sort_keys) - sortable_keys
+    if invalid_keys:
+        raise exc.InputException(
+            "Invalid sort keys: %s" % ', '.join(sorted(invalid_keys))
+        )
+    if len(sort_dirs) > len(sort_keys):
+        raise exc.InputException(
+            "The number of sort directions exceeds the number of sort keys."
+        )
+    invalid_dirs = set(sort_dirs) - set(SORT_DIRS)
+    if invalid_dirs:
+        raise exc.InputException(
+            "Invalid sort directions: %s" % ', '.join(sorted(invalid_dirs))
+        )
+    sort_dirs += ['asc'] * (len(sort_keys) - len(sort_dirs))
+
+    fields = _split(fields)
+    invalid_fields = set(fields) - set(resource_fields)
+    if invalid_fields:
+        raise exc.InputException(
+            "Invalid fields: %s" % ', '.join(sorted(invalid_fields))
+        )
+    # The id is needed as the marker of the next page.
+    if fields and 'id' not in fields:
+        fields.insert(0, 'id')
+
+    return limit, sort_keys, sort_dirs, fields
+
+
+def get_all(list_cls, cls, model, get_all_function, limit=None, marker=None,
+            sort_keys=None, sort_dirs=None, fields=None,
+            resource_function=None, **kwargs):
+    """Get a page of the resources and the link to the next page.
+
+    The resources are paginated by the sort keys of the last item of the
+    page (the marker), so the database doesn't need to skip the previous
+    pages.
+
+    :param list_cls: The resource list class.
+    :param cls: The resource class of the list items.
+    :param model: The db model of the list items.
+    :param get_all_function: The db api function to get the items.
+    :param limit: Optional. Maximum number of items to return.
+    :param marker: Optional. ID of the last item of the previous page.
+    :param sort_keys: Optional. Comma-separated sort keys.
+    :param sort_dirs: Optional. Comma-separated sort directions.
+    :param fields: Optional. Comma-separated fields to return, only the
+        columns of these fields are loaded from the database.
+    :param resource_function: Optional. The function to create the resource
+        from the db object.
+    :param kwargs: Other arguments passed to get_all_function, e.g. the
+        filters.
+    """
+    limit, sort_keys, sort_dirs, fields = get_pagination_params(
+        cls, model, limit, sort_keys, sort_dirs, fields
+    )
+
+    db_models = get_all_function(
+        limit=limit,
+        marker=marker,
+        sort_keys=sort_keys,
+        sort_dirs=sort_dirs,
+        fields=fields,
+        **kwargs
+    )
+
+    if fields:
+        # Only the columns of the fields are queried, the rows are turned
+        # into db objects holding these columns, so that the resources are
+        # created in the same way as the full db objects.
+        db_models = [model(**row._asdict()) for row in db_models]
+
+    resource_function = resource_function or cls.from_db_obj
+    resources = [resource_function(m) for m in db_models]
+
+    if fields:
+        # The fields not requested may be set by resource_function, they
+        # are unset, the attributes with a default value still show it.
+        unrequested_fields = set(cls.get_fields()) - set(fields)
+        for resource in resources:
+            for field in unrequested_fields:
+                setattr(resource, field, wtypes.Unset)
+
+    # The other query parameters are kept in the next link.
+    params = {k: v for k, v in pecan.request.GET.items()
+              if k not in PAGINATION_PARAMS}
+
+    return list_cls.convert_with_links(
+        resources, limit, url=pecan.request.path_url, **params
+    )
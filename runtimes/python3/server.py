@@ -12,15 +12,20 @@
 #    See the License for the specific language governing permissions and
 #    limitations under the License.
 
+import collections
+import hashlib
 import importlib
+from importlib import machinery
+import io
 import json
-from multiprocessing import Manager
+from multiprocessing import Pipe
 from multiprocessing import Process
 import os
 import resource
 import sys
 import time
 import traceback
+import zipfile
 
 from flask import Flask
 from flask import request
@@ -37,6 +42,32 @@ INVOKE_ERROR = "Function execution failed because of too much resource " \
                "consumption"
 TIMEOUT_ERROR = "Function execution timeout."
 
+# Number of executions an executor process runs before it's replaced by a new
+# one. Set to 1 to run each execution in a fresh process.
+EXECUTOR_MAX_CALLS = int(os.getenv('QINLING_EXECUTOR_MAX_CALLS', 100))
+
+# Import the function package from the zip file instead of the extracted
+# folder, unless the package contains native extensions.
+ZIPIMPORT = os.getenv('QINLING_ZIPIMPORT', 'false').lower() in ('true', '1',
+                                                               'yes')
+
+# Max number of the openstack sessions kept by an executor process.
+SESSION_CACHE_SIZE = int(os.getenv('QINLING_SESSION_CACHE_SIZE', 16))
+# The cached session is not reused if its token expires within this period.
+SESSION_STALE_DURATION = 60
+
+# The openstack sessions of the current executor process in LRU order, keyed
+# by the hash of the auth parameters.
+_os_sessions = collections.OrderedDict()
+
+# The warm executor processes of the current server process, keyed by the
+# function, the function package, module and resource limits.
+_executors = {}
+
+# Whether the package zip files can be imported by zipimport, keyed by the
+# file path. The package files in the sidecar cache never change.
+_zipimport_packages = {}
+
 
 def _print_trace():
     exc_type, exc_value, exc_traceback = sys.exc_info()
@@ -86,10 +117,109 @@ def _killtree(pid, including_parent=True):
         parent.kill()
 
 
-def _invoke_function(execution_id, zip_file_dir, module_name, method, arg,
-                     input, return_dict, rlimit):
+def _download_package(params, unzip=True):
+    """Download function package by calling sidecar service.
+
+    The packages used by the warm executors of the process are sent to the
+    sidecar, so that they are not removed from the sidecar cache.
+    """
+    return requests.post(
+        'http://localhost:9091/download',
+        json={
+            'download_url': params.get('download_url'),
+            'function_id': params.get('function_id'),
+            'function_version': params.get('function_version', 0),
+            'md5sum': params.get('md5sum'),
+            'token': params.get('token'),
+            'unzip': unzip,
+            'client': os.getpid(),
+            'in_use': list(set(key[1] for key in _executors))
+        }
+    )
+
+
+def _is_zipimport_supported(package_file):
+    """Check if the package can be imported from the zip file.
+
+    zipimport can't load native extensions, such packages are extracted.
+    """
+    if package_file not in _zipimport_packages:
+        with zipfile.ZipFile(package_file) as zf:
+            _zipimport_packages[package_file] = not any(
+                name.endswith(tuple(machinery.EXTENSION_SUFFIXES))
+                for name in zf.namelist()
+            )
+
+    return _zipimport_packages[package_file]
+
+
+def _get_os_session(auth):
+    """Provide an openstack session to user's function.
+
+    The session is reused by the executions with the same trust so that the
+    token is not fetched from keystone for each execution.
+    """
+    if not auth:
+        return None
+
+    # The password is not kept in the key.
+    key = hashlib.sha256(json.dumps(
+        [auth['auth_url'], auth['trust_id'], auth['username'],
+         auth['password']]
+    ).encode('utf-8')).hexdigest()
+    os_session = _os_sessions.pop(key, None)
+
+    if os_session:
+        auth_ref = os_session.auth.auth_ref
+        if auth_ref and auth_ref.will_expire_soon(SESSION_STALE_DURATION):
+            os_session = None
+
+    if not os_session:
+        os_auth = generic.Password(
+            username=auth['username'],
+            password=auth['password'],
+            auth_url=auth['auth_url'],
+            trust_id=auth['trust_id'],
+            user_domain_name='Default'
+        )
+        os_session = session.Session(auth=os_auth, verify=False)
+
+    _os_sessions[key] = os_session
+    while len(_os_sessions) > SESSION_CACHE_SIZE:
+        _os_sessions.popitem(last=False)
+
+    return os_session
+
+
+class _LogWriter(io.TextIOBase):
+    """Send the function log to the server process line by line.
+
+    The lines received before the executor is killed are still returned as
+    the execution log.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.buffer = []
+
+    def write(self, data):
+        self.buffer.append(data)
+        if '\n' in data:
+            self.flush()
+        return len(data)
+
+    def flush(self):
+        if self.buffer:
+            self.conn.send(('log', ''.join(self.buffer)))
+            self.buffer = []
+
+
+def _run_executor(conn, zip_file_dir, module_name, rlimit):
     """Thie function is supposed to be running in a child process.
 
+    The child process imports the function module once and then runs the
+    executions received from the pipe until the pipe is closed.
+
     HOSTNAME will be used to create cgroup directory related to worker.
 
     Current execution pid will be added to cgroup tasks file, and then all
@@ -112,29 +242,163 @@ def _invoke_function(execution_id, zip_file_dir, module_name, method, arg,
         }
     )
 
-    sys.stdout = open("%s.out" % execution_id, "w")
-
-    if not root_resp.ok:
-        print('WARN: Resource limiting failed, run in unlimit mode.')
-
-    print(('Start execution: %s' % execution_id))
-
     sys.path.insert(0, zip_file_dir)
+    module = None
+    import_error = None
+    # The output of the module import is added to the log of the first
+    # execution.
+    import_output = sys.stdout = io.StringIO()
     try:
         module = importlib.import_module(module_name)
-        func = getattr(module, method)
-        return_dict['result'] = func(arg, **input) if arg else func(**input)
-        return_dict['success'] = True
     except Exception as e:
-        _print_trace()
+        import_error = e
+    finally:
+        sys.stdout = sys.__stdout__
 
-        if isinstance(e, OSError) and 'Resource' in str(e):
-            sys.exit(1)
+    while True:
+        try:
+            execution_id, method, arg, input, auth = conn.recv()
+        except EOFError:
+            break
 
-        return_dict['result'] = str(e)
-        return_dict['success'] = False
-    finally:
-        print(('Finished execution: %s' % execution_id))
+        sys.stdout = _LogWriter(conn)
+
+        if not root_resp.ok:
+            print('WARN: Resource limiting failed, run in unlimit mode.')
+
+        print(('Start execution: %s' % execution_id))
+
+        if import_output:
+            sys.stdout.write(import_output.getvalue())
+            import_output = None
+
+        try:
+            if import_error:
+                raise import_error
+
+            input.update({'context': {'os_session': _get_os_session(auth)}})
+            func = getattr(module, method)
+            result = func(arg, **input) if arg else func(**input)
+            success = True
+        except Exception as e:
+            _print_trace()
+
+            if isinstance(e, OSError) and 'Resource' in str(e):
+                sys.exit(1)
+
+            result = str(e)
+            success = False
+        finally:
+            print(('Finished execution: %s' % execution_id))
+            sys.stdout.flush()
+            sys.stdout = sys.__stdout__
+
+        try:
+            conn.send(('result', success, result))
+        except Exception as e:
+            # The result can not be sent back, e.g. it's not picklable.
+            conn.send(('result', False, str(e)))
+
+
+class _ExecutorExited(Exception):
+    """The executor process exited before receiving the execution."""
+
+
+class _Executor(object):
+    """A warm process running the executions of a function package."""
+
+    def __init__(self, zip_file_dir, module_name, rlimit):
+        self.calls = 0
+        self.conn, child_conn = Pipe()
+        self.process = Process(
+            target=_run_executor,
+            args=(child_conn, zip_file_dir, module_name, rlimit)
+        )
+        self.process.start()
+        child_conn.close()
+
+    def is_usable(self):
+        return self.process.is_alive() and self.calls < EXECUTOR_MAX_CALLS
+
+    def invoke(self, execution_id, method, arg, input, auth, timeout):
+        """Run the execution in the executor process.
+
+        Return a tuple including the output, whether the function succeeded
+        and the execution log.
+        """
+        self.calls += 1
+        try:
+            self.conn.send((execution_id, method, arg, input, auth))
+        except (OSError, ValueError):
+            # E.g. the process was killed after the previous execution.
+            raise _ExecutorExited()
+
+        deadline = time.time() + timeout if timeout else None
+        logs = []
+        while True:
+            remaining = max(deadline - time.time(), 0) if deadline else None
+            if not self.conn.poll(remaining):
+                _killtree(self.process.pid)
+                self.process.join()
+                return TIMEOUT_ERROR, False, ''.join(logs)
+
+            try:
+                message = self.conn.recv()
+            except EOFError:
+                # Process was killed unexpectedly or exited with error.
+                self.process.join()
+                return INVOKE_ERROR, False, ''.join(logs)
+
+            if message[0] == 'log':
+                logs.append(message[1])
+                continue
+
+            _, success, result = message
+            return result, success, ''.join(logs)
+
+    def stop(self):
+        self.conn.close()
+        self.process.join(1)
+        if self.process.is_alive():
+            _killtree(self.process.pid)
+            self.process.join()
+
+
+def _stop_old_executors(function, zip_file_dir):
+    """Stop the executors of the previous packages of the function."""
+    for key in list(_executors):
+        if key[0] == function and key[1] != zip_file_dir:
+            _executors.pop(key).stop()
+
+
+def _get_executor(function, zip_file_dir, module_name, rlimit):
+    """Get the warm executor of the function package.
+
+    :param function: A tuple of the function id and version.
+    """
+    key = (function, zip_file_dir, module_name, rlimit['cpu'],
+           rlimit['memory_size'])
+
+    executor = _executors.get(key)
+    if not executor or not executor.is_usable():
+        if executor:
+            executor.stop()
+        else:
+            _stop_old_executors(function, zip_file_dir)
+        executor = _executors[key] = _Executor(zip_file_dir, module_name,
+                                               rlimit)
+
+    return executor
+
+
+def _recycle_executor(executor, function, zip_file_dir, module_name, rlimit):
+    """Replace the executor in advance if it can't be used any more.
+
+    So that the next execution doesn't need to wait for the function module
+    to be imported.
+    """
+    if not executor.is_usable():
+        _get_executor(function, zip_file_dir, module_name, rlimit)
 
 
 @app.route('/execute', methods=['POST'])
@@ -151,7 +415,6 @@ def execute():
     params = request.get_json() or {}
     input = params.get('input') or {}
     execution_id = params['execution_id']
-    download_url = params.get('download_url')
     function_id = params.get('function_id')
     entry = params.get('entry')
     request_id = params.get('request_id')
@@ -160,7 +423,6 @@ def execute():
     username = params.get('username')
     password = params.get('password')
     timeout = params.get('timeout')
-    zip_file_dir = '/var/qinling/packages/%s' % function_id
     rlimit = {
         'cpu': params['cpu'],
         'memory_size': params['memory_size']
@@ -182,57 +444,60 @@ def execute():
     # zip file existence here to avoid using partial file during downloading.
     #
     ####################################################################
-    resp = requests.post(
-        'http://localhost:9091/download',
-        json={
-            'download_url': download_url,
-            'function_id': function_id,
-            'token': params.get('token')
-        }
-    )
+    resp = _download_package(params, unzip=not ZIPIMPORT)
     if not resp.ok:
         return _get_responce(resp.content, 0, '', False, 500)
 
-    ####################################################################
-    #
-    # Provide an openstack session to user's function
-    #
-    ####################################################################
-    os_session = None
+    # Each version of the package is kept in its own folder, so the warm
+    # executors of the old package are not used after the package changes.
+    package = resp.json()
+    zip_file_dir = package.get(
+        'package_dir', '/var/qinling/packages/%s' % function_id
+    )
+
+    if ZIPIMPORT:
+        package_file = package.get('package_file')
+        if package_file and _is_zipimport_supported(package_file):
+            zip_file_dir = package_file
+        else:
+            resp = _download_package(params)
+            if not resp.ok:
+                return _get_responce(resp.content, 0, '', False, 500)
+
+    auth = None
     if auth_url:
-        auth = generic.Password(
-            username=username,
-            password=password,
-            auth_url=auth_url,
-            trust_id=trust_id,
-            user_domain_name='Default'
-        )
-        os_session = session.Session(auth=auth, verify=False)
-    input.update({'context': {'os_session': os_session}})
+        auth = {
+            'username': username,
+            'password': password,
+            'auth_url': auth_url,
+            'trust_id': trust_id
+        }
 
     ####################################################################
     #
-    # Create a new process to run user's function
+    # Run user's function in a warm executor process
     #
     ####################################################################
-    manager = Manager()
-    return_dict = manager.dict()
-    return_dict['success'] = False
     start = time.time()
 
     # Run the function in a separate process to avoid messing up the log
-    p = Process(
-        target=_invoke_function,
-        args=(execution_id, zip_file_dir, function_module, function_method,
-              input.pop('__function_input', None), input, return_dict, rlimit)
-    )
-
-    timed_out = False
-    p.start()
-    p.join(timeout)
-    if p.is_alive():
-        _killtree(p.pid)
-        timed_out = True
+    function = (function_id, params.get('function_version', 0))
+    function_input = input.pop('__function_input', None)
+    executor = _get_executor(function, zip_file_dir, function_module, rlimit)
+    try:
+        output, success, logs = executor.invoke(
+            execution_id, function_method, function_input, input, auth,
+            timeout
+        )
+    except _ExecutorExited:
+        # Start a new executor to run the execution.
+        executor.stop()
+        executor = _get_executor(function, zip_file_dir, function_module,
+                                 rlimit)
+        output, success, logs = executor.invoke(
+            execution_id, function_method, function_input, input, auth,
+            timeout
+        )
 
     ####################################################################
     #
@@ -241,22 +506,27 @@ def execute():
     ####################################################################
     duration = round(time.time() - start, 3)
 
-    # Process was killed unexpectedly or finished with error.
-    if p.exitcode != 0:
-        output = TIMEOUT_ERROR if timed_out else INVOKE_ERROR
-        success = False
-    else:
-        output = return_dict.get('result')
-        success = return_dict['success']
-
-    # Execution log
-    with open('%s.out' % execution_id) as f:
-        logs = f.read()
-    os.remove('%s.out' % execution_id)
+    _recycle_executor(executor, function, zip_file_dir, function_module,
+                      rlimit)
 
     return _get_responce(output, duration, logs, success, 200)
 
 
+@app.route('/prefetch', methods=['POST'])
+def prefetch():
+    """Download function package before the executions arrive.
+
+    The sidecar only listens on the loopback interface, the engine sends the
+    prefetch request here and it's passed to the sidecar.
+    """
+    params = request.get_json() or {}
+
+    resp = _download_package(params, unzip=not ZIPIMPORT)
+
+    return Response(response=resp.content, status=resp.status_code,
+                    mimetype=resp.headers.get('Content-Type'))
+
+
 @app.route('/ping')
 def ping():
     return 'pong'
@@ -12,12 +12,21 @@
 #    See the License for the specific language governing permissions and
 #    limitations under the License.
 
+import collections
+import hashlib
 import logging
 import os
+import re
+import shutil
+import struct
 import sys
+import threading
+import time
 import zipfile
+import zlib
 
 from flask import Flask
+from flask import jsonify
 from flask import make_response
 from flask import request
 from oslo_concurrency import lockutils
@@ -31,6 +40,53 @@ del app.logger.handlers[:]
 app.logger.addHandler(ch)
 
 DOWNLOAD_ERROR = "Failed to download function package from %s, error: %s"
+UNZIP_ERROR = "Failed to unzip function package %s, error: %s"
+LOCK_PATH = '/var/lock/qinling'
+PACKAGE_DIR = '/var/qinling/packages'
+CACHE_DIR = os.path.join(PACKAGE_DIR, 'cache')
+# Disk budget of the package cache in MB, 0 means no limit. The least
+# recently used packages are removed when the budget is exceeded.
+CACHE_SIZE = int(os.getenv('QINLING_PACKAGE_CACHE_SIZE', 1024)) * 1024 * 1024
+# Whether to keep the package zip file after it's extracted.
+KEEP_PACKAGE_FILE = os.getenv(
+    'QINLING_KEEP_PACKAGE_FILE', 'true').lower() in ('true', '1', 'yes')
+CHUNK_SIZE = 65535
+# Times to resume the interrupted package download.
+DOWNLOAD_RETRIES = 3
+# The folder shared by the sidecars on the same node to keep the packages
+# by md5, and its disk budget in MB.
+NODE_CACHE_DIR = os.getenv('QINLING_NODE_CACHE_DIR')
+NODE_CACHE_SIZE = (int(os.getenv('QINLING_NODE_CACHE_SIZE', 4096)) *
+                   1024 * 1024)
+MD5_PATTERN = re.compile('^[0-9a-f]{32}$')
+# Time in seconds the packages reported in use by a runtime process are
+# kept in cache after its last request. The processes recycled by the
+# runtime never report again.
+PIN_TTL = int(os.getenv('QINLING_PACKAGE_PIN_TTL', 3600))
+
+ZIP_LOCAL_HEADER = b'PK\x03\x04'
+ZIP_LOCAL_HEADER_FORMAT = '<HHHHHIIIHH'
+ZIP_DATA_DESCRIPTOR = b'PK\x07\x08'
+ZIP_END_SIGNATURES = (b'PK\x01\x02', b'PK\x05\x06')
+ZIP_FLAG_ENCRYPTED = 0x1
+ZIP_FLAG_DATA_DESCRIPTOR = 0x8
+ZIP_STORED = 0
+ZIP_DEFLATED = 8
+ZIP64_SIZE = 0xFFFFFFFF
+
+# A package in cache, the paths are None if they don't exist.
+_CachedPackage = collections.namedtuple(
+    '_CachedPackage', ['size', 'zip_file', 'package_dir']
+)
+
+# The packages in the cache in LRU order, keyed by package name.
+_packages = collections.OrderedDict()
+# The time of the last report and the names of the packages used by the warm
+# executors of the runtime, keyed by the runtime process. They are not removed
+# from cache until the report expires.
+_pinned = {}
+_packages_lock = threading.Lock()
+_packages_loaded = False
 
 
 def log(message, level="info"):
@@ -39,42 +95,544 @@ def log(message, level="info"):
     log_func(message)
 
 
-@lockutils.synchronized('download_function', external=True,
-                        lock_path='/var/lock/qinling')
-def _download_package(url, zip_file, token=None, unzip=None):
-    """Download package and unzip as needed.
+def _package_name(function_id, version, md5sum):
+    """Get the name of the package in cache.
+
+    The package of a function version never changes, the package of version
+    0 is identified by md5.
+    """
+    return '%s_%s_%s' % (function_id, version, md5sum or 'unknown')
+
+
+def _disk_usage(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+
+    size = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            file_path = os.path.join(root, name)
+            if not os.path.islink(file_path):
+                size += os.path.getsize(file_path)
+    return size
+
+
+def _load_packages():
+    """Load the packages left in cache, e.g. before the sidecar restarts."""
+    global _packages_loaded
+
+    with _packages_lock:
+        if _packages_loaded:
+            return
+
+        if not os.path.isdir(CACHE_DIR):
+            os.makedirs(CACHE_DIR)
+
+        names = set(os.path.splitext(n)[0] for n in os.listdir(CACHE_DIR)
+                    if not n.startswith('.'))
+        packages = []
+        for name in names:
+            package = _get_package(name)
+            mtime = max(os.path.getmtime(p)
+                        for p in (package.zip_file, package.package_dir) if p)
+            packages.append((mtime, name, package))
+
+        for _, name, package in sorted(packages):
+            _packages[name] = package
+
+        _packages_loaded = True
+
+
+def _package_paths(name):
+    """Return the paths of the package zip file and the extracted folder."""
+    return (os.path.join(CACHE_DIR, '%s.zip' % name),
+            os.path.join(CACHE_DIR, name))
+
+
+def _get_package(name):
+    """Get the package files on disk."""
+    paths = [p if os.path.exists(p) else None for p in _package_paths(name)]
+    size = sum(_disk_usage(p) for p in paths if p)
+
+    return _CachedPackage(size, *paths)
+
+
+def _touch_package(name):
+    """Mark the package as recently used, return None if not in cache."""
+    with _packages_lock:
+        package = _packages.pop(name, None)
+        if package:
+            _packages[name] = package
+        return package
+
+
+def _pin_packages(client, paths):
+    """Keep the packages used by the runtime process in cache.
+
+    The packages reported by the runtime processes which haven't sent any
+    request for PIN_TTL are released.
+
+    :param client: The runtime process.
+    :param paths: The package folders or zip files used by the warm
+        executors of the runtime process.
+    """
+    now = time.time()
+
+    with _packages_lock:
+        for old_client, (reported_at, _) in list(_pinned.items()):
+            if now - reported_at > PIN_TTL:
+                del _pinned[old_client]
+
+        if client is None:
+            return
+
+        names = set(os.path.splitext(os.path.basename(p))[0]
+                    for p in paths or [])
+        _pinned[client] = (now, names)
+
+
+def _add_package(name):
+    """Add the package on disk to cache and remove the least used ones.
+
+    The packages used by the warm executors of the runtime are not removed,
+    the cache may exceed its budget because of them.
+    """
+    package = _get_package(name)
+
+    with _packages_lock:
+        _packages.pop(name, None)
+        _packages[name] = package
+
+        if not CACHE_SIZE:
+            return package
+
+        pinned = set().union(*[names for _, names in _pinned.values()])
+        total = sum(p.size for p in _packages.values())
+        for old_name in list(_packages):
+            if total <= CACHE_SIZE:
+                break
+            if old_name == name or old_name in pinned:
+                continue
+
+            log("Removing package %s from cache" % old_name)
+            total -= _packages.pop(old_name).size
+            for path in _package_paths(old_name):
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                elif os.path.exists(path):
+                    os.remove(path)
+
+    return package
+
+
+def _link_package(function_id, package_dir):
+    """Link the function folder to the package in cache.
+
+    The runtimes not aware of the package cache find the package in the
+    folder named after the function id.
+    """
+    link = os.path.join(PACKAGE_DIR, function_id)
+    tmp_link = '%s.tmp' % link
+
+    try:
+        if os.path.islink(tmp_link):
+            os.remove(tmp_link)
+        os.symlink(package_dir, tmp_link)
+        os.rename(tmp_link, link)
+    except OSError as e:
+        log("Failed to link package for function %s: %s" % (function_id, e),
+            level="warning")
+
+
+def _download_package(url, name, token=None, unzip=None, md5sum=None):
+    """Download package to cache and unzip as needed.
+
+    Only the downloads of the same package wait for each other. The package
+    may be found on disk, e.g. downloaded by a concurrent request.
+
+    Return None if successful otherwise a Flask.Response object.
+    """
+    zip_file, dest = _package_paths(name)
+
+    with lockutils.lock('download_package_%s' % name, external=True,
+                        lock_path=LOCK_PATH):
+        if os.path.isdir(dest) or (not unzip and os.path.isfile(zip_file)):
+            return None
+
+        if os.path.isfile(zip_file):
+            # The package was downloaded without being extracted.
+            return _unzip_package(zip_file, dest)
+
+        node_file = _node_cache_file(md5sum)
+
+        # The sidecars on the same node wait for each other to download the
+        # same package.
+        with lockutils.lock('package_%s' % (md5sum or name),
+                            external=bool(node_file),
+                            lock_path=NODE_CACHE_DIR):
+            return _do_download_package(url, zip_file, dest, token=token,
+                                        unzip=unzip, md5sum=md5sum,
+                                        node_file=node_file)
+
+
+def _node_cache_file(md5sum):
+    """Get the package path in the node cache, None if not applicable."""
+    if not (NODE_CACHE_DIR and md5sum and MD5_PATTERN.match(md5sum)):
+        return None
+    if not os.access(NODE_CACHE_DIR, os.W_OK):
+        log("Node package cache %s is not writable" % NODE_CACHE_DIR,
+            level="warning")
+        return None
+
+    return os.path.join(NODE_CACHE_DIR, '%s.zip' % md5sum)
+
+
+def _add_node_package(tmp_node_file, node_file):
+    """Add the package to the node cache and remove the least used ones."""
+    os.rename(tmp_node_file, node_file)
+
+    packages = []
+    for name in os.listdir(NODE_CACHE_DIR):
+        path = os.path.join(NODE_CACHE_DIR, name)
+        if name.startswith('.') or not name.endswith('.zip'):
+            continue
+        try:
+            stat = os.stat(path)
+        except OSError:
+            # Removed by other sidecars.
+            continue
+        packages.append((stat.st_mtime, path, stat.st_size))
+
+    total = sum(p[2] for p in packages)
+    for _, path, size in sorted(packages):
+        if total <= NODE_CACHE_SIZE:
+            break
+        if path == node_file:
+            continue
+
+        log("Removing package %s from node cache" % path)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total -= size
+
+
+def _read_file(path):
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+def _iter_download(url, headers):
+    """Download the package chunk by chunk.
+
+    The interrupted download is resumed from where it stopped using a range
+    request, as long as the package doesn't change in between.
+    """
+    received = 0
+    etag = None
+    retries = 0
+
+    while True:
+        req_headers = dict(headers)
+        if received:
+            req_headers.update(
+                {'Range': 'bytes=%d-' % received, 'If-Range': etag}
+            )
+
+        r = requests.get(url, headers=req_headers, stream=True, timeout=30,
+                         verify=False)
+        if received and r.status_code != 206:
+            raise Exception("Failed to resume download, status: %s" %
+                            r.status_code)
+        if not received and r.status_code != 200:
+            raise Exception(r.content)
+
+        etag = r.headers.get('ETag')
+
+        try:
+            for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                received += len(chunk)
+                yield chunk
+            return
+        except requests.exceptions.RequestException as e:
+            retries += 1
+            if not etag or retries > DOWNLOAD_RETRIES:
+                raise
+
+            log("Download interrupted after %d bytes, resuming: %s" %
+                (received, e), level="warning")
+
+
+def _unzip_package(zip_file, dest):
+    """Unzip the package downloaded before.
 
     Return None if successful otherwise a Flask.Response object.
     """
-    if os.path.isfile(zip_file):
+    tmp_dest = os.path.join(CACHE_DIR, '.%s' % os.path.basename(dest))
+
+    try:
+        shutil.rmtree(tmp_dest, ignore_errors=True)
+        with open(zip_file, 'rb') as f:
+            zf = zipfile.ZipFile(f)
+            zf.extractall(tmp_dest)
+        os.rename(tmp_dest, dest)
+    except Exception as e:
+        shutil.rmtree(tmp_dest, ignore_errors=True)
+        return make_response(UNZIP_ERROR % (zip_file, str(e)), 500)
+
+    log("Unzipped function package %s" % zip_file)
+
+
+class _UnsupportedZip(Exception):
+    pass
+
+
+class _StreamReader(object):
+    """Read the downloaded data chunk by chunk.
+
+    The md5 of the data is calculated while reading, the data is also
+    written to the file objects if provided.
+    """
+
+    def __init__(self, chunks, fds=None):
+        self.chunks = chunks
+        self.fds = fds or []
+        self.md5 = hashlib.md5()
+        self.buffer = b''
+
+    def _fill(self):
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            return False
+
+        self.md5.update(chunk)
+        for fd in self.fds:
+            fd.write(chunk)
+        self.buffer += chunk
+        return True
+
+    def read(self, size):
+        while len(self.buffer) < size and self._fill():
+            pass
+
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    def read_some(self, size=None):
+        if not self.buffer:
+            self._fill()
+
+        size = size or len(self.buffer)
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    def unread(self, data):
+        self.buffer = data + self.buffer
+
+    def drain(self):
+        while self._fill():
+            self.buffer = b''
+        self.buffer = b''
+
+
+def _extract_path(dest, name):
+    """Get the path to extract the zip member, like ZipFile.extractall."""
+    name = name.replace('\\', '/')
+    parts = [p for p in name.split('/') if p not in ('', '.', '..')]
+    if not parts:
         return None
+    return os.path.join(dest, *parts)
+
+
+def _stream_extract(reader, dest):
+    """Extract the zip members while the package is being downloaded.
+
+    The members are read one by one following their local headers, so the
+    extraction doesn't need the central directory at the end of the file.
+    _UnsupportedZip is raised for the zip features not handled here.
+    """
+    while True:
+        signature = reader.read(4)
+        if signature in ZIP_END_SIGNATURES:
+            break
+        if signature != ZIP_LOCAL_HEADER:
+            raise _UnsupportedZip('Unexpected zip signature %r' % signature)
+
+        (_, flags, method, _, _, crc, csize, usize, name_len,
+         extra_len) = struct.unpack(ZIP_LOCAL_HEADER_FORMAT, reader.read(26))
+        name = reader.read(name_len).decode('utf-8', 'replace')
+        reader.read(extra_len)
 
-    log("Start downloading function")
+        has_descriptor = flags & ZIP_FLAG_DATA_DESCRIPTOR
+        if (flags & ZIP_FLAG_ENCRYPTED or
+                method not in (ZIP_STORED, ZIP_DEFLATED) or
+                ZIP64_SIZE in (csize, usize) or
+                (has_descriptor and method == ZIP_STORED)):
+            raise _UnsupportedZip('Unsupported zip member %s' % name)
 
+        path = _extract_path(dest, name)
+        is_dir = name.endswith('/') or path is None
+        if path and is_dir and not os.path.isdir(path):
+            os.makedirs(path)
+        if not is_dir and not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+
+        fd = None if is_dir else open(path, 'wb')
+        try:
+            actual_crc = _extract_member(reader, fd, method, csize,
+                                         has_descriptor)
+        finally:
+            if fd:
+                fd.close()
+
+        if has_descriptor:
+            descriptor = reader.read(4)
+            if descriptor != ZIP_DATA_DESCRIPTOR:
+                reader.unread(descriptor)
+            crc = struct.unpack('<I', reader.read(12)[:4])[0]
+
+        if actual_crc != crc:
+            raise zipfile.BadZipfile('Bad CRC-32 for file %s' % name)
+
+
+def _extract_member(reader, fd, method, csize, has_descriptor):
+    """Write the member data to the file, return the crc of the data."""
+    crc = 0
+    decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+    remaining = csize
+
+    while has_descriptor or remaining > 0:
+        data = reader.read_some(None if has_descriptor else remaining)
+        if not data:
+            raise zipfile.BadZipfile('Truncated zip file')
+        remaining -= len(data)
+
+        if method == ZIP_DEFLATED:
+            data = decompressor.decompress(data)
+
+        if data:
+            crc = zlib.crc32(data, crc)
+            if fd:
+                fd.write(data)
+
+        if decompressor.unused_data:
+            # The member ends inside the chunk, the rest belongs to the
+            # following zip structures.
+            reader.unread(decompressor.unused_data)
+            break
+
+    if method == ZIP_DEFLATED:
+        data = decompressor.flush()
+        if data:
+            crc = zlib.crc32(data, crc)
+            if fd:
+                fd.write(data)
+
+    return crc & 0xFFFFFFFF
+
+
+def _do_download_package(url, zip_file, dest, token=None, unzip=None,
+                         md5sum=None, node_file=None):
+    """Download package and unzip as needed, without lock.
+
+    The package is extracted while it's being downloaded, and the md5 of the
+    package is verified at the same time. For the zip files can't be
+    extracted that way, the package is extracted after the download.
+
+    The package is downloaded and extracted into temporary paths first, so
+    the package in cache is always complete.
+
+    :param node_file: Optional. The package path in the node cache. The
+        package is read from there if it exists, otherwise it's added there
+        after the download.
+    """
     headers = {}
     if token:
         headers = {'X-Auth-Token': token}
 
+    def _get_chunks():
+        if node_file and os.path.isfile(node_file):
+            log("Reading function package from node cache %s" % node_file)
+            os.utime(node_file, None)
+            return _read_file(node_file)
+
+        log("Start downloading function")
+        return _iter_download(url, headers)
+
+    keep_file = KEEP_PACKAGE_FILE or not unzip
+    tmp_zip_file = os.path.join(CACHE_DIR, '.%s' % os.path.basename(zip_file))
+    tmp_dest = os.path.join(CACHE_DIR, '.%s' % os.path.basename(dest))
+    tmp_node_file = None
+    if node_file and not os.path.isfile(node_file):
+        tmp_node_file = os.path.join(NODE_CACHE_DIR,
+                                     '.%s' % os.path.basename(node_file))
+
     try:
-        r = requests.get(url, headers=headers, stream=True, timeout=30,
-                         verify=False)
-        if r.status_code != 200:
-            return make_response(DOWNLOAD_ERROR % (url, r.content), 500)
+        chunks = _get_chunks()
+
+        shutil.rmtree(tmp_dest, ignore_errors=True)
+        extracted = False
+
+        # The package is always written to the temporary file, so it can be
+        # extracted from there if it can't be extracted while downloading.
+        # The file is removed afterwards if it's not kept.
+        with open(tmp_zip_file, 'wb') as fd:
+            fds = [fd]
+            node_fd = open(tmp_node_file, 'wb') if tmp_node_file else None
+            if node_fd:
+                fds.append(node_fd)
 
-        with open(zip_file, 'wb') as fd:
-            for chunk in r.iter_content(chunk_size=65535):
-                fd.write(chunk)
+            try:
+                reader = _StreamReader(chunks, fds=fds)
+
+                if unzip:
+                    try:
+                        _stream_extract(reader, tmp_dest)
+                        extracted = True
+                    except _UnsupportedZip as e:
+                        log("Can't unzip while downloading: %s" % e)
+                        shutil.rmtree(tmp_dest, ignore_errors=True)
+
+                reader.drain()
+            finally:
+                if node_fd:
+                    node_fd.close()
+
+        if md5sum and reader.md5.hexdigest() != md5sum:
+            if node_file and not tmp_node_file:
+                # The package in node cache is broken.
+                os.remove(node_file)
+            raise Exception('Package md5 mismatch, expected: %s, actual: %s' %
+                            (md5sum, reader.md5.hexdigest()))
 
         log("Downloaded function package to %s" % zip_file)
 
-        if unzip:
-            dest = zip_file.split('.')[0]
-            with open(zip_file, 'rb') as f:
+        if tmp_node_file:
+            _add_node_package(tmp_node_file, node_file)
+
+        if unzip and not extracted:
+            with open(tmp_zip_file, 'rb') as f:
                 zf = zipfile.ZipFile(f)
-                zf.extractall(dest)
+                zf.extractall(tmp_dest)
+
+        if unzip:
+            os.rename(tmp_dest, dest)
             log("Unzipped")
+
+        if keep_file:
+            os.rename(tmp_zip_file, zip_file)
     except Exception as e:
+        shutil.rmtree(tmp_dest, ignore_errors=True)
         return make_response(DOWNLOAD_ERROR % (url, str(e)), 500)
+    finally:
+        for path in (tmp_zip_file, tmp_node_file):
+            if path and os.path.exists(path):
+                os.remove(path)
 
 
 @app.route('/download', methods=['POST'])
@@ -84,21 +642,48 @@ def download():
     The parameters 'download_url' and 'function_id' need to be specified
     explicitly. It's guaranteed on the server side.
 
+    The packages are kept in cache by function id, version and md5, the
+    response includes the paths of the package zip file and the folder
+    it's extracted to.
+
     :param download_url: The URL for function package download. It's a Qinling
         function resource URL with 'download' enabled.
     :param function_id: Function ID.
     :param token: Optional. The token used for download.
     :param unzip: Optional. If unzip is needed after download.
+    :param function_version: Optional. Function version.
+    :param md5sum: Optional. The md5 of the function package.
+    :param client: Optional. The runtime process sending the request.
+    :param in_use: Optional. The package folders or zip files used by the
+        warm executors of the runtime process, they are kept in cache.
     """
     params = request.get_json()
-    zip_file = '/var/qinling/packages/%s.zip' % params['function_id']
-    log("Function package download request received, params: %s" % params)
+    function_id = params['function_id']
+    name = _package_name(function_id, params.get('function_version', 0),
+                         params.get('md5sum'))
+    package_dir = _package_paths(name)[1]
+    unzip = params.get('unzip', True)
+
+    _load_packages()
+    _pin_packages(params.get('client'), params.get('in_use'))
+
+    # The package was downloaded before, no need to check it again.
+    package = _touch_package(name)
+    if not package or (unzip and not package.package_dir):
+        log("Function package download request received, params: %s" %
+            params)
+
+        resp = _download_package(
+            params['download_url'],
+            name,
+            token=params.get('token'),
+            unzip=unzip,
+            md5sum=params.get('md5sum')
+        )
+        if resp:
+            return resp
 
-    resp = _download_package(
-        params['download_url'],
-        zip_file,
-        token=params.get('token'),
-        unzip=params.get('unzip', True)
-    )
+        package = _add_package(name)
+        _link_package(function_id, package_dir)
 
-    return resp if resp else 'downloaded'
+    return jsonify(package_file=package.zip_file, package_dir=package_dir)